@@ -27,6 +27,9 @@ setup(
     python_requires='>=3.8, <4',
     install_requires=['requests'],
     extras_require={
-        'test': ['pytest']
+        'test': ['pytest'],
+        'async': ['aiohttp'],
+        'fast': ['orjson', 'msgspec'],
+        'http2': ['httpx[http2]'],
     },
 )
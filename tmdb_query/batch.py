@@ -0,0 +1,306 @@
+"""
+Non-interactive batch mode, for many co-star queries at once.
+
+Queries are read from a file (or stdin with "-"), one group of actors per line:
+
+  JSONL: ["Keanu Reeves", "Laurence Fishburne"], [6384, 2975], or
+    {"names": ["Keanu Reeves"], "ids": [2975]}. Numbers are actor ids.
+  CSV: Keanu Reeves,Laurence Fishburne. Cells made of digits are actor ids.
+
+Queries are read ahead in chunks, and every distinct name of a chunk is
+resolved once and shared by its queries. Homonyms are picked without user
+input, by an explicit id given with --pick, or else the most popular actor.
+Queries then run concurrently, with a bounded number in flight, and each
+result is written as a JSON line as soon as it is ready, in completion order:
+
+  {"line": 1, "actor_ids": [2975, 6384], "movies": ["The Matrix", ...]}
+  {"line": 2, "error": "No result found for name \"Lawrence Fishburne\"."}
+
+Responses are kept in the in-memory response cache (and on disk with
+--cache-dir), so names and filmographies shared by several chunks are only
+fetched once. Run it with:
+
+  python3 tmdb_query batch queries.jsonl [-o results.jsonl] [--workers 8]
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from itertools import islice
+from typing import Dict, FrozenSet, IO, Iterable, Iterator, List, Mapping, Optional, Set, Union
+from tmdb_client import cache
+from tmdb_client.exceptions import NameNotFound
+import cli
+import costar_index
+
+log = logging.getLogger(__name__)
+
+FORMATS = ("jsonl", "csv")
+# Queries in flight, and read ahead, per worker.
+PENDING_PER_WORKER = 4
+# Results of groups of actors kept for the queries asking for them again.
+GROUP_ENTRIES = 1024
+
+
+class BadQuery(Exception):
+
+  def __init__(self, message: str, line: Optional[int] = None) -> None:
+    super().__init__(message)
+    self.line = line
+
+
+class Query():
+  """
+  One line of the input: a group of actors given by name and/or by id.
+  """
+  __slots__ = ("line", "names", "ids")
+
+  def __init__(self, line: int, names: Iterable[str] = (), ids: Iterable[int] = ()) -> None:
+    self.line = line
+    self.names = [n.strip() for n in names if n.strip()]
+    self.ids = [int(i) for i in ids]
+
+
+def parse_jsonl(lines: Iterable[str]) -> Iterator[Union[Query, BadQuery]]:
+  """
+  Returns:
+    An iterator of queries, or of BadQuery errors for invalid lines.
+  """
+  for line_no, line in enumerate(lines, 1):
+    if not line.strip():
+      continue
+    try:
+      value = json.loads(line)
+      if isinstance(value, dict):
+        for key in ("names", "ids"):
+          if not isinstance(value.get(key, []), list):
+            raise BadQuery(f"Expected a list of {key}.")
+        yield Query(line_no, value.get("names", []), value.get("ids", []))
+      elif isinstance(value, list):
+        yield Query(
+          line_no,
+          [v for v in value if isinstance(v, str)],
+          [v for v in value if isinstance(v, int) and not isinstance(v, bool)])
+      else:
+        raise BadQuery("Expected a list or an object.")
+    except (ValueError, TypeError, AttributeError, BadQuery) as e:
+      yield BadQuery(f"Invalid query: {e}", line_no)
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[Union[Query, BadQuery]]:
+  """
+  Returns:
+    An iterator of queries, one per row.
+  """
+  for line_no, row in enumerate(csv.reader(lines), 1):
+    cells = [c.strip() for c in row if c.strip()]
+    if cells:
+      yield Query(
+        line_no, [c for c in cells if not c.isdigit()], [c for c in cells if c.isdigit()])
+
+
+def parse_queries(lines: Iterable[str], fmt: str = "jsonl") -> Iterator[Union[Query, BadQuery]]:
+  if fmt not in FORMATS:
+    raise ValueError(f"Invalid format \"{fmt}\". Expected one of {FORMATS}.")
+  return parse_csv(lines) if fmt == "csv" else parse_jsonl(lines)
+
+
+def resolve_names(
+  names: Iterable[str],
+  picks: Optional[Mapping[str, int]] = None,
+  workers: int = cli.MAX_WORKERS) -> Dict[str, Union[int, Exception]]:
+  """
+  Resolve actor names to ids concurrently, without user input.
+  Args:
+    names: iterable of strings. Names to resolve, each one is looked up once.
+    picks: mapping <optional>. Explicit {name: id} choices, for homonyms.
+      These names are not looked up.
+    workers: int. Maximum number of concurrent lookups.
+  Returns:
+    A dictionary of {name: actor id, or the exception raised by the lookup}.
+  """
+  picks = picks or {}
+  names = list(dict.fromkeys(names))
+  resolved: Dict[str, Union[int, Exception]] = {
+    name: picks[name] for name in names if name in picks}
+  pending = [name for name in names if name not in resolved]
+
+  def resolve(name: str) -> Union[int, Exception]:
+    try:
+      return cli.get_ensured_actor_id(name, interactive=False)
+    except Exception as e:
+      return e
+
+  if pending:
+    with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+      resolved.update(zip(pending, pool.map(resolve, pending)))
+  return resolved
+
+
+class BatchRunner():
+  """
+  Run queries concurrently over a bounded pool of workers. Groups of actors
+  asked for by several queries are only looked up once, as long as their
+  result is among the group_entries most recent ones.
+  """
+
+  def __init__(
+    self,
+    method: str = "discover",
+    index: Optional[costar_index.CostarIndex] = None,
+    workers: int = cli.MAX_WORKERS,
+    picks: Optional[Mapping[str, int]] = None,
+    max_pending: Optional[int] = None,
+    group_entries: int = GROUP_ENTRIES) -> None:
+    """
+    Args:
+      max_pending: int <optional>. Maximum number of queries read ahead or
+        in flight. PENDING_PER_WORKER per worker by default.
+      group_entries: int. Number of finished groups of actors kept.
+    """
+    self.method = method
+    self.index = index
+    self.workers = max(workers, 1)
+    self.picks = dict(picks or {})
+    self.max_pending = max(max_pending or PENDING_PER_WORKER * self.workers, 1)
+    self.group_entries = group_entries
+    self._groups: "OrderedDict[FrozenSet[int], Future]" = OrderedDict()
+    self._lock = threading.Lock()
+
+  def run(self, queries: Iterable[Union[Query, BadQuery]]) -> Iterator[Dict]:
+    """
+    Returns:
+      An iterator of result dictionaries, in completion order. Queries are
+      read as results are consumed.
+    """
+    queries = iter(queries)
+    pending: Set[Future] = set()
+    with ThreadPoolExecutor(max_workers=self.workers) as pool:
+      while chunk := list(islice(queries, self.max_pending)):
+        for bad in (q for q in chunk if isinstance(q, BadQuery)):
+          yield {"line": bad.line, "error": str(bad)}
+        chunk = [q for q in chunk if isinstance(q, Query)]
+        names = resolve_names((n for q in chunk for n in q.names), self.picks, self.workers)
+        for query in chunk:
+          if len(pending) >= self.max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+              yield future.result()
+          pending.add(pool.submit(self.query, query, names))
+      for future in as_completed(pending):
+        yield future.result()
+
+  def query(self, query: Query, names: Mapping[str, Union[int, Exception]]) -> Dict:
+    result = {"line": query.line}
+    try:
+      actor_ids = set(query.ids)
+      for name in query.names:
+        actor_id = names[name]
+        if isinstance(actor_id, Exception):
+          raise actor_id
+        if actor_id < 0:
+          raise NameNotFound(f"No id found for name {name}.")
+        actor_ids.add(actor_id)
+      if len(actor_ids) < 2:
+        raise BadQuery("At least 2 distinct actors are required.")
+      result["actor_ids"] = sorted(actor_ids)
+      result["movies"] = self.common_movies(frozenset(actor_ids))
+    except Exception as e:
+      log.debug(f"Query on line {query.line} failed: {e!r}")
+      result["error"] = str(e)
+    return result
+
+  def common_movies(self, actor_ids: FrozenSet[int]) -> List[str]:
+    with self._lock:
+      future = self._groups.get(actor_ids)
+      owner = future is None
+      if owner:
+        future = self._groups[actor_ids] = Future()
+        self._evict_groups()
+      else:
+        self._groups.move_to_end(actor_ids)
+    if not owner:
+      return future.result()
+    try:
+      movies = cli.get_common_movies_for_actor_ids(actor_ids, self.method, self.index)
+    except BaseException as e:
+      future.set_exception(e)
+      raise
+    future.set_result(movies)
+    return movies
+
+  def _evict_groups(self) -> None:
+    """Drop the least recent finished groups, past group_entries."""
+    excess = len(self._groups) - self.group_entries
+    if excess <= 0:
+      return
+    # Groups in flight are kept: other queries may be waiting for them.
+    for key in [k for k, f in self._groups.items() if f.done()][:excess]:
+      del self._groups[key]
+
+
+def write_results(results: Iterable[Dict], out: IO[str]) -> Dict[str, int]:
+  """
+  Write each result as a JSON line, flushed as soon as it is ready.
+  Returns:
+    The number of successful and failed queries.
+  """
+  counts = {"ok": 0, "failed": 0}
+  for result in results:
+    counts["failed" if "error" in result else "ok"] += 1
+    out.write(json.dumps(result) + "\n")
+    out.flush()
+  return counts
+
+
+def parse_pick(value: str) -> tuple:
+  name, sep, actor_id = value.rpartition("=")
+  if not sep or not name.strip() or not actor_id.strip().isdigit():
+    raise argparse.ArgumentTypeError(f"Expected NAME=ID, got \"{value}\".")
+  return name.strip(), int(actor_id)
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(
+    prog="tmdb_query batch",
+    description="Run many co-star queries from a file, without user input.")
+  parser.add_argument('input', metavar='FILE', help='queries, one group of actors per line ("-" for stdin)')
+  parser.add_argument('-o', '--output', metavar='FILE', help='JSONL results (default stdout)')
+  parser.add_argument(
+    '--format', choices=FORMATS,
+    help='input format, guessed from the file extension by default (jsonl)')
+  parser.add_argument('--method', choices=cli.METHODS, default="discover")
+  parser.add_argument('--index', metavar='DIR', help='look up movies in this local co-star index')
+  parser.add_argument(
+    '--cache-dir', metavar='DIR', default=os.environ.get("TMDB_CACHE_DIR"),
+    help='on-disk response cache directory')
+  parser.add_argument(
+    '--workers', type=int, default=cli.MAX_WORKERS,
+    help=f'number of queries run concurrently (default {cli.MAX_WORKERS})')
+  parser.add_argument(
+    '--pick', metavar='NAME=ID', type=parse_pick, action='append', default=[],
+    help='actor id to use for a name, instead of the most popular homonym')
+  pargs = parser.parse_args(args)
+
+  fmt = pargs.format or ("csv" if pargs.input.lower().endswith(".csv") else "jsonl")
+  # Names and filmographies shared by the queries are fetched once.
+  cache.configure(cache_dir=pargs.cache_dir)
+  index = costar_index.CostarIndex(pargs.index) if pargs.index else None
+  runner = BatchRunner(pargs.method, index, pargs.workers, dict(pargs.pick))
+
+  source = sys.stdin if pargs.input == "-" else open(pargs.input, newline="", encoding="utf-8")
+  out = open(pargs.output, "w", encoding="utf-8") if pargs.output else sys.stdout
+  try:
+    counts = write_results(runner.run(parse_queries(source, fmt)), out)
+  finally:
+    if source is not sys.stdin:
+      source.close()
+    if out is not sys.stdout:
+      out.close()
+  print(f"{counts['ok']} queries answered, {counts['failed']} failed.", file=sys.stderr)
+  return 1 if counts["failed"] else 0
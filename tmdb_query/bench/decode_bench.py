@@ -0,0 +1,78 @@
+"""
+Decoding time and retained memory of large credits payloads, for every JSON
+backend installed, in full and projected on the fields used by get_movie_cast.
+
+By default the payload is a synthetic credits response shaped like those of
+long-running TV shows. A response body recorded from the API can be given
+instead with --fixture.
+
+Run from the tmdb_query directory:
+  python -m bench.decode_bench --cast 20000 [--fixture credits.json]
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from bench.models_bench import cast_credit
+from tmdb_client import codec
+from tmdb_client.util import CAST_FIELDS
+
+
+def credits_payload(n_cast: int, n_crew: int) -> bytes:
+  rng = random.Random(0)
+  crew = []
+  for i in range(n_crew):
+    entry = cast_credit(rng, 10**6 + i)
+    entry.update(department="Production", job="Producer", known_for_department="Production")
+    crew.append(entry)
+  return json.dumps({
+    "id": 1399,
+    "cast": [cast_credit(rng, i) for i in range(1, n_cast + 1)],
+    "crew": crew,
+  }).encode("utf-8")
+
+
+def measure(body: bytes, fields, repeat: int):
+  start = time.perf_counter()
+  for _ in range(repeat):
+    codec.loads(body, fields)
+  elapsed = (time.perf_counter() - start) / repeat
+  tracemalloc.start()
+  kept = codec.loads(body, fields)
+  size, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  del kept
+  return elapsed * 1000, size / 2**20
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--cast", type=int, default=20000)
+  parser.add_argument("--crew", type=int, default=5000)
+  parser.add_argument("--repeat", type=int, default=5)
+  parser.add_argument("--fixture", metavar="FILE", help="recorded credits response body")
+  pargs = parser.parse_args(args)
+
+  if pargs.fixture:
+    with open(pargs.fixture, "rb") as f:
+      body = f.read()
+  else:
+    body = credits_payload(pargs.cast, pargs.crew)
+  print(f"Payload: {len(body) / 2**20:.1f} MiB")
+  print(f"{'backend':<10} {'mode':<10} {'ms':>9} {'MiB kept':>9}")
+  for backend in codec.BACKENDS[1:]:
+    if not codec._available(backend):
+      print(f"{backend:<10} not installed")
+      continue
+    codec.configure(backend)
+    for mode, fields in (("full", None), ("projected", CAST_FIELDS)):
+      ms, mib = measure(body, fields, pargs.repeat)
+      print(f"{backend:<10} {mode:<10} {ms:>9.1f} {mib:>9.1f}")
+  codec.configure("auto")
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
@@ -0,0 +1,108 @@
+"""
+Cold start of the command line entry point, from `python -X importtime`.
+
+Reports the cumulative import time of the modules loaded by `import cli`
+(median of several fresh interpreters), the slowest of them, and the wall
+time of `cli.py --help`. Modules which should only be loaded on first use
+(requests, asyncio, sqlite3...) are flagged when they show up.
+
+Run from the tmdb_query directory:
+  python -m bench.import_bench --runs 10 [--max-ms 150]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# Modules loaded on demand by the client (see tmdb_client.session) and by the
+# local indexes.
+LAZY_MODULES = (
+  "requests", "urllib3", "asyncio", "aiohttp", "httpx", "sqlite3", "email.utils", "numpy",
+  "costar_index", "name_index",
+)
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def import_times(module: str = "cli") -> Tuple[float, Dict[str, float], List[str]]:
+  """
+  Import module in a fresh interpreter.
+  Returns:
+    The cumulative import time of module, that of each of its direct
+    imports, in milliseconds, and the names of all the modules imported.
+  """
+  env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+  env.pop("TMDB_API_KEY", None)
+  result = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+    capture_output=True, text=True, env=env, check=True)
+  total, children, pending = 0.0, {}, {}
+  names = []
+  # Imports are listed after the modules they import, indented by level.
+  for line in result.stderr.splitlines():
+    match = _LINE.match(line)
+    if not match:
+      continue
+    _, cumulative, indent, name = match.groups()
+    names.append(name)
+    if len(indent) == 3:
+      pending[name] = int(cumulative) / 1000
+    elif len(indent) == 1:
+      if name == module:
+        total, children = int(cumulative) / 1000, pending
+      pending = {}
+  return total, children, names
+
+
+def help_wall_time() -> float:
+  env = dict(os.environ)
+  env.pop("TMDB_API_KEY", None)
+  start = time.perf_counter()
+  subprocess.run(
+    [sys.executable, "cli.py", "--help"], capture_output=True, env=env, check=True)
+  return time.perf_counter() - start
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--runs", type=int, default=10)
+  parser.add_argument("--module", default="cli")
+  parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+  parser.add_argument("--max-ms", type=float,
+                      help="fail if the median import time of the module exceeds this")
+  pargs = parser.parse_args(args)
+
+  totals, per_module = [], {}
+  names: List[str] = []
+  for _ in range(pargs.runs):
+    total, children, names = import_times(pargs.module)
+    totals.append(total)
+    for name, ms in children.items():
+      per_module.setdefault(name, []).append(ms)
+  walls = [help_wall_time() * 1000 for _ in range(pargs.runs)]
+
+  median = statistics.median(totals)
+  print(f"import {pargs.module}: median {median:.1f} ms, min {min(totals):.1f} ms ({pargs.runs} runs)")
+  print(f"cli.py --help: median {statistics.median(walls):.1f} ms wall time")
+  print(f"{'slowest imports of ' + pargs.module:<40} {'ms':>8}")
+  slowest = sorted(((statistics.median(v), k) for k, v in per_module.items()), reverse=True)
+  for ms, name in slowest[:pargs.top]:
+    print(f"{name:<40} {ms:>8.1f}")
+
+  status = 0
+  eager = [m for m in LAZY_MODULES if m in names]
+  if eager:
+    print(f"Imported eagerly: {', '.join(eager)}")
+    status = 1
+  if pargs.max_ms is not None and median > pargs.max_ms:
+    print(f"Import time over {pargs.max_ms} ms.")
+    status = 1
+  return status
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
@@ -0,0 +1,105 @@
+"""
+Memory and throughput of the compact records of tmdb_client.models, against
+the raw response dicts, and cost of building endpoint paths on resource
+objects which hold more and more response data.
+
+Run from the tmdb_query directory:
+  python -m bench.models_bench --entries 100000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from tmdb_client.models import CastCredit, MovieSummary, parse_all
+from tmdb_client.person import Person
+
+
+def movie_credit(rng: random.Random, i: int) -> Dict:
+  """A cast entry of a person's movie_credits, with all the fields of the API."""
+  return {
+    "adult": False, "backdrop_path": f"/{i:08x}.jpg", "genre_ids": [18, 53],
+    "id": i, "original_language": "en", "original_title": f"Movie {i}",
+    "overview": "An overview of the plot, usually a few sentences long. " * 3,
+    "popularity": rng.uniform(0, 100), "poster_path": f"/{i:08x}p.jpg",
+    "release_date": f"{rng.randint(1950, 2023)}-01-01", "title": f"Movie {i}",
+    "video": False, "vote_average": 6.5, "vote_count": 1234,
+    "character": "Someone", "credit_id": f"{i:024x}", "order": i % 20,
+  }
+
+
+def cast_credit(rng: random.Random, i: int) -> Dict:
+  """A cast entry of a movie's credits, with all the fields of the API."""
+  return {
+    "adult": False, "gender": 2, "id": i, "known_for_department": "Acting",
+    "name": f"Actor {i}", "original_name": f"Actor {i}",
+    "popularity": rng.uniform(0, 100), "profile_path": f"/{i:08x}.jpg",
+    "cast_id": i, "character": "Someone", "credit_id": f"{i:024x}", "order": i % 20,
+  }
+
+
+def measure(label: str, payload: bytes, parse: Callable[[List[Dict]], object]) -> None:
+  # Decode inside the measurements so that both sides own their data.
+  start = time.perf_counter()
+  parse(json.loads(payload))
+  elapsed = time.perf_counter() - start
+  tracemalloc.start()
+  kept = parse(json.loads(payload))
+  size, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  del kept
+  print(f"{label:<24} {elapsed * 1000:>9.1f} {size / 2**20:>9.1f}")
+
+
+def bench_models(n_entries: int) -> None:
+  rng = random.Random(0)
+  movies = json.dumps([movie_credit(rng, i) for i in range(1, n_entries + 1)]).encode()
+  cast = json.dumps([cast_credit(rng, i) for i in range(1, n_entries + 1)]).encode()
+  print(f"{n_entries} entries kept   {'ms':>9} {'MiB':>9}")
+  measure("movie credits, dicts", movies, lambda entries: entries)
+  measure("movie credits, records", movies, lambda entries: parse_all(entries, MovieSummary.from_json))
+  measure("cast, dicts", cast, lambda entries: entries)
+  measure("cast, records", cast, lambda entries: parse_all(entries, CastCredit.from_json))
+
+
+def legacy_route(obj: Person, info_type: str) -> str:
+  """Path building before the records, scanning every attribute of obj."""
+  path = obj._get_sub_path(info_type)
+  attr_map = {}
+  for key in obj.__dict__.keys():
+    if not callable(getattr(obj, key)):
+      attr_map[key] = getattr(obj, key)
+  return path.format_map(attr_map)
+
+
+def bench_routes(n_attrs: int, n_calls: int) -> None:
+  person = Person(6384)
+  person._set_val_as_attrs({f"field_{i}": i for i in range(n_attrs)})
+  print(f"\n{n_calls} routes, {len(person.__dict__)} attributes    {'us/call':>9}")
+  for label, route in (
+    ("scan attributes", lambda: legacy_route(person, "movie_credits")),
+    ("placeholders only", lambda: person._get_route("movie_credits")[0]),
+  ):
+    start = time.perf_counter()
+    for _ in range(n_calls):
+      route()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / n_calls * 1e6:>9.2f}")
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--entries", type=int, default=100000)
+  parser.add_argument("--attrs", type=int, default=200,
+                      help="response fields stored on the resource object")
+  parser.add_argument("--calls", type=int, default=20000)
+  pargs = parser.parse_args(args)
+  bench_models(pargs.entries)
+  bench_routes(pargs.attrs, pargs.calls)
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
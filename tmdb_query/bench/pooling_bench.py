@@ -0,0 +1,67 @@
+"""
+Compare requests/sec with and without connection pooling against a local
+stub of the TMDB API.
+
+Run from the tmdb_query directory:
+  python -m bench.pooling_bench --requests 500 --threads 1 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# The client checks the key before sending requests, the stub server ignores it.
+os.environ.setdefault("TMDB_API_KEY", "0" * 32)
+
+from bench.stub_server import StubServer
+from tmdb_client import ratelimit, session, tmdb
+from tmdb_client.movie import Movie
+
+
+def run(server: StubServer, n_requests: int, n_threads: int, pooling: bool) -> dict:
+  session.configure(pooling=pooling, pool_maxsize=max(n_threads, 1))
+  server.reset_counters()
+  movie_ids = [(i % len(server.catalog.movies)) + 1 for i in range(n_requests)]
+
+  start = time.perf_counter()
+  if n_threads <= 1:
+    for movie_id in movie_ids:
+      Movie(movie_id).credits()
+  else:
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+      list(pool.map(lambda m: Movie(m).credits(), movie_ids))
+  elapsed = time.perf_counter() - start
+  session.close_sessions()
+  return {
+    "pooling": pooling,
+    "threads": n_threads,
+    "requests": n_requests,
+    "seconds": elapsed,
+    "rps": n_requests / elapsed,
+    "connections": server.counters["connections"],
+  }
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--requests", type=int, default=300)
+  parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+  parser.add_argument("--latency", type=float, default=0.0,
+                      help="simulated server latency per request, in seconds")
+  pargs = parser.parse_args(args)
+
+  # Measure the transport, not the client-side rate limit.
+  ratelimit.configure(rate=0)
+  with StubServer(latency=pargs.latency) as server:
+    tmdb.API_BASE_URL = server.url
+    print(f"{'pooling':>8} {'threads':>8} {'requests':>9} {'req/s':>10} {'connections':>12}")
+    for n_threads in pargs.threads:
+      for pooling in (False, True):
+        r = run(server, pargs.requests, n_threads, pooling)
+        print(f"{str(r['pooling']):>8} {r['threads']:>8} {r['requests']:>9} "
+              f"{r['rps']:>10.1f} {r['connections']:>12}")
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
@@ -0,0 +1,95 @@
+"""
+Load test of the co-star query service (tmdb_query serve) against a local
+stub of the TMDB API.
+
+Clients query /common for random pairs drawn from a fixed pool of actors,
+so that the cold run fills the caches and the warm run shows the steady
+state of a long-running server.
+
+Run from the tmdb_query directory:
+  python -m bench.serve_load --clients 8 --queries 400 --latency 0.02
+"""
+import argparse
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+os.environ.setdefault("TMDB_API_KEY", "0" * 32)
+
+import requests
+from bench.stub_server import StubServer
+from tmdb_client import cache, ratelimit, tmdb
+import server
+
+
+def run_clients(url: str, pairs: List, n_clients: int, method: str) -> Dict:
+  local = threading.local()
+
+  def query(pair) -> float:
+    client = getattr(local, "client", None)
+    if client is None:
+      client = local.client = requests.Session()
+    start = time.perf_counter()
+    response = client.get(
+      f"{url}/common", params={"name": list(pair), "method": method})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=n_clients) as pool:
+    latencies = sorted(pool.map(query, pairs))
+  elapsed = time.perf_counter() - start
+  quantiles = statistics.quantiles(latencies, n=100)
+  return {
+    "queries": len(pairs),
+    "qps": len(pairs) / elapsed,
+    "p50": quantiles[49] * 1000,
+    "p95": quantiles[94] * 1000,
+    "p99": quantiles[98] * 1000,
+  }
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--clients", type=int, default=8)
+  parser.add_argument("--queries", type=int, default=400)
+  parser.add_argument("--actors", type=int, default=40,
+                      help="size of the pool of actors queries are drawn from")
+  parser.add_argument("--latency", type=float, default=0.02,
+                      help="simulated TMDB latency per request, in seconds")
+  parser.add_argument("--method", choices=("discover", "credits"), default="discover")
+  pargs = parser.parse_args(args)
+
+  ratelimit.configure(rate=0)
+  rng = random.Random(0)
+  names = [f"Actor {i}" for i in range(1, pargs.actors + 1)]
+  pairs = [tuple(rng.sample(names, 2)) for _ in range(pargs.queries)]
+
+  with StubServer(latency=pargs.latency) as stub:
+    tmdb.API_BASE_URL = stub.url
+    server.setup()
+    query_server = server.QueryServer(server.QueryService(), port=0)
+    threading.Thread(target=query_server.serve_forever, daemon=True).start()
+    try:
+      print(f"{'run':>5} {'queries':>8} {'q/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'upstream':>9} {'conns':>6}")
+      for run in ("cold", "warm"):
+        stub.reset_counters()
+        r = run_clients(query_server.url, pairs, pargs.clients, pargs.method)
+        print(f"{run:>5} {r['queries']:>8} {r['qps']:>8.1f} {r['p50']:>8.1f} "
+              f"{r['p95']:>8.1f} {r['p99']:>8.1f} {stub.counters['requests']:>9} "
+              f"{stub.counters['connections']:>6}")
+      print(f"Cache: {cache.get_cache().stats()['hits']} hits, "
+            f"{cache.get_cache().stats()['misses']} misses.")
+    finally:
+      query_server.shutdown()
+      query_server.server_close()
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
@@ -0,0 +1,503 @@
+"""
+A local stand-in for the TMDB API, used by benchmarks and offline tests.
+
+It serves a small deterministic catalog of actors and movies through the
+same endpoints the tmdb_client package uses:
+
+  search/person, search/movie, person/{id}, person/{id}/movie_credits,
+  person/{id}/combined_credits, person/{id}/tv_credits, person/popular,
+  movie/{id}, movie/{id}/credits, tv/{id}, tv/{id}/credits,
+  tv/{id}/aggregate_credits, tv/{id}/season/{n}/credits, discover/movie,
+  discover/tv, movie/changes, person/changes, tv/changes
+
+Responses carry an ETag, and conditional requests get a 304 when it matches.
+
+With http2=True, the server speaks HTTP/2 over plain TCP instead of
+HTTP/1.1, answering the streams of a connection concurrently (needs h2).
+
+Usage:
+  with StubServer() as server:
+    # Point the client at server.url, for example with
+    # TMDB_API_BASE_URL=<server.url> or by patching tmdb_client.tmdb.API_BASE_URL
+    ...
+"""
+import hashlib
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+PAGE_SIZE = 20
+
+
+class StubCatalog():
+  """
+  Deterministic fake catalog. Actor names are "Actor <id>", movie titles
+  are "Movie <id>".
+  """
+
+  def __init__(
+    self,
+    n_people: int = 200,
+    n_movies: int = 500,
+    cast_size: int = 10,
+    seed: int = 0) -> None:
+    rng = random.Random(seed)
+    self.people: Dict[int, Dict] = {}
+    for person_id in range(1, n_people + 1):
+      self.people[person_id] = {
+        "id": person_id,
+        "name": f"Actor {person_id}",
+        "known_for_department": "Acting",
+        "popularity": round(rng.uniform(0, 100), 3),
+      }
+    self.movies: Dict[int, Dict] = {}
+    self.casts: Dict[int, List[int]] = {}
+    self.filmographies: Dict[int, List[int]] = {p: [] for p in self.people}
+    # Ids returned by the changes endpoints, by kind ("movie", "person", "tv").
+    self.changes: Dict[str, List[int]] = {}
+    # TV shows, only added explicitly with add_show().
+    self.shows: Dict[int, Dict] = {}
+    self.show_casts: Dict[int, List[int]] = {}
+    # Cast of each season of a show, from season 1.
+    self.season_casts: Dict[int, List[List[int]]] = {}
+    self.tv_filmographies: Dict[int, List[int]] = {}
+    person_ids = list(self.people)
+    for movie_id in range(1, n_movies + 1):
+      self.movies[movie_id] = {
+        "id": movie_id,
+        "title": f"Movie {movie_id}",
+        "release_date": "{:04d}-{:02d}-{:02d}".format(
+          rng.randint(1950, 2023), rng.randint(1, 12), rng.randint(1, 28)),
+      }
+      cast = sorted(rng.sample(person_ids, min(cast_size, len(person_ids))))
+      self.casts[movie_id] = cast
+      for person_id in cast:
+        self.filmographies[person_id].append(movie_id)
+
+  def add_person(
+    self,
+    name: str,
+    known_for_department: str = "Acting",
+    popularity: float = 0.0) -> int:
+    """Add a person, homonyms of existing people are allowed."""
+    person_id = max(self.people, default=0) + 1
+    self.people[person_id] = {
+      "id": person_id,
+      "name": name,
+      "known_for_department": known_for_department,
+      "popularity": popularity,
+    }
+    self.filmographies[person_id] = []
+    return person_id
+
+  def add_movie(self, title: str, release_date: str, cast: List[int]) -> int:
+    """Add a movie with a known cast, useful to build test scenarios."""
+    movie_id = max(self.movies, default=0) + 1
+    self.movies[movie_id] = {
+      "id": movie_id, "title": title, "release_date": release_date}
+    self.casts[movie_id] = sorted(cast)
+    for person_id in cast:
+      self.filmographies.setdefault(person_id, []).append(movie_id)
+    return movie_id
+
+  def add_show(
+    self,
+    name: str,
+    first_air_date: str,
+    cast: List[int],
+    seasons: Optional[List[List[int]]] = None) -> int:
+    """
+    Add a TV show with a known cast, and optionally the cast of each of its
+    seasons (a single season with the whole cast by default).
+    """
+    show_id = max(self.shows, default=0) + 1
+    seasons = seasons or [cast]
+    self.shows[show_id] = {
+      "id": show_id, "name": name, "first_air_date": first_air_date,
+      "seasons": [{"season_number": n} for n in range(1, len(seasons) + 1)],
+    }
+    self.show_casts[show_id] = sorted(set(cast).union(*seasons))
+    self.season_casts[show_id] = [sorted(c) for c in seasons]
+    cast = self.show_casts[show_id]
+    for person_id in cast:
+      self.tv_filmographies.setdefault(person_id, []).append(show_id)
+    return show_id
+
+  # Endpoint implementations. Each returns (status, json body).
+
+  def search_person(self, params: Dict) -> Tuple[int, Dict]:
+    query = params.get("query", "").lower()
+    results = [
+      dict(p, known_for=[]) for p in self.people.values()
+      if p["name"].lower() == query
+    ]
+    results.sort(key=lambda p: p["popularity"], reverse=True)
+    return 200, self.paginate(results, params)
+
+  def search_movie(self, params: Dict) -> Tuple[int, Dict]:
+    query = params.get("query", "").lower()
+    results = [m for m in self.movies.values() if query in m["title"].lower()]
+    return 200, self.paginate(results, params)
+
+  def popular_people(self, params: Dict) -> Tuple[int, Dict]:
+    results = sorted(self.people.values(), key=lambda p: (-p["popularity"], p["id"]))
+    return 200, self.paginate([dict(p, known_for=[]) for p in results], params)
+
+  def person(self, person_id: int) -> Tuple[int, Dict]:
+    if person_id not in self.people:
+      return 404, {"status_code": 34}
+    return 200, dict(self.people[person_id])
+
+  def movie_credits(self, person_id: int) -> Tuple[int, Dict]:
+    if person_id not in self.people:
+      return 404, {"status_code": 34}
+    cast = [dict(self.movies[m]) for m in self.filmographies[person_id]]
+    return 200, {"id": person_id, "cast": cast, "crew": []}
+
+  def tv_credits(self, person_id: int) -> Tuple[int, Dict]:
+    if person_id not in self.people:
+      return 404, {"status_code": 34}
+    cast = [dict(self.shows[s]) for s in self.tv_filmographies.get(person_id, [])]
+    return 200, {"id": person_id, "cast": cast, "crew": []}
+
+  def combined_credits(self, person_id: int) -> Tuple[int, Dict]:
+    status, body = self.movie_credits(person_id)
+    for entry in body.get("cast", []):
+      entry["media_type"] = "movie"
+    for entry in self.tv_credits(person_id)[1].get("cast", []):
+      body["cast"].append(dict(entry, media_type="tv"))
+    return status, body
+
+  def movie(self, movie_id: int) -> Tuple[int, Dict]:
+    if movie_id not in self.movies:
+      return 404, {"status_code": 34}
+    return 200, dict(self.movies[movie_id])
+
+  def credits(self, movie_id: int) -> Tuple[int, Dict]:
+    if movie_id not in self.movies:
+      return 404, {"status_code": 34}
+    cast = [
+      {
+        "id": p, "name": self.people[p]["name"],
+        "known_for_department": self.people[p]["known_for_department"],
+      }
+      for p in self.casts[movie_id]
+    ]
+    return 200, {"id": movie_id, "cast": cast, "crew": []}
+
+  def show(self, show_id: int) -> Tuple[int, Dict]:
+    if show_id not in self.shows:
+      return 404, {"status_code": 34}
+    return 200, dict(self.shows[show_id])
+
+  def show_credits(self, show_id: int, part: str = "credits", season: int = 0) -> Tuple[int, Dict]:
+    """
+    Like the API, the credits of a show only list the cast of its latest
+    season, and its aggregate credits that of every season.
+    """
+    if show_id not in self.shows:
+      return 404, {"status_code": 34}
+    seasons = self.season_casts[show_id]
+    if part == "aggregate_credits":
+      person_ids = self.show_casts[show_id]
+    elif part == "season":
+      if not 1 <= season <= len(seasons):
+        return 404, {"status_code": 34}
+      person_ids = seasons[season - 1]
+    else:
+      person_ids = seasons[-1]
+    cast = [
+      {
+        "id": p, "name": self.people[p]["name"],
+        "known_for_department": self.people[p]["known_for_department"],
+      }
+      for p in person_ids
+    ]
+    # Seasons have ids of their own.
+    _id = show_id * 1000 + season if part == "season" else show_id
+    return 200, {"id": _id, "cast": cast, "crew": []}
+
+  def discover_movie(self, params: Dict) -> Tuple[int, Dict]:
+    with_cast = {
+      int(i) for i in re.split(r"[,|]", params.get("with_cast", "")) if i
+    }
+    results = [
+      dict(self.movies[m]) for m, cast in self.casts.items()
+      if with_cast <= set(cast)
+    ]
+    results.sort(key=lambda m: m["release_date"])
+    return 200, self.paginate(results, params)
+
+  def paginate(self, results: List[Dict], params: Dict) -> Dict:
+    page = int(params.get("page", 1))
+    total_pages = max(1, -(-len(results) // PAGE_SIZE))
+    start = (page - 1) * PAGE_SIZE
+    return {
+      "page": page,
+      "results": results[start:start + PAGE_SIZE],
+      "total_pages": total_pages,
+      "total_results": len(results),
+    }
+
+  def append_to_response(self, kind: str, _id: int, params: Dict) -> Tuple[int, Dict]:
+    """Details of a person or movie, with sub-resources appended."""
+    status, body = self.route(f"/3/{kind}/{_id}", {})
+    if status != 200:
+      return status, body
+    for part in params["append_to_response"].split(","):
+      part_status, part_body = self.route(f"/3/{kind}/{_id}/{part}", {})
+      if part_status == 200:
+        body[part] = part_body
+    return status, body
+
+  def route(self, path: str, params: Dict) -> Tuple[int, Dict]:
+    """Dispatch an API path such as "/3/movie/603/credits"."""
+    parts = [p for p in path.split("/") if p][1:]
+    if parts[:2] == ["search", "person"]:
+      return self.search_person(params)
+    if parts[:2] == ["search", "movie"]:
+      return self.search_movie(params)
+    if parts[:2] == ["discover", "movie"]:
+      return self.discover_movie(params)
+    if parts[:2] == ["discover", "tv"]:
+      return 200, self.paginate([], params)
+    if parts[:2] == ["person", "popular"]:
+      return self.popular_people(params)
+    if len(parts) == 2 and parts[1] == "changes":
+      results = [{"id": i, "adult": False} for i in self.changes.get(parts[0], [])]
+      return 200, self.paginate(results, params)
+    if len(parts) >= 2 and parts[1].isdigit():
+      _id = int(parts[1])
+      if len(parts) == 2 and params.get("append_to_response"):
+        return self.append_to_response(parts[0], _id, params)
+      if parts[0] == "person":
+        if len(parts) == 2:
+          return self.person(_id)
+        if parts[2] == "movie_credits":
+          return self.movie_credits(_id)
+        if parts[2] == "combined_credits":
+          return self.combined_credits(_id)
+        if parts[2] == "tv_credits":
+          return self.tv_credits(_id)
+      if parts[0] == "movie":
+        if len(parts) == 2:
+          return self.movie(_id)
+        if parts[2] == "credits":
+          return self.credits(_id)
+      if parts[0] == "tv":
+        if len(parts) == 2:
+          return self.show(_id)
+        if parts[2] in ("credits", "aggregate_credits"):
+          return self.show_credits(_id, parts[2])
+        if parts[2:5:2] == ["season", "credits"] and parts[3].isdigit():
+          return self.show_credits(_id, "season", int(parts[3]))
+    return 404, {"status_code": 34, "status_message": "Not found."}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+  # HTTP/1.1 so that clients can keep connections alive.
+  protocol_version = "HTTP/1.1"
+  # Headers and body are written separately, avoid delayed ACK stalls.
+  disable_nagle_algorithm = True
+
+  def setup(self) -> None:
+    super().setup()
+    self.server.count("connections")
+
+  def do_GET(self) -> None:
+    status, headers, payload = self.server.respond(self.path, self.headers.get("If-None-Match"))
+    self.send_response(status)
+    for name, value in headers.items():
+      self.send_header(name, value)
+    self.send_header("Content-Length", str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def log_message(self, format, *args) -> None:
+    pass
+
+
+class H2StubHandler(socketserver.BaseRequestHandler):
+  """
+  One HTTP/2 connection. Each request is answered from its own thread, so
+  that the streams of the connection are served concurrently, as by the API.
+  """
+
+  def handle(self) -> None:
+    import h2.config
+    import h2.connection
+    import h2.events
+    self.server.count("connections")
+    self.conn = h2.connection.H2Connection(
+      h2.config.H2Configuration(client_side=False, header_encoding="utf-8"))
+    # Guards the connection state and the socket, notified on window updates.
+    self.cond = threading.Condition()
+    self.closed = False
+    requests: Dict[int, Dict[str, str]] = {}
+    with self.cond:
+      self.conn.initiate_connection()
+      self.request.sendall(self.conn.data_to_send())
+    try:
+      while True:
+        data = self.request.recv(65536)
+        if not data:
+          return
+        with self.cond:
+          events = self.conn.receive_data(data)
+          self.request.sendall(self.conn.data_to_send())
+          self.cond.notify_all()
+        for event in events:
+          if isinstance(event, h2.events.RequestReceived):
+            requests[event.stream_id] = dict(event.headers)
+          elif isinstance(event, h2.events.StreamEnded):
+            headers = requests.pop(event.stream_id, {})
+            threading.Thread(
+              target=self.answer, args=(event.stream_id, headers), daemon=True).start()
+          elif isinstance(event, h2.events.ConnectionTerminated):
+            return
+    except OSError:
+      return
+    finally:
+      with self.cond:
+        self.closed = True
+        self.cond.notify_all()
+
+  def answer(self, stream_id: int, headers: Dict[str, str]) -> None:
+    import h2.exceptions
+    try:
+      self.send(stream_id, headers)
+    except (h2.exceptions.StreamClosedError, OSError):
+      # Reset by the client, or the connection is gone.
+      pass
+
+  def send(self, stream_id: int, headers: Dict[str, str]) -> None:
+    status, response_headers, payload = self.server.respond(
+      headers.get(":path", "/"), headers.get("if-none-match"))
+    fields = [(":status", str(status)), ("content-length", str(len(payload)))]
+    fields.extend((name.lower(), value) for name, value in response_headers.items())
+    with self.cond:
+      if self.closed:
+        return
+      self.conn.send_headers(stream_id, fields, end_stream=not payload)
+      while payload:
+        size = min(
+          len(payload),
+          self.conn.local_flow_control_window(stream_id),
+          self.conn.max_outbound_frame_size)
+        if size <= 0:
+          # Wait for the client to open its flow control window.
+          self.request.sendall(self.conn.data_to_send())
+          self.cond.wait(1.0)
+          if self.closed:
+            return
+          continue
+        self.conn.send_data(stream_id, payload[:size], end_stream=size == len(payload))
+        payload = payload[size:]
+      self.request.sendall(self.conn.data_to_send())
+
+
+class StubServer(ThreadingHTTPServer):
+  daemon_threads = True
+  # Accept bursts of new connections, from concurrent fan-outs, without
+  # dropping any: a dropped connection is only retried after a second.
+  request_queue_size = 128
+
+  def __init__(
+    self,
+    catalog: Optional[StubCatalog] = None,
+    latency: float = 0.0,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    http2: bool = False) -> None:
+    super().__init__((host, port), H2StubHandler if http2 else StubHandler)
+    self.catalog = catalog or StubCatalog()
+    self.latency = latency
+    self.counters = {"connections": 0, "requests": 0, "not_modified": 0}
+    self.faults: List[Tuple[int, Dict]] = []
+    self._counter_lock = threading.Lock()
+    self._thread: Optional[threading.Thread] = None
+
+  @property
+  def url(self) -> str:
+    host, port = self.server_address[:2]
+    return f"http://{host}:{port}"
+
+  def count(self, name: str) -> None:
+    with self._counter_lock:
+      self.counters[name] += 1
+
+  def respond(self, path: str, if_none_match: Optional[str] = None) -> Tuple[int, Dict, bytes]:
+    """
+    Answer a GET request, after the simulated latency.
+    Args:
+      path: str. Path and query string of the request.
+      if_none_match: str <optional>. The If-None-Match header of the request.
+    Returns:
+      A tuple of the status, the response headers and the body.
+    """
+    self.count("requests")
+    if self.latency:
+      time.sleep(self.latency)
+    fault = self.next_fault()
+    if fault is not None:
+      status, headers = fault
+      payload = json.dumps({"status_code": 25, "status_message": "Injected fault."}).encode("utf-8")
+      return status, headers, payload
+    url = urlsplit(path)
+    params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+    status, body = self.catalog.route(url.path, params)
+    payload = json.dumps(body).encode("utf-8")
+    etag = f'"{hashlib.md5(payload).hexdigest()}"'
+    if status == 200 and if_none_match == etag:
+      self.count("not_modified")
+      status, payload = 304, b""
+    headers = {"Content-Type": "application/json;charset=utf-8", "ETag": etag}
+    return status, headers, payload
+
+  def inject(self, status: int, count: int = 1, headers: Optional[Dict] = None) -> None:
+    """Answer the next count requests with an error status, e.g. 429 or 503."""
+    with self._counter_lock:
+      self.faults.extend([(status, headers or {})] * count)
+
+  def next_fault(self) -> Optional[Tuple[int, Dict]]:
+    with self._counter_lock:
+      return self.faults.pop(0) if self.faults else None
+
+  def reset_counters(self) -> None:
+    with self._counter_lock:
+      self.counters = {k: 0 for k in self.counters}
+
+  def start(self) -> "StubServer":
+    self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self) -> None:
+    self.shutdown()
+    self.server_close()
+
+  def __enter__(self) -> "StubServer":
+    return self.start()
+
+  def __exit__(self, *exc) -> None:
+    self.stop()
+
+
+if __name__ == "__main__":
+  import argparse
+  parser = argparse.ArgumentParser(description="Serve a fake TMDB API locally.")
+  parser.add_argument("--port", type=int, default=8008)
+  parser.add_argument("--latency", type=float, default=0.0,
+                      help="simulated latency per request, in seconds")
+  parser.add_argument("--http2", action="store_true",
+                      help="speak HTTP/2 (without TLS) instead of HTTP/1.1")
+  pargs = parser.parse_args()
+  server = StubServer(latency=pargs.latency, port=pargs.port, http2=pargs.http2)
+  print(f"Serving fake TMDB API on {server.url}{' (HTTP/2)' if pargs.http2 else ''}")
+  server.serve_forever()
@@ -0,0 +1,218 @@
+"""
+Offline benchmark suite of the query paths, replaying recorded responses
+(see tmdb_client.cassette) with a simulated latency, so that it can run in
+CI without an API key or network.
+
+By default the responses are recorded from the local stub of the API on a
+first, untimed run. A cassette recorded from the real API can be replayed
+instead, together with the actors it was recorded for:
+
+  python -m bench.suite --cassette cassettes/matrix.json.gz --actors "Keanu Reeves" "Laurence Fishburne"
+
+Every run is appended to a history file, and compared with the previous run
+of the same settings. --max-regression makes the suite fail when a median
+time grows by more than the given percentage.
+
+Run from the tmdb_query directory:
+  python -m bench.suite --rounds 5 --latency 0.02
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from itertools import islice
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("TMDB_API_KEY", "0" * 32)
+
+from bench.stub_server import StubCatalog, StubServer
+from tmdb_client import cache, cassette, ratelimit, tmdb
+import cli
+
+# Benchmarks, by name: fn(names, actor_ids).
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str) -> Callable:
+  def register(fn: Callable) -> Callable:
+    BENCHMARKS[name] = fn
+    return fn
+  return register
+
+
+@benchmark("resolve_actors")
+def bench_resolve_actors(names, actor_ids):
+  for name in names:
+    cli.get_ensured_actor_id(name, interactive=False)
+
+
+@benchmark("discover_movies_for_ids")
+def bench_discover_movies_for_ids(names, actor_ids):
+  cli.discover_movies_for_ids(actor_ids)
+
+
+@benchmark("get_common_movies_for_ids")
+def bench_get_common_movies_for_ids(names, actor_ids):
+  cli.get_common_movies_for_ids(actor_ids)
+
+
+@benchmark("get_common_movies[discover]")
+def bench_get_common_movies_discover(names, actor_ids):
+  cli.get_common_movies(names, method="discover", interactive=False)
+
+
+@benchmark("get_common_movies[credits]")
+def bench_get_common_movies_credits(names, actor_ids):
+  cli.get_common_movies(names, method="credits", interactive=False)
+
+
+@benchmark("iter_common_movies[first 5]")
+def bench_iter_common_movies(names, actor_ids):
+  list(islice(cli.iter_common_movies(names, interactive=False), 5))
+
+
+def run_benchmarks(names, actor_ids, rounds: int, only: Optional[List[str]] = None) -> Dict[str, Dict]:
+  results = {}
+  for name, fn in BENCHMARKS.items():
+    if only and name not in only:
+      continue
+    times = []
+    for _ in range(rounds):
+      # Measure requests, not the response cache.
+      cache.set_cache(None)
+      start = time.perf_counter()
+      fn(names, actor_ids)
+      times.append(time.perf_counter() - start)
+    results[name] = {
+      "rounds": rounds,
+      "min": min(times),
+      "median": statistics.median(times),
+      "mean": statistics.mean(times),
+      "stddev": statistics.stdev(times) if rounds > 1 else 0.0,
+    }
+  return results
+
+
+def stub_catalog(n_shared: int) -> StubCatalog:
+  catalog = StubCatalog()
+  for i in range(n_shared):
+    catalog.add_movie(f"Shared {i}", f"{1990 + i % 30}-06-{1 + i % 28:02d}", [1, 2])
+  return catalog
+
+
+def git_commit() -> Optional[str]:
+  try:
+    return subprocess.run(
+      ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+    ).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def read_history(path: str) -> List[Dict]:
+  if not os.path.exists(path):
+    return []
+  with open(path, encoding="utf-8") as f:
+    return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(results: Dict[str, Dict], previous: Optional[Dict]) -> Dict[str, Optional[float]]:
+  """
+  Returns:
+    The change of each median time since the previous run, in percent.
+  """
+  changes = {}
+  for name, result in results.items():
+    before = (previous or {}).get("results", {}).get(name)
+    changes[name] = (
+      (result["median"] / before["median"] - 1) * 100 if before and before["median"] else None)
+  return changes
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--rounds", type=int, default=5)
+  parser.add_argument("--latency", type=float, default=0.02,
+                      help="simulated latency of each replayed response, in seconds")
+  parser.add_argument("--cassette", metavar="FILE",
+                      help="replay this cassette instead of recording from the stub")
+  parser.add_argument("--record", action="store_true",
+                      help="record the responses missing from --cassette with the API")
+  parser.add_argument("--actors", nargs="+", default=["Actor 1", "Actor 2"])
+  parser.add_argument("--shared", type=int, default=30,
+                      help="movies shared by the stub actors")
+  parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmarks to run")
+  parser.add_argument("--history", metavar="FILE", default=os.path.join(".benchmarks", "history.jsonl"))
+  parser.add_argument("--no-save", action="store_true", help="do not append this run to the history")
+  parser.add_argument("--max-regression", type=float, metavar="PCT",
+                      help="fail if a median time grew by more than PCT%% since the previous run")
+  pargs = parser.parse_args(args)
+
+  names = set(pargs.actors)
+  stub = None
+  if pargs.cassette:
+    recorder = cassette.Cassette(pargs.cassette, "once" if pargs.record else "replay", pargs.latency)
+  else:
+    ratelimit.configure(rate=0)
+    stub = StubServer(stub_catalog(pargs.shared)).start()
+    tmdb.API_BASE_URL = stub.url
+    recorder = cassette.Cassette(mode="once")
+  cassette.set_cassette(recorder)
+  try:
+    # Untimed run, which records the responses from the stub.
+    actor_ids = {cli.get_ensured_actor_id(n, interactive=False) for n in names}
+    run_benchmarks(names, actor_ids, 1, pargs.only)
+    if stub is not None:
+      stub.stop()
+      stub = None
+      recorder.mode = "replay"
+    recorder.latency = pargs.latency
+    results = run_benchmarks(names, actor_ids, pargs.rounds, pargs.only)
+  finally:
+    cassette.set_cassette(None)
+    recorder.close()
+    if stub is not None:
+      stub.stop()
+
+  settings = {
+    "latency": pargs.latency,
+    "cassette": os.path.basename(pargs.cassette) if pargs.cassette else "stub",
+    "actors": sorted(names),
+  }
+  history = read_history(pargs.history)
+  previous = next((run for run in reversed(history) if run.get("settings") == settings), None)
+  changes = compare(results, previous)
+
+  print(f"{'benchmark':<30} {'min ms':>9} {'median ms':>10} {'mean ms':>9} {'stddev':>8} {'change':>8}")
+  for name, r in results.items():
+    change = f"{changes[name]:+.1f}%" if changes[name] is not None else "-"
+    print(f"{name:<30} {r['min'] * 1000:>9.1f} {r['median'] * 1000:>10.1f} "
+          f"{r['mean'] * 1000:>9.1f} {r['stddev'] * 1000:>8.1f} {change:>8}")
+  if previous:
+    print(f"Compared with {previous.get('commit') or 'unknown commit'} of {previous['time']}.")
+
+  if not pargs.no_save:
+    if os.path.dirname(pargs.history):
+      os.makedirs(os.path.dirname(pargs.history), exist_ok=True)
+    with open(pargs.history, "a", encoding="utf-8") as f:
+      f.write(json.dumps({
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "settings": settings,
+        "results": results,
+      }) + "\n")
+
+  if pargs.max_regression is not None:
+    regressions = [n for n, c in changes.items() if c is not None and c > pargs.max_regression]
+    if regressions:
+      print(f"Regressions over {pargs.max_regression}%: {', '.join(regressions)}")
+      return 1
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
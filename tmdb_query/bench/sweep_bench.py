@@ -0,0 +1,66 @@
+"""
+Scaling of the co-star sweep with the number of worker processes, on a
+synthetic filmography snapshot (no API calls).
+
+Run from the tmdb_query directory:
+  python -m bench.sweep_bench --actors 5000 --movies 60000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import costar_index
+import sweep
+
+
+def synthetic_snapshot(path: str, n_actors: int, n_movies: int, cast_size: int, seed: int = 0) -> None:
+  """
+  Casts drawn with a skewed popularity, so that some actors have long filmographies.
+  """
+  rng = random.Random(seed)
+  actors = list(range(1, n_actors + 1))
+  weights = [1 / (rank ** 0.8) for rank in actors]
+  casts = {}
+  for movie_id in range(1, n_movies + 1):
+    casts[movie_id] = set(rng.choices(actors, weights, k=cast_size))
+  # Every actor has at least one movie.
+  for actor_id in actors:
+    casts[rng.randint(1, n_movies)].add(actor_id)
+  movies = {m: (f"Movie {m}", f"{1950 + m % 70}-01-01") for m in casts}
+  costar_index.CostarIndex.build(path, casts, movies)
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--actors", type=int, default=5000)
+  parser.add_argument("--movies", type=int, default=60000)
+  parser.add_argument("--cast", type=int, default=12)
+  parser.add_argument("--min-shared", type=int, default=1)
+  parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+  pargs = parser.parse_args(args)
+
+  tmp = tempfile.mkdtemp(prefix="sweep_bench")
+  try:
+    snapshot = os.path.join(tmp, "snapshot")
+    synthetic_snapshot(snapshot, pargs.actors, pargs.movies, pargs.cast)
+    actor_ids = list(range(1, pargs.actors + 1))
+    print(f"{pargs.actors * (pargs.actors - 1) // 2} pairs, {pargs.movies} movies.")
+    print(f"{'workers':>7} {'seconds':>9} {'speedup':>8} {'matches':>10}")
+    baseline = None
+    for workers in pargs.workers:
+      sweep_dir = os.path.join(tmp, f"sweep{workers}")
+      shutil.copytree(snapshot, os.path.join(sweep_dir, "snapshot"))
+      start = time.perf_counter()
+      result = sweep.sweep(sweep_dir, actor_ids, workers, min_shared=pargs.min_shared)
+      elapsed = time.perf_counter() - start
+      baseline = baseline or elapsed
+      print(f"{workers:>7} {elapsed:>9.2f} {baseline / elapsed:>8.2f} {result['matches']:>10}")
+  finally:
+    shutil.rmtree(tmp)
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
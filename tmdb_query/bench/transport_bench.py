@@ -0,0 +1,82 @@
+"""
+Latency and connection count of a concurrent fan-out of requests, with the
+HTTP/1.1 connection pools of requests and with a single multiplexed HTTP/2
+connection, against a local stub of the TMDB API.
+
+Run from the tmdb_query directory (the http2 transport needs httpx[http2]):
+  python -m bench.transport_bench --requests 200 --concurrency 50 --latency 0.05
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+# The client checks the key before sending requests, the stub server ignores it.
+os.environ.setdefault("TMDB_API_KEY", "0" * 32)
+
+from bench.stub_server import StubCatalog, StubServer
+from tmdb_client import ratelimit, session, tmdb
+from tmdb_client.movie import Movie
+
+
+def run(transport: str, n_requests: int, concurrency: int, latency: float) -> Dict:
+  """
+  Fetch the credits of n_requests distinct movies from concurrency threads.
+  """
+  catalog = StubCatalog(n_movies=n_requests)
+  session.configure(transport=transport, scope="thread", pool_maxsize=concurrency)
+  with StubServer(catalog, latency=latency, http2=transport == "http2") as server:
+    tmdb.API_BASE_URL = server.url
+    # Import the modules of the transport before timing.
+    session.get_transport()
+
+    def fetch(movie_id: int) -> float:
+      start = time.perf_counter()
+      Movie(movie_id).credits()
+      return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+      latencies = sorted(pool.map(fetch, range(1, n_requests + 1)))
+    elapsed = time.perf_counter() - start
+    session.close_sessions()
+    return {
+      "transport": transport,
+      "requests": server.counters["requests"],
+      "seconds": elapsed,
+      "p50": statistics.median(latencies),
+      "p95": latencies[int(0.95 * (len(latencies) - 1))],
+      "connections": server.counters["connections"],
+    }
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument("--requests", type=int, default=200)
+  parser.add_argument("--concurrency", type=int, default=50,
+                      help="number of requests in flight")
+  parser.add_argument("--latency", type=float, default=0.05,
+                      help="simulated server latency per request, in seconds")
+  parser.add_argument("--transports", nargs="+", default=list(session.TRANSPORTS),
+                      choices=list(session.TRANSPORTS))
+  pargs = parser.parse_args(args)
+
+  # Measure the transport, not the client-side rate limit.
+  ratelimit.configure(rate=0)
+  print(f"{'transport':>9} {'requests':>9} {'seconds':>8} {'req/s':>8} "
+        f"{'p50 ms':>7} {'p95 ms':>7} {'connections':>12}")
+  try:
+    for transport in pargs.transports:
+      r = run(transport, pargs.requests, pargs.concurrency, pargs.latency)
+      print(f"{r['transport']:>9} {r['requests']:>9} {r['seconds']:>8.2f} "
+            f"{r['requests'] / r['seconds']:>8.1f} {r['p50'] * 1000:>7.1f} "
+            f"{r['p95'] * 1000:>7.1f} {r['connections']:>12}")
+  finally:
+    session.configure(transport="requests")
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
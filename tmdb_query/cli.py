@@ -2,50 +2,187 @@
 import logging
 import sys
 import argparse
-from typing import AbstractSet, List, Dict
+from importlib import import_module
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+from typing import TYPE_CHECKING, AbstractSet, Callable, Iterable, Iterator, List, Dict, Optional, Set, Tuple
 from tmdb_client.search import Discover, Search
 from tmdb_client.util import (
-  add_all_to, get_first_known_key, get_movie_cast, 
-  get_movies_id_for_actor_id, is_actor
+  add_all_to, get_combined_filmography, get_filmography, get_movie_cast, is_actor
 )
 from tmdb_client.exceptions import NotAnActor, NameNotFound
+from tmdb_client.models import MediaSummary, MovieSummary, Page, PersonSummary
+from tmdb_client import cache, instrument
+
+if TYPE_CHECKING:
+  # Imported on first use: the local indexes are optional.
+  import costar_index
 
 log = logging.getLogger("tmdb_client")
 logging.basicConfig()
 # log.setLevel(logging.DEBUG)
 
+# Maximum number of concurrent requests when checking filmographies and casts.
+MAX_WORKERS = 8
+# Ways of finding common movies, see get_common_movies().
+METHODS = ("discover", "credits", "combined")
+# Person sub-resources read by each method, fetched along with the details
+# of an actor when those are needed to resolve the name.
+METHOD_CREDITS = {"credits": ("movie_credits",), "combined": ("combined_credits",)}
+# Maximum number of requests sent ahead while the user picks among homonyms,
+# see Prefetcher.
+PREFETCH_BUDGET = 8
+# Commands other than the default query, given as first argument, and the
+# module whose main() implements them. Imported on demand.
+COMMANDS = {
+  "update-index": "costar_index",
+  "serve": "server",
+  "batch": "batch",
+  "sweep": "sweep",
+  "graph": "costar_graph",
+  "update-names": "name_index",
+}
+
+
+class Prefetcher():
+  """
+  Speculative requests sent in the background while the user picks an actor
+  among homonyms, so that the query is mostly computed once they answer: the
+  searches of the names left to resolve, then the filmography of each
+  candidate, or with the "discover" method, the first Discover page of each
+  candidate with the actors already resolved. The most popular candidates go
+  first, within a budget of requests.
+
+  Responses land in the response cache, which must be enabled. Those of the
+  candidates which were not picked are cancelled if not started yet, or else
+  kept in the cache.
+  """
+
+  def __init__(self, method: str = "discover", budget: int = PREFETCH_BUDGET) -> None:
+    self.method = method
+    self.budget = budget
+    # Ids of the actors resolved so far, and names left to resolve.
+    self.resolved: Set[int] = set()
+    self.pending: List[str] = []
+    self.sent = 0
+    self.cancelled = 0
+    self._pool: Optional[ThreadPoolExecutor] = None
+    self._futures: List[Tuple[Optional[int], Future]] = []
+
+  def tasks(self, candidates: List[PersonSummary]) -> List[Tuple[Optional[int], Callable, object]]:
+    """
+    Returns:
+      (candidate id, function, argument) tuples, most useful first. The
+      candidate id is None for requests needed whatever the choice.
+    """
+    tasks: List[Tuple[Optional[int], Callable, object]] = [
+      (None, lambda name: Search().person(query=name), name) for name in self.pending]
+    for candidate in sorted(candidates, key=lambda r: -r.popularity):
+      _id = candidate.id
+      if self.method == "discover":
+        if self.resolved:
+          tasks.append((_id, discover_first_page, self.resolved | {_id}))
+      elif self.method == "combined":
+        tasks.append((_id, get_combined_filmography, _id))
+      else:
+        tasks.append((_id, get_filmography, _id))
+    return tasks[:self.budget]
+
+  def start(self, candidates: List[PersonSummary]) -> None:
+    """Send the requests for candidates in the background."""
+    if self.budget <= 0 or cache.get_cache() is None:
+      return
+    tasks = self.tasks(candidates)
+    if not tasks:
+      return
+    self._pool = ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(tasks)))
+    for _id, fn, arg in tasks:
+      self._futures.append((_id, self._pool.submit(instrument.bind(fn), arg)))
+    self.sent += len(tasks)
+    self.budget -= len(tasks)
+    self.pending = []
+
+  def finish(self, chosen_id: int) -> None:
+    """Cancel the requests for the other candidates which are not started yet."""
+    self.resolved.add(chosen_id)
+    for _id, future in self._futures:
+      if _id not in (None, chosen_id) and future.cancel():
+        self.cancelled += 1
+    self._futures = []
+    if self._pool is not None:
+      # Requests in flight complete in the background.
+      self._pool.shutdown(wait=False)
+      self._pool = None
 
-def search_actor_by_name(name: str) -> Dict:
+
+def search_actor_by_name(
+  name: str,
+  interactive: bool = True,
+  prefetcher: Optional[Prefetcher] = None) -> PersonSummary:
   """
-  For a given name, get the dictionary-like object returned by the Search API
-  enpoint of TMDB, filtering out people who are not known for being actors.
+  For a given name, get the result returned by the Search API enpoint of
+  TMDB, filtering out people who are not known for being actors.
   This may require user input if homonyms are found.
+  Names are looked up in the local name index first when one is configured
+  (see name_index), which also remembers the homonyms picked by the user.
   Args:
     name: str. Name of the actor to lookup.
+    interactive: bool. If False, nothing is printed and the most popular
+      actor is picked among homonyms instead of asking the user.
+    prefetcher: Prefetcher <optional>. Started while the user picks among
+      homonyms.
   Returns:
-    A dictionary representing a Search result for this actor.
+    The Search result for this actor.
   """
-  lookup = Search()
-  log.debug(f"Lookup for \"{name}\":\n{lookup.person(query=name)}")
+  import name_index
+  index = name_index.get_index()
+  if index is not None and index.is_miss(name):
+    raise NameNotFound(f"No result found for name \"{name}\".")
+  results = index.lookup(name) if index is not None else None
+  if results is None:
+    lookup = Search()
+    results = lookup.person(query=name).results
+    log.debug(f"Lookup for \"{name}\":\n{results}")
+    if not results and index is not None:
+      # Maybe a typo of a known name.
+      if (corrected := index.canonical(name)) and corrected != name:
+        log.debug(f"Lookup for \"{corrected}\" instead of \"{name}\".")
+        results = lookup.person(query=corrected).results
+    if index is not None:
+      if results:
+        index.add_results(name, results)
+      else:
+        index.add_miss(name)
 
-  results = getattr(lookup, "results", [])
   if not results:
     raise NameNotFound(f"No result found for name \"{name}\".")
 
   # We only care about actors
-  results = [n for n in results if n.get("known_for_department", "") == "Acting"]  
+  results = [n for n in results if n.is_actor]
   if not results:
     raise NotAnActor(f"No actor found named \"{name}\".")
 
+  if index is not None and len(results) > 1:
+    chosen = index.choice(name)
+    for result in results:
+      if result.id == chosen:
+        return result
+
+  if not interactive:
+    return pick_most_popular(results)
+
   if len(results) == 1:
     print(
       "Found one actor named \"{}\", known for: {}.".format(
         name,
-        ", ".join(get_first_known_key(n) for n in results[0].get("known_for", []))
+        ", ".join(results[0].known_for)
       )
     )
   # Handling homonymous people requires user input
   else:
+    if prefetcher is not None:
+      prefetcher.start(results)
     print(f"Found more than one actor with the name \"{name}\"."
           "Please select an actor:")
     for result in results:
@@ -53,50 +190,115 @@ def search_actor_by_name(name: str) -> Dict:
         "{}. {}, known for: {}.".format(
           results.index(result) + 1, 
           name,
-          ", ".join(get_first_known_key(n) for n in result.get("known_for", [])))
+          ", ".join(result.known_for))
       )
 
     input_index = -1
     while input_index < 1 or input_index > len(results):
       input_index = int(input("Input a choice number: "))
+    if index is not None:
+      index.remember(name, results[input_index - 1].id)
+    if prefetcher is not None:
+      prefetcher.finish(results[input_index - 1].id)
     return results[input_index - 1]
 
   return results[0]
 
 
-def get_common_movies_for_ids(actor_ids: AbstractSet[int]) -> List[str]:
+def pick_most_popular(results: List[PersonSummary]) -> PersonSummary:
   """
-  Retrieve movies where all actors in actor_ids were part of the cast.
-  This method is particularly slow. It first retrieves all movies where an actor 
-  was part of the cast, and for each movie it then checks if the other actor ids 
-  are also part of the cast. Beware: this may potentially make a lot of API requests.
+  Deterministic choice among homonyms: highest popularity, then lowest id.
+  """
+  return max(results, key=lambda r: (r.popularity, -r.id))
+
+
+def get_common_movies_for_ids(
+  actor_ids: AbstractSet[int],
+  verify: bool = True) -> List[str]:
+  """
+  Retrieve movies where all actors in actor_ids were part of the cast, without
+  relying on the Discover API.
+  The filmography of each actor is fetched once (concurrently), then intersected
+  locally starting from the smallest one. Only the surviving candidates have
+  their cast checked, also concurrently.
   Args:
     actor_ids: set. Set of actor ids as ints.
+    verify: bool. Check the cast of each candidate movie, keeping only those
+      where the other actors are credited as actors. This costs one request
+      per candidate.
   Returns:
-    A list of movie titles as strings.
+    A list of movie titles as strings, sorted by release date.
   """
-  common_movies_map: Dict[int, str] = {}
-  
-  for actor_id in actor_ids:
-    other_actors = set([a_id for a_id in actor_ids if a_id is not actor_id])
-    
-    # Get all movies 
-    movie_ids = get_movies_id_for_actor_id(actor_id)
-    log.debug(f"Movie IDs: {movie_ids}")
-    
-    for movie_id, movie_title in movie_ids.items():
-      cast_ids = get_movie_cast(movie_id)
-      # Test if other_actors is a subset of cast_ids, which ensure that ALL the
-      # other_actors are part of this movie's cast.
-      if other_actors <= cast_ids:
-        common_movies_map[movie_id] = movie_title
-    
-    if len(actor_ids) <= 2:
-      # No need to check the other actor if we only have 2.
-      log.debug("Only two actors compared. Ending movie cast lookup.")
-      break
-  log.debug(f"Found {len(common_movies_map)} movies: {common_movies_map}")
-  return [m for m in common_movies_map.values()]
+  actor_ids = list(actor_ids)
+  with instrument.phase("filmographies"), \
+      ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(actor_ids))) as pool:
+    filmographies = dict(zip(actor_ids, pool.map(instrument.bind(get_filmography), actor_ids)))
+
+  with instrument.phase("intersect"):
+    # The smallest filmography bounds the number of candidates.
+    pivot = min(actor_ids, key=lambda a_id: len(filmographies[a_id]))
+    candidates = {
+      movie_id: movie for movie_id, movie in filmographies[pivot].items()
+      if all(movie_id in filmographies[a_id] for a_id in actor_ids)
+    }
+  log.debug(f"Pivot actor {pivot}, {len(candidates)} candidate movies: {list(candidates)}")
+
+  if verify and candidates:
+    other_actors = set(actor_ids) - {pivot}
+    with instrument.phase("verify"), \
+        ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(candidates))) as pool:
+      casts = dict(zip(candidates, pool.map(instrument.bind(get_movie_cast), candidates)))
+    candidates = {
+      movie_id: movie for movie_id, movie in candidates.items()
+      # Ensure that ALL the other actors are part of this movie's cast.
+      if other_actors <= casts[movie_id]
+    }
+
+  log.debug(f"Found {len(candidates)} movies: {candidates}")
+  movies = sorted(candidates.values(), key=MovieSummary.sort_key)
+  return [m.title for m in movies]
+
+
+def get_common_credits_for_ids(actor_ids: AbstractSet[int]) -> List[MediaSummary]:
+  """
+  Retrieve the movies and TV shows where all actors in actor_ids were part of
+  the cast, from one combined_credits request per actor intersected locally
+  on (media_type, id). No cast needs to be checked: the credits of an actor
+  only list the titles they were cast in.
+  Args:
+    actor_ids: set. Set of actor ids as ints.
+  Returns:
+    A list of movies and shows, sorted by release or first air date.
+  """
+  actor_ids = list(actor_ids)
+  with instrument.phase("filmographies"), \
+      ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(actor_ids))) as pool:
+    credits = list(pool.map(instrument.bind(get_combined_filmography), actor_ids))
+
+  with instrument.phase("intersect"):
+    smallest = min(credits, key=len)
+    common = [m for key, m in smallest.items() if all(key in c for c in credits)]
+  return sorted(common, key=MediaSummary.sort_key)
+
+
+def discover_params(actor_ids: AbstractSet[int]) -> Dict:
+  """
+  Discover parameters for the movies of actor_ids. Ids are sorted, so that the
+  same actors always make the same request, e.g. one prefetched earlier.
+  """
+  return {
+    "with_cast": ",".join(str(_id) for _id in sorted(actor_ids)),
+    "sort_by": "release_date.asc"
+  }
+
+
+def discover_first_page(actor_ids: AbstractSet[int]) -> Page[MovieSummary]:
+  """
+  Returns:
+    The first page of the Discover results for actor_ids, as requested by
+    discover_movies_for_ids().
+  """
+  return Discover().movie(page=1, **discover_params(actor_ids))
 
 
 def discover_movies_for_ids(actor_ids: AbstractSet[int]) -> List[str]:
@@ -113,83 +315,232 @@ def discover_movies_for_ids(actor_ids: AbstractSet[int]) -> List[str]:
   # The TMDB API already provides us with a convenience method to get movies
   # with this cast combination:
   d = Discover()
-  params = {
-    "with_cast": ",".join((str(_id) for _id in actor_ids)),
-    "sort_by": "release_date.asc"
-  }
+  params = discover_params(actor_ids)
   # This should translate to an enpoint similar to:
   # f"discover/movie?with_cast=Name1,Name2&sort_by=release_date.asc"
-  _json = d.movie(**params)
-  total_results = _json.get("total_results", 0)
+  # Once the first page gives us total_pages, the remaining pages are
+  # fetched concurrently and merged back in order.
+  page = d.movie(all_pages=True, **params)
   movies = []
-  if not total_results:
+  if not page.total_results:
     return movies
 
-  add_all_to(movies, d)
-  # Fetch all remaining pages:
-  while getattr(d, "page") < getattr(d, "total_pages", 1):
-    params.update( {"page": str(getattr(d, "page") + 1)} )
-    _json = d.movie(**params)
-    add_all_to(movies, d)
-
+  add_all_to(movies, page)
   return movies
 
 
-def get_common_movies(names: AbstractSet[str]) -> List[str]:
+def get_common_movies(
+  names: AbstractSet[str],
+  method: str = "discover",
+  index: Optional["costar_index.CostarIndex"] = None,
+  interactive: bool = True,
+  prefetch_budget: int = 0) -> List[str]:
   """
   Find movies for which all actors in names have been cast together.
   Args:
     names: set of strings. Names of the actors to look up.
+    method: str. "discover" to let the Discover API do the work, or "credits"
+      to intersect the filmographies of the actors locally. The latter is
+      useful when Discover results are incomplete or rate limited.
+      "combined" also covers TV shows, from the combined credits of the
+      actors, and labels each title with its media type and date.
+    index: CostarIndex <optional>. Look up the movies in this local index
+      instead of using the API. Only actor names are resolved with the API.
+    interactive: bool. See search_actor_by_name().
+    prefetch_budget: int. Maximum number of requests sent ahead while the
+      user picks among homonyms, see Prefetcher. 0 to disable.
   Returns:
     A list of movie titles as strings.
   """
+  actor_ids = get_actor_ids(
+    names, interactive, _prefetcher(method, index, interactive, prefetch_budget),
+    _credits(method, index))
+  return get_common_movies_for_actor_ids(actor_ids, method, index)
+
+
+def iter_common_movies(
+  names: AbstractSet[str],
+  method: str = "discover",
+  index: Optional["costar_index.CostarIndex"] = None,
+  interactive: bool = True,
+  prefetch: int = 1,
+  prefetch_budget: int = 0) -> Iterator[str]:
+  """
+  Lazy variant of get_common_movies(). With the "discover" method, pages of
+  results are only fetched as titles are consumed, so that taking the first
+  few movies costs a single page:
+
+  >>> list(islice(iter_common_movies({"Keanu Reeves", "Laurence Fishburne"}), 5))
+  Args:
+    prefetch: int. Number of Discover pages fetched ahead.
+    See get_common_movies() for the other arguments.
+  Returns:
+    An iterator of movie titles as strings, sorted by release date.
+  """
+  actor_ids = get_actor_ids(
+    names, interactive, _prefetcher(method, index, interactive, prefetch_budget),
+    _credits(method, index))
+  if index is not None or method != "discover":
+    yield from get_common_movies_for_actor_ids(actor_ids, method, index)
+    return
+  movies = Discover().iter_movie(prefetch=prefetch, **discover_params(actor_ids))
+  for movie in movies:
+    yield movie.title
+
+
+def _prefetcher(
+  method: str,
+  index: Optional["costar_index.CostarIndex"],
+  interactive: bool,
+  budget: int) -> Optional[Prefetcher]:
+  # Only the API calls of the query are worth sending ahead.
+  if not interactive or budget <= 0 or index is not None:
+    return None
+  return Prefetcher(method, budget)
+
+
+def _credits(method: str, index: Optional["costar_index.CostarIndex"]) -> Tuple[str, ...]:
+  return METHOD_CREDITS.get(method, ()) if index is None else ()
+
+
+def get_actor_ids(
+  names: AbstractSet[str],
+  interactive: bool = True,
+  prefetcher: Optional[Prefetcher] = None,
+  coalesce: Iterable[str] = ()) -> AbstractSet[int]:
+  """
+  Args:
+    names: set of strings. Names of the actors to look up.
+    interactive: bool. See search_actor_by_name().
+    prefetcher: Prefetcher <optional>. See search_actor_by_name().
+    coalesce: iterable of strings. See get_ensured_actor_id().
+  Returns:
+    The set of actor ids for names. At least 2 are required.
+  """
   actor_ids = set()
-  for name in names:
-    actor_id = get_ensured_actor_id(name)
-    if actor_id < 0:
-      raise NameNotFound(f"No id found for name {name}.")
-    actor_ids.add(actor_id)
+  names = list(names)
+  with instrument.phase("resolve"):
+    for i, name in enumerate(names):
+      if prefetcher is not None:
+        prefetcher.pending = [n.strip() for n in names[i + 1:]]
+      actor_id = get_ensured_actor_id(
+        name, interactive=interactive, prefetcher=prefetcher, coalesce=coalesce)
+      if actor_id < 0:
+        raise NameNotFound(f"No id found for name {name}.")
+      actor_ids.add(actor_id)
+      if prefetcher is not None:
+        prefetcher.resolved.add(actor_id)
 
   log.debug(f"Actor ids: {actor_ids}")
   if len(actor_ids) < 2:
     raise Exception("Not enough valid actor names found from the submitted names.")
+  return actor_ids
+
 
+def get_common_movies_for_actor_ids(
+  actor_ids: AbstractSet[int],
+  method: str = "discover",
+  index: Optional["costar_index.CostarIndex"] = None) -> List[str]:
+  """
+  Find movies for which all actors in actor_ids have been cast together.
+  See get_common_movies() for the arguments.
+  Returns:
+    A list of movie titles as strings.
+  """
+  if index is not None:
+    with instrument.phase("index"):
+      return index.get_common_movies(actor_ids)
+  if method == "credits":
+    return get_common_movies_for_ids(actor_ids)
+  if method == "combined":
+    return [m.label() for m in get_common_credits_for_ids(actor_ids)]
   # Fast method provided by the TMDB API: 
-  return discover_movies_for_ids(actor_ids)
-  
-  # Much slower method:
-  # return get_common_movies_for_ids(actor_ids)
+  with instrument.phase("discover"):
+    return discover_movies_for_ids(actor_ids)
 
 
-def get_ensured_actor_id(name: str) -> int:
+def get_ensured_actor_id(
+  name: str,
+  interactive: bool = True,
+  prefetcher: Optional[Prefetcher] = None,
+  coalesce: Iterable[str] = ()) -> int:
   """
   Search person by name, but ensure that is an actor.
   Args:
     name: str. Name of the person to lookup.
+    interactive: bool. See search_actor_by_name().
+    prefetcher: Prefetcher <optional>. See search_actor_by_name().
+    coalesce: iterable of strings. Person sub-resources needed next, e.g.
+      ("movie_credits",), fetched along with the details when the search
+      result does not tell whether the person is an actor. They reach the
+      query through the response cache.
   Returns:
     The ID of the person if it is indeed an actor, otherwise returns -1.
   """
   name = name.strip()
-  search_result = search_actor_by_name(name)
-  if not is_actor(search_result):
+  search_result = search_actor_by_name(name, interactive=interactive, prefetcher=prefetcher)
+  if not is_actor(search_result, coalesce):
     raise NotAnActor(f"\"{name}\" is not known for being an actor.")
   else:
     log.debug(f"{name} seems to be an actor.")
   
-  if actor_id := search_result.get("id"):
-    return int(actor_id)
+  if search_result.id:
+    return search_result.id
   return -1
 
 
 def main(args=None) -> int:
-  parser = argparse.ArgumentParser(description='Look up movies where actors have all been part of the cast.')
+  if args is None:
+    args = sys.argv[1:]
+  if args and args[0] in COMMANDS:
+    return import_module(COMMANDS[args[0]]).main(args[1:])
+
+  parser = argparse.ArgumentParser(
+    description='Look up movies where actors have all been part of the cast.',
+    epilog=f'Other commands: {", ".join(COMMANDS)}.')
   parser.add_argument(
     'persons', metavar='ACTORS', type=str, nargs='+',
     action="extend",
     help='actors to look up')
 
+  parser.add_argument(
+    '--method', choices=METHODS, default="discover",
+    help='"discover" (default) queries the Discover API, "credits" intersects '
+         'the filmographies of the actors, "combined" intersects their movie and '
+         'TV credits')
+  parser.add_argument(
+    '--index', metavar='DIR',
+    help='look up movies in this local co-star index instead of the API, '
+         'see "update-index --help"')
+  parser.add_argument(
+    '--cache-dir', metavar='DIR',
+    help='cache API responses on disk in this directory (also set with TMDB_CACHE_DIR)')
+  parser.add_argument(
+    '--names', metavar='FILE',
+    help='resolve actor names with this local name index first, see "update-names --help" '
+         '(also set with TMDB_NAME_INDEX)')
+  parser.add_argument(
+    '--limit', type=int, metavar='N',
+    help='only look up the first N movies, by release date')
+  parser.add_argument(
+    '--prefetch', type=int, metavar='N', default=PREFETCH_BUDGET,
+    help='send up to N requests for the likely next steps of the query while '
+         f'homonyms are being picked (default {PREFETCH_BUDGET}, 0 to disable)')
+  parser.add_argument(
+    '--profile', action='store_true',
+    help='print the API calls and local phases of the query to stderr')
+
   pargs = parser.parse_args(args)
 
+  if pargs.cache_dir:
+    cache.configure(cache_dir=pargs.cache_dir)
+  if pargs.names:
+    import name_index
+    name_index.configure(pargs.names)
+  if pargs.prefetch > 0 and cache.get_cache() is None:
+    # Prefetched responses are picked up from the cache.
+    cache.configure(memory_entries=1024)
+
   persons = pargs.persons
   persons = [a.strip("\" \'") for a in persons]
   # Ensure we don't have duplicates:
@@ -199,14 +550,29 @@ def main(args=None) -> int:
     print(f"Error: at least 2 names need to be passed as arguments.")
     return 1
 
-  movies = get_common_movies(persons)
+  index = None
+  if pargs.index:
+    from costar_index import CostarIndex
+    index = CostarIndex(pargs.index)
+  with instrument.profile("get_common_movies") if pargs.profile else nullcontext() as profile:
+    if pargs.limit is not None:
+      movies = list(islice(
+        iter_common_movies(
+          persons, method=pargs.method, index=index, prefetch_budget=pargs.prefetch),
+        max(pargs.limit, 0)))
+    else:
+      movies = get_common_movies(
+        persons, method=pargs.method, index=index, prefetch_budget=pargs.prefetch)
+  if profile is not None:
+    print(profile.format(), file=sys.stderr)
 
+  kind = "movies and shows" if pargs.method == "combined" else "movies"
   if not len(movies):
-    print("No movie found where these two actors were cast together.")
+    print(f"No {kind} found where these actors were cast together.")
     return 0
 
   print(
-    f"Found {len(movies)} movies in which {' and '.join(persons)} have played "
+    f"Found {len(movies)} {kind} in which {' and '.join(persons)} have played "
     "(sorted by release date):")
   for title in movies:
     print(title)
@@ -0,0 +1,419 @@
+"""
+Co-star graph, for queries spanning several movies: the degrees of
+separation between two actors, and the most frequent collaborators of one.
+
+The graph is bipartite, actors on one side and movies on the other, and is
+filled lazily from the API: the filmography of an actor (one movie_credits
+request) and the cast of a movie (one credits request) are fetched the first
+time a query reaches them, concurrently for a whole BFS level, and kept in
+memory. Adjacency is stored in a compressed sparse row layout, in flat
+arrays of dense node indices:
+
+  actor_ids[i]: TMDB id of the i-th actor known, movie_ids[j] likewise.
+  actor_movies[actor_rows[i]:actor_rows[i] + actor_lens[i]]: the movies of
+    the i-th actor, once fetched (actor_rows[i] is -1 before). movie_actors,
+    movie_rows and movie_lens likewise for the casts of movies.
+
+Rows are appended in the order nodes are expanded, so filling the graph
+never moves existing edges. Run queries with:
+
+  python3 tmdb_query graph path "Kevin Bacon" "Keanu Reeves" [--max-degrees 6]
+  python3 tmdb_query graph top "Kevin Bacon" [-k 10]
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+from tmdb_client import BATCH_WORKERS, cache, instrument
+from tmdb_client.util import get_movie_cast, get_movies_id_for_actor_id
+from costar_index import U32
+
+log = logging.getLogger(__name__)
+
+# Longest path searched by default, in movies.
+MAX_DEGREES = 6
+# Number of query results kept in memory.
+RESULT_ENTRIES = 1024
+# A long-lived graph (e.g. the server's) is replaced by an empty one past this
+# many edges, or this many seconds after it was created, see is_stale().
+MAX_EDGES = 10_000_000
+GRAPH_TTL = 24 * 60 * 60
+
+
+class _Side():
+  """
+  One half of a bidirectional BFS: the actors and movies reached from root,
+  with their parent on the path back to it.
+  """
+
+  def __init__(self, root: int) -> None:
+    self.actors: Dict[int, Optional[int]] = {root: None}
+    self.movies: Dict[int, int] = {}
+    self.frontier = [root]
+    self.depth = 0
+
+  def path_to_actor(self, actor_id: int) -> List[int]:
+    """
+    Returns:
+      [actor_id, movie_id, actor_id, ..., root]
+    """
+    path = [actor_id]
+    while (movie_id := self.actors[path[-1]]) is not None:
+      path += [movie_id, self.movies[movie_id]]
+    return path
+
+  def path_to_movie(self, movie_id: int) -> List[int]:
+    return [movie_id] + self.path_to_actor(self.movies[movie_id])
+
+
+class CostarGraph():
+  """
+  Actor-movie graph filled on demand, shared by concurrent queries.
+  """
+
+  def __init__(self, workers: int = BATCH_WORKERS, result_entries: int = RESULT_ENTRIES) -> None:
+    """
+    Args:
+      workers: int. Maximum number of filmographies or casts fetched at once.
+      result_entries: int. Number of query results kept in memory.
+    """
+    self.workers = workers
+    self.actor_ids = array(U32)
+    self.movie_ids = array(U32)
+    self._actor_index: Dict[int, int] = {}
+    self._movie_index: Dict[int, int] = {}
+    self.actor_rows = array("q")
+    self.actor_lens = array(U32)
+    self.actor_movies = array(U32)
+    self.movie_rows = array("q")
+    self.movie_lens = array(U32)
+    self.movie_actors = array(U32)
+    # Titles of the movies, from the filmographies.
+    self.titles: Dict[int, str] = {}
+    self.fetched = 0
+    self._results: "OrderedDict[Hashable, object]" = OrderedDict()
+    self._result_entries = result_entries
+    self.result_hits = 0
+    self.created = time.time()
+    self._lock = threading.Lock()
+
+  def is_stale(self, max_edges: int = MAX_EDGES, ttl: float = GRAPH_TTL) -> bool:
+    """
+    Rows are only ever appended, so the graph cannot evict nodes nor pick up
+    changed filmographies and casts: it is replaced as a whole instead.
+    Returns:
+      True if the graph holds more than max_edges edges, or was created more
+      than ttl seconds ago.
+    """
+    return (
+      len(self.actor_movies) + len(self.movie_actors) > max_edges
+      or time.time() - self.created > ttl)
+
+  # Storage.
+
+  def _actor(self, actor_id: int) -> int:
+    i = self._actor_index.get(actor_id)
+    if i is None:
+      i = self._actor_index[actor_id] = len(self.actor_ids)
+      self.actor_ids.append(actor_id)
+      self.actor_rows.append(-1)
+      self.actor_lens.append(0)
+    return i
+
+  def _movie(self, movie_id: int) -> int:
+    j = self._movie_index.get(movie_id)
+    if j is None:
+      j = self._movie_index[movie_id] = len(self.movie_ids)
+      self.movie_ids.append(movie_id)
+      self.movie_rows.append(-1)
+      self.movie_lens.append(0)
+    return j
+
+  def _add_filmography(self, actor_id: int, movie_ids: Iterable[int]) -> None:
+    i = self._actor(actor_id)
+    if self.actor_rows[i] >= 0:
+      return
+    row = array(U32, sorted({self._movie(m) for m in movie_ids}))
+    self.actor_rows[i] = len(self.actor_movies)
+    self.actor_lens[i] = len(row)
+    self.actor_movies.extend(row)
+
+  def _add_cast(self, movie_id: int, actor_ids: Iterable[int]) -> None:
+    j = self._movie(movie_id)
+    if self.movie_rows[j] >= 0:
+      return
+    row = array(U32, sorted({self._actor(a) for a in actor_ids}))
+    self.movie_rows[j] = len(self.movie_actors)
+    self.movie_lens[j] = len(row)
+    self.movie_actors.extend(row)
+
+  def movies_of(self, actor_id: int) -> List[int]:
+    """
+    Returns:
+      The ids of the movies of an actor, empty if not fetched yet.
+    """
+    i = self._actor_index.get(actor_id)
+    if i is None or self.actor_rows[i] < 0:
+      return []
+    start = self.actor_rows[i]
+    return [self.movie_ids[j] for j in self.actor_movies[start:start + self.actor_lens[i]]]
+
+  def cast_of(self, movie_id: int) -> List[int]:
+    """
+    Returns:
+      The ids of the actors of a movie, empty if not fetched yet.
+    """
+    j = self._movie_index.get(movie_id)
+    if j is None or self.movie_rows[j] < 0:
+      return []
+    start = self.movie_rows[j]
+    return [self.actor_ids[i] for i in self.movie_actors[start:start + self.movie_lens[j]]]
+
+  def has_filmography(self, actor_id: int) -> bool:
+    i = self._actor_index.get(actor_id)
+    return i is not None and self.actor_rows[i] >= 0
+
+  def has_cast(self, movie_id: int) -> bool:
+    j = self._movie_index.get(movie_id)
+    return j is not None and self.movie_rows[j] >= 0
+
+  # Lazy filling.
+
+  def _fetch_all(self, fetch, ids: Sequence[int]) -> List:
+    from requests import HTTPError
+
+    def fetch_one(_id: int):
+      try:
+        return fetch(_id)
+      except HTTPError as e:
+        # E.g. deleted since it was credited: a dead end. Other errors are
+        # not kept in the graph.
+        if e.response is None or e.response.status_code != 404:
+          raise
+        log.warning(f"Skipping {_id}: {e}")
+        return {}
+
+    if len(ids) == 1:
+      return [fetch_one(ids[0])]
+    with ThreadPoolExecutor(max_workers=min(self.workers, len(ids))) as pool:
+      return list(pool.map(instrument.bind(fetch_one), ids))
+
+  def expand_actors(self, actor_ids: Iterable[int]) -> None:
+    """
+    Fetch the filmographies of the actors which are not in the graph yet.
+    """
+    missing = [a for a in dict.fromkeys(actor_ids) if not self.has_filmography(a)]
+    if not missing:
+      return
+    filmographies = self._fetch_all(get_movies_id_for_actor_id, missing)
+    with self._lock:
+      for actor_id, movies in zip(missing, filmographies):
+        self.titles.update(movies)
+        self._add_filmography(actor_id, movies)
+      self.fetched += len(missing)
+
+  def expand_movies(self, movie_ids: Iterable[int]) -> None:
+    """
+    Fetch the casts of the movies which are not in the graph yet.
+    """
+    missing = [m for m in dict.fromkeys(movie_ids) if not self.has_cast(m)]
+    if not missing:
+      return
+    casts = self._fetch_all(get_movie_cast, missing)
+    with self._lock:
+      for movie_id, cast in zip(missing, casts):
+        self._add_cast(movie_id, cast)
+      self.fetched += len(missing)
+
+  # Results.
+
+  def _cached(self, key: Hashable):
+    with self._lock:
+      if key in self._results:
+        self._results.move_to_end(key)
+        self.result_hits += 1
+        return self._results[key]
+    return None
+
+  def _store(self, key: Hashable, value) -> None:
+    with self._lock:
+      self._results[key] = value
+      while len(self._results) > self._result_entries:
+        self._results.popitem(last=False)
+
+  # Queries.
+
+  def shortest_path(
+    self,
+    source: int,
+    target: int,
+    max_degrees: int = MAX_DEGREES) -> Optional[List[int]]:
+    """
+    Degrees of separation between two actors, with a bidirectional BFS
+    which expands the smaller frontier first, one level at a time.
+    Args:
+      source: int. Actor id.
+      target: int. Actor id.
+      max_degrees: int. Longest path searched, in movies.
+    Returns:
+      The ids along a shortest path, actors and movies alternately:
+      [source, movie_id, actor_id, movie_id, ..., target], or None if the
+      actors are more than max_degrees movies apart.
+    """
+    key = ("path", source, target, max_degrees)
+    if (path := self._cached(key)) is not None:
+      return path or None
+    path = self._bidirectional_bfs(source, target, max_degrees)
+    self._store(key, path or [])
+    return path
+
+  def _bidirectional_bfs(self, source: int, target: int, max_degrees: int) -> Optional[List[int]]:
+    if source == target:
+      return [source]
+    forward, backward = _Side(source), _Side(target)
+    while forward.depth + backward.depth < max_degrees:
+      if not forward.frontier or not backward.frontier:
+        return None
+      side, other = (
+        (forward, backward) if len(forward.frontier) <= len(backward.frontier)
+        else (backward, forward))
+      paths = self._step(side, other)
+      if paths:
+        path = min(paths, key=len)
+        if len(path) // 2 > max_degrees:
+          return None
+        # Paths are built from side's meeting node back to its root.
+        return path if side is backward else path[::-1]
+    return None
+
+  def _step(self, side: _Side, other: _Side) -> List[List[int]]:
+    """
+    Expand the frontier of side by one movie.
+    Returns:
+      The paths through the nodes where both sides met, from the root of
+      other to the root of side. Empty if they have not met yet.
+    """
+    with instrument.phase("filmographies"):
+      self.expand_actors(side.frontier)
+    new_movies, paths = [], []
+    for actor_id in side.frontier:
+      for movie_id in self.movies_of(actor_id):
+        if movie_id in side.movies:
+          continue
+        side.movies[movie_id] = actor_id
+        new_movies.append(movie_id)
+        if movie_id in other.movies:
+          paths.append(other.path_to_movie(movie_id)[::-1] + side.path_to_actor(actor_id))
+    if paths:
+      return paths
+
+    with instrument.phase("casts"):
+      self.expand_movies(new_movies)
+    frontier = []
+    for movie_id in new_movies:
+      for actor_id in self.cast_of(movie_id):
+        if actor_id in side.actors:
+          continue
+        side.actors[actor_id] = movie_id
+        frontier.append(actor_id)
+        if actor_id in other.actors:
+          paths.append(other.path_to_actor(actor_id)[::-1] + side.path_to_actor(actor_id)[1:])
+    side.frontier = frontier
+    side.depth += 1
+    return paths
+
+  def top_collaborators(self, actor_id: int, k: int = 10) -> List[Tuple[int, int]]:
+    """
+    Args:
+      actor_id: int. Actor id.
+      k: int. Number of collaborators.
+    Returns:
+      Up to k (actor id, number of shared movies) tuples, most frequent
+      first, then by actor id.
+    """
+    key = ("top", actor_id, k)
+    if (top := self._cached(key)) is not None:
+      return top
+    with instrument.phase("filmographies"):
+      self.expand_actors([actor_id])
+    movie_ids = self.movies_of(actor_id)
+    with instrument.phase("casts"):
+      self.expand_movies(movie_ids)
+    counts = Counter(a for m in movie_ids for a in self.cast_of(m) if a != actor_id)
+    top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:k]
+    self._store(key, top)
+    return top
+
+  def stats(self) -> Dict:
+    return {
+      "actors": len(self.actor_ids),
+      "movies": len(self.movie_ids),
+      "filmographies": sum(1 for row in self.actor_rows if row >= 0),
+      "casts": sum(1 for row in self.movie_rows if row >= 0),
+      "edges": len(self.actor_movies) + len(self.movie_actors),
+      "fetched": self.fetched,
+      "result_hits": self.result_hits,
+    }
+
+
+def _names(actor_ids: Sequence[int]) -> Dict[int, str]:
+  from tmdb_client.person import Person
+  people = Person.batch_details(actor_ids)
+  return {_id: getattr(person, "name", str(_id)) for _id, person in people.items()}
+
+
+def _actor_id(value: str) -> int:
+  """Actor id given as digits, or else resolved from a name."""
+  import cli
+  value = value.strip("\" \'")
+  if value.isdigit():
+    return int(value)
+  return cli.get_ensured_actor_id(value)
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(
+    prog="tmdb_query graph",
+    description="Query the co-star graph of actors.")
+  parser.add_argument(
+    '--cache-dir', metavar='DIR',
+    help='cache API responses on disk in this directory (also set with TMDB_CACHE_DIR)')
+  commands = parser.add_subparsers(dest="command", required=True)
+  path = commands.add_parser('path', help='degrees of separation between two actors')
+  path.add_argument('actors', metavar='ACTOR', nargs=2, help='actor names or ids')
+  path.add_argument('--max-degrees', type=int, default=MAX_DEGREES, help='longest path searched, in movies')
+  top = commands.add_parser('top', help='most frequent collaborators of an actor')
+  top.add_argument('actor', metavar='ACTOR', help='actor name or id')
+  top.add_argument('-k', type=int, default=10, help='number of collaborators')
+  pargs = parser.parse_args(args)
+
+  if pargs.cache_dir:
+    cache.configure(cache_dir=pargs.cache_dir)
+  graph = CostarGraph()
+  if pargs.command == "path":
+    source, target = (_actor_id(a) for a in pargs.actors)
+    path = graph.shortest_path(source, target, pargs.max_degrees)
+    if path is None:
+      print(f"No path of at most {pargs.max_degrees} movies found.")
+      return 1
+    names = _names(path[::2])
+    print(f"{len(path) // 2} degrees of separation:")
+    for i in range(0, len(path) - 1, 2):
+      print(f"{names[path[i]]} was in {graph.titles.get(path[i + 1], path[i + 1])} with {names[path[i + 2]]}")
+    return 0
+
+  top = graph.top_collaborators(_actor_id(pargs.actor), pargs.k)
+  names = _names([a for a, _ in top])
+  for actor_id, count in top:
+    print(f"{count:>4} {names[actor_id]}")
+  return 0
+
+
+if __name__ == "__main__":
+  logging.basicConfig(level=logging.INFO)
+  sys.exit(main())
@@ -0,0 +1,428 @@
+"""
+Local co-star index, to find the movies shared by actors without any API call.
+
+The index is a directory of flat binary arrays which are memory-mapped when
+loaded, in a compressed sparse row layout:
+
+  person_ids.bin: sorted person ids (uint32).
+  offsets.bin: for the i-th person, its movies are movie_ids[offsets[i]:offsets[i + 1]] (uint64).
+  movie_ids.bin: sorted movie ids of each person, one run after the other (uint32).
+  movies.json: {movie_id: [title, release_date]}
+
+Each build writes these files to a new generation subdirectory (gen-N), and
+then replaces DIR/meta.json, which holds the counts, the update time and the
+name of the current generation. Readers open the arrays through meta.json,
+so that they always see a complete generation, even while it is rebuilt or
+after a crash during a build. The previous generation is kept for the
+readers which loaded meta.json just before the swap.
+
+It is built from the movie credits stored in the response cache, and from
+TMDB's daily ID export files (https://developers.themoviedb.org/3/getting-started/daily-file-exports)
+for the movies which are not cached yet. Update it with:
+
+  python3 tmdb_query update-index DIR --cache-dir CACHE [--export movie_ids_MM_DD_YYYY.json.gz]
+
+and query it with:
+
+  python3 tmdb_query --index DIR "Actor Name 1" "Actor Name 2"
+"""
+import argparse
+import gzip
+import json
+import logging
+import mmap
+import os
+import shutil
+import time
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+# Version 1 indexes have their arrays directly in the index directory.
+READABLE_VERSIONS = (1, 2)
+GENERATION_PREFIX = "gen-"
+# Typecodes of unsigned 32 and 64 bits integers.
+U32 = "I" if array("I").itemsize == 4 else "L"
+U64 = "Q"
+
+# Movie id -> (title, release_date)
+MovieTable = Dict[int, Tuple[str, str]]
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+  """
+  Returns:
+    The numpy module if installed, else None. It is imported on first use
+    only, since it is slow to import and most commands do not need it.
+  """
+  try:
+    import numpy
+  except ImportError:
+    return None
+  return numpy
+
+
+def _read_array(path: str, typecode: str) -> Sequence[int]:
+  """
+  Memory-map a binary file as a read-only sequence of integers.
+  """
+  if not os.path.getsize(path):
+    return array(typecode)
+  with open(path, "rb") as f:
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+  numpy = _numpy()
+  if numpy is not None:
+    return numpy.frombuffer(mm, dtype=numpy.uint32 if typecode == U32 else numpy.uint64)
+  return memoryview(mm).cast(typecode)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+  tmp_path = f"{path}.tmp"
+  with open(tmp_path, "wb") as f:
+    f.write(data)
+    f.flush()
+    os.fsync(f.fileno())
+  os.replace(tmp_path, path)
+
+
+def _read_meta(path: str) -> Optional[Dict]:
+  """
+  Returns:
+    The meta.json of the index directory path, or None if there is none.
+  """
+  try:
+    with open(os.path.join(path, "meta.json")) as f:
+      return json.load(f)
+  except FileNotFoundError:
+    return None
+
+
+def _remove_stale_generations(path: str, keep: Iterable[str]) -> None:
+  """
+  Remove the generations of the index other than keep, including the
+  partial ones left by failed builds. The arrays of a version 1 index, in
+  the index directory, are kept if keep contains "".
+  """
+  keep = set(keep)
+  for name in os.listdir(path):
+    full_path = os.path.join(path, name)
+    if name.startswith(GENERATION_PREFIX) and name not in keep:
+      shutil.rmtree(full_path, ignore_errors=True)
+    elif "" not in keep and name in ("person_ids.bin", "offsets.bin", "movie_ids.bin", "movies.json"):
+      os.remove(full_path)
+
+
+def intersect_sorted(arrays: List[Sequence[int]]) -> List[int]:
+  """
+  Intersect sorted arrays of unique integers by looking up each value of
+  the smallest array in the others with a binary search.
+  Args:
+    arrays: list. Sorted sequences of unique integers.
+  Returns:
+    A sorted list of the values found in every array.
+
+  >>> intersect_sorted([[1, 3, 5, 7], [3, 4, 5], [0, 3, 5, 9]])
+  [3, 5]
+  """
+  if not arrays:
+    return []
+  arrays = sorted(arrays, key=len)
+  numpy = _numpy()
+  if numpy is not None and all(isinstance(a, numpy.ndarray) for a in arrays):
+    result = arrays[0]
+    for other in arrays[1:]:
+      result = numpy.intersect1d(result, other, assume_unique=True)
+    return [int(v) for v in result]
+  result = []
+  for value in arrays[0]:
+    for other in arrays[1:]:
+      i = bisect_left(other, value)
+      if i == len(other) or other[i] != value:
+        break
+    else:
+      result.append(value)
+  return result
+
+
+class CostarIndex():
+  """
+  Read-only view of an index directory.
+  """
+
+  def __init__(self, path: str) -> None:
+    self.path = path
+    with open(os.path.join(path, "meta.json")) as f:
+      self.meta = json.load(f)
+    if self.meta.get("version") not in READABLE_VERSIONS:
+      raise Exception(f"Unsupported index version in {path}: {self.meta.get('version')}.")
+    # Directory of the generation named by meta.json, read as a whole.
+    data_dir = os.path.join(path, self.meta.get("generation", ""))
+    self.person_ids = _read_array(os.path.join(data_dir, "person_ids.bin"), U32)
+    self.offsets = _read_array(os.path.join(data_dir, "offsets.bin"), U64)
+    self.movie_ids = _read_array(os.path.join(data_dir, "movie_ids.bin"), U32)
+    with open(os.path.join(data_dir, "movies.json")) as f:
+      self.movies: MovieTable = {int(k): tuple(v) for k, v in json.load(f).items()}
+
+  @classmethod
+  def build(cls, path: str, casts: Dict[int, Iterable[int]], movies: MovieTable) -> "CostarIndex":
+    """
+    Write an index from movie casts, as a new generation which replaces the
+    current one at once.
+    Args:
+      path: str. Index directory, created if needed.
+      casts: dict. {movie_id: ids of the people in its cast}
+      movies: dict. {movie_id: (title, release_date)}
+    Returns:
+      The new index.
+    """
+    filmographies: Dict[int, set] = {}
+    for movie_id, cast in casts.items():
+      for person_id in cast:
+        filmographies.setdefault(int(person_id), set()).add(int(movie_id))
+
+    person_ids = array(U32, sorted(filmographies))
+    offsets = array(U64, [0])
+    movie_ids = array(U32)
+    for person_id in person_ids:
+      movie_ids.extend(sorted(filmographies[person_id]))
+      offsets.append(len(movie_ids))
+
+    os.makedirs(path, exist_ok=True)
+    previous = _read_meta(path) or {}
+    number = int(previous.get("generation", GENERATION_PREFIX + "0")[len(GENERATION_PREFIX):]) + 1
+    generation = f"{GENERATION_PREFIX}{number}"
+    data_dir = os.path.join(path, generation)
+    # Left over by a build which failed before its swap.
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.makedirs(data_dir)
+    _write_atomic(os.path.join(data_dir, "person_ids.bin"), person_ids.tobytes())
+    _write_atomic(os.path.join(data_dir, "offsets.bin"), offsets.tobytes())
+    _write_atomic(os.path.join(data_dir, "movie_ids.bin"), movie_ids.tobytes())
+    table = {str(m): list(movies.get(m, ("", ""))) for m in sorted(casts)}
+    _write_atomic(
+      os.path.join(data_dir, "movies.json"),
+      json.dumps(table, separators=(",", ":")).encode("utf-8"))
+    meta = {
+      "version": INDEX_VERSION,
+      "generation": generation,
+      "people": len(person_ids),
+      "movies": len(table),
+      "credits": len(movie_ids),
+      "updated": time.time(),
+    }
+    # The swap: until meta.json is replaced, readers get the previous generation.
+    _write_atomic(os.path.join(path, "meta.json"), json.dumps(meta).encode("utf-8"))
+    _remove_stale_generations(path, keep=(generation, previous.get("generation", "")))
+    log.debug(f"Built index {path}: {meta}")
+    return cls(path)
+
+  def __len__(self) -> int:
+    return len(self.person_ids)
+
+  def __contains__(self, person_id: int) -> bool:
+    i = bisect_left(self.person_ids, person_id)
+    return i < len(self.person_ids) and self.person_ids[i] == person_id
+
+  def movies_for(self, person_id: int) -> Sequence[int]:
+    """
+    Returns:
+      The sorted movie ids of a person, empty if unknown.
+    """
+    i = bisect_left(self.person_ids, person_id)
+    if i == len(self.person_ids) or self.person_ids[i] != person_id:
+      return array(U32)
+    return self.movie_ids[self.offsets[i]:self.offsets[i + 1]]
+
+  def common_movie_ids(self, person_ids: Iterable[int]) -> List[int]:
+    """
+    Returns:
+      The sorted ids of the movies in which all person_ids were cast.
+    """
+    return intersect_sorted([self.movies_for(p) for p in person_ids])
+
+  def get_common_movies(self, person_ids: Iterable[int]) -> List[str]:
+    """
+    Returns:
+      The titles of the movies in which all person_ids were cast, sorted by
+      release date like the Discover API results.
+    """
+    movies = [self.movies.get(m, ("", "")) for m in self.common_movie_ids(person_ids)]
+    movies.sort(key=lambda m: (not m[1], m[1]))
+    return [title for title, _ in movies]
+
+  def casts(self) -> Dict[int, List[int]]:
+    """
+    Returns:
+      {movie_id: person ids}, the inverse of the index, used to update it.
+    """
+    casts: Dict[int, List[int]] = {m: [] for m in self.movies}
+    for i, person_id in enumerate(self.person_ids):
+      for movie_id in self.movie_ids[self.offsets[i]:self.offsets[i + 1]]:
+        casts.setdefault(int(movie_id), []).append(int(person_id))
+    return casts
+
+
+def read_id_export(path: str) -> Iterator[Dict]:
+  """
+  Read a TMDB daily ID export, gzipped or not: one JSON object per line.
+  """
+  opener = gzip.open if path.endswith(".gz") else open
+  with opener(path, "rt", encoding="utf-8") as f:
+    for line in f:
+      if line.strip():
+        yield json.loads(line)
+
+
+def _parse_movie_key(key: str) -> Tuple[Optional[int], str]:
+  """
+  >>> _parse_movie_key("movie/603/credits")
+  (603, 'credits')
+  >>> _parse_movie_key("movie/603?append_to_response=credits")
+  (603, 'details')
+  """
+  path = key.split("?", 1)[0].split("/")
+  if len(path) < 2 or path[0] != "movie" or not path[1].isdigit():
+    return None, ""
+  return int(path[1]), path[2] if len(path) > 2 else "details"
+
+
+def read_cached_credits(cache_dir: str) -> Tuple[Dict[int, List[int]], MovieTable]:
+  """
+  Collect movie casts, titles and release dates from the responses of
+  Movie.credits() and Movie.details() stored in the on-disk response cache.
+  Returns:
+    A tuple of ({movie_id: cast person ids}, {movie_id: (title, release_date)}).
+  """
+  from tmdb_client.cache import CACHE_FILE_NAME, SQLiteCache
+  casts: Dict[int, List[int]] = {}
+  movies: MovieTable = {}
+  path = os.path.join(cache_dir, CACHE_FILE_NAME)
+  if not os.path.exists(path):
+    return casts, movies
+  store = SQLiteCache(path)
+  try:
+    for key, response in store.scan("movie/"):
+      movie_id, part = _parse_movie_key(key)
+      if movie_id is None:
+        continue
+      if part == "details":
+        movies[movie_id] = (response.get("title", ""), response.get("release_date", ""))
+        response = response.get("credits")
+      if isinstance(response, dict) and "cast" in response:
+        casts[movie_id] = [c["id"] for c in response["cast"] if c.get("id")]
+  finally:
+    store.close()
+  return casts, movies
+
+
+def fetch_credits(movie_ids: Iterable[int]) -> Tuple[Dict[int, List[int]], MovieTable]:
+  """
+  Fetch the details and credits of movies concurrently, one request per
+  movie. Movies which cannot be fetched (e.g. deleted since the export) are
+  skipped.
+  Returns:
+    A tuple of ({movie_id: cast person ids}, {movie_id: (title, release_date)}).
+  """
+  from requests import HTTPError
+  from tmdb_client import BATCH_WORKERS
+  from tmdb_client.movie import Movie
+
+  def fetch(movie_id: int) -> Optional[Movie]:
+    movie = Movie(movie_id).coalesce("credits")
+    try:
+      movie.details()
+    except HTTPError as e:
+      log.warning(f"Skipping movie {movie_id}: {e}")
+      return None
+    return movie
+
+  casts: Dict[int, List[int]] = {}
+  movies: MovieTable = {}
+  movie_ids = list(movie_ids)
+  with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+    for movie_id, movie in zip(movie_ids, pool.map(fetch, movie_ids)):
+      if movie is None:
+        continue
+      movies[movie_id] = (getattr(movie, "title", ""), getattr(movie, "release_date", ""))
+      casts[movie_id] = [c["id"] for c in movie.credits().get("cast", []) if c.get("id")]
+  return casts, movies
+
+
+def update_index(
+  path: str,
+  cache_dir: Optional[str] = None,
+  export: Optional[str] = None,
+  limit: Optional[int] = None) -> CostarIndex:
+  """
+  Create or update an index. Movies already in the index are kept, movies
+  found in the response cache are added, then movies of the ID export
+  which are still missing are fetched from the API.
+  Args:
+    path: str. Index directory.
+    cache_dir: str <optional>. Directory of the on-disk response cache.
+    export: str <optional>. Path of a movie ID export file.
+    limit: int <optional>. Maximum number of movies to fetch from the API.
+  Returns:
+    The updated index.
+  """
+  casts: Dict[int, List[int]] = {}
+  movies: MovieTable = {}
+  if os.path.exists(os.path.join(path, "meta.json")):
+    index = CostarIndex(path)
+    casts, movies = index.casts(), dict(index.movies)
+  known = len(casts)
+
+  if cache_dir:
+    cached_casts, cached_movies = read_cached_credits(cache_dir)
+    casts.update(cached_casts)
+    movies.update(cached_movies)
+    log.info(f"Read {len(cached_casts)} movie casts from the cache.")
+
+  if export:
+    export_titles = {
+      int(e["id"]): e.get("original_title", "") for e in read_id_export(export)
+      if not e.get("adult") and not e.get("video")
+    }
+    missing = [m for m in export_titles if m not in casts]
+    if limit is not None:
+      missing = missing[:limit]
+    log.info(f"Fetching {len(missing)} movies out of {len(export_titles)} in the export.")
+    fetched_casts, fetched_movies = fetch_credits(missing)
+    casts.update(fetched_casts)
+    movies.update(fetched_movies)
+
+  log.info(f"Indexing {len(casts)} movies ({len(casts) - known} new).")
+  return CostarIndex.build(path, casts, movies)
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(
+    prog="tmdb_query update-index",
+    description="Create or incrementally update a local co-star index.")
+  parser.add_argument('path', metavar='DIR', help='index directory')
+  parser.add_argument(
+    '--cache-dir', metavar='DIR', default=os.environ.get("TMDB_CACHE_DIR"),
+    help='read movie credits from this response cache directory, and cache fetched ones there')
+  parser.add_argument(
+    '--export', metavar='FILE',
+    help='TMDB daily movie ID export (movie_ids_MM_DD_YYYY.json.gz), movies missing '
+         'from the index are fetched from the API')
+  parser.add_argument(
+    '--limit', type=int,
+    help='maximum number of movies to fetch from the API')
+  pargs = parser.parse_args(args)
+
+  if pargs.export and pargs.cache_dir:
+    from tmdb_client import cache
+    cache.configure(cache_dir=pargs.cache_dir)
+  index = update_index(pargs.path, pargs.cache_dir, pargs.export, pargs.limit)
+  print(
+    f"Index {pargs.path}: {index.meta['people']} people, {index.meta['movies']} movies, "
+    f"{index.meta['credits']} credits.")
+  return 0
@@ -0,0 +1,392 @@
+"""
+Local actor name index, to resolve names without a Search API request.
+
+Names are normalized (accents folded, case and punctuation dropped) and
+mapped to TMDB person ids with their popularity and known_for_department,
+in a SQLite file:
+
+  people: one row per person, from search responses or the person ID export.
+  queries: the ids returned by past searches, by normalized query.
+  grams: the trigrams of every normalized name, for fuzzy lookups.
+  choices: the person picked by the user among homonyms, by normalized name.
+  misses: names which the API did not find, until they expire.
+
+A name is resolved locally when a past search, or else people with the same
+normalized name (or the closest one by trigram similarity), are known along
+with their department. Otherwise it is searched with the API, and the
+response is added to the index. Fill it from the response cache and a TMDB
+daily person ID export with:
+
+  python3 tmdb_query update-names FILE --cache-dir CACHE [--export person_ids_MM_DD_YYYY.json.gz]
+
+and use it with --names FILE, or by setting TMDB_NAME_INDEX.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
+
+from tmdb_client.models import PersonSummary, parse_all
+
+log = logging.getLogger(__name__)
+
+NAME_INDEX = os.environ.get("TMDB_NAME_INDEX", "")
+# Names not found by the API are searched again after this many seconds.
+MISS_TTL = 24 * 60 * 60
+# Minimum trigram similarity (Dice coefficient) of a fuzzy match.
+MIN_SIMILARITY = 0.75
+# People of the ID export less popular than this are not indexed.
+MIN_POPULARITY = 1.0
+
+_SCHEMA = (
+  "CREATE TABLE IF NOT EXISTS people ("
+  "id INTEGER PRIMARY KEY, name TEXT, norm TEXT, popularity REAL, department TEXT, result TEXT)",
+  "CREATE INDEX IF NOT EXISTS people_norm ON people (norm)",
+  "CREATE TABLE IF NOT EXISTS queries (norm TEXT PRIMARY KEY, ids TEXT)",
+  "CREATE TABLE IF NOT EXISTS grams (gram TEXT, norm TEXT, PRIMARY KEY (gram, norm)) WITHOUT ROWID",
+  "CREATE TABLE IF NOT EXISTS choices (norm TEXT PRIMARY KEY, id INTEGER)",
+  "CREATE TABLE IF NOT EXISTS misses (norm TEXT PRIMARY KEY, expires REAL)",
+)
+
+
+def normalize(name: str) -> str:
+  """
+  >>> normalize("  Zoë  Saldaña-Perego ")
+  'zoe saldana perego'
+  >>> normalize("Jean-Paul Belmondo") == normalize("jean paul BELMONDO")
+  True
+  """
+  folded = unicodedata.normalize("NFKD", name.casefold())
+  chars = (c if c.isalnum() else " " for c in folded if not unicodedata.combining(c))
+  return " ".join("".join(chars).split())
+
+
+def trigrams(norm: str) -> Set[str]:
+  """
+  Trigrams of a normalized name, padded so that short names have some.
+  >>> sorted(trigrams("ab"))
+  [' ab', 'ab ']
+  """
+  padded = f" {norm} "
+  return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+  return 2 * len(a & b) / (len(a) + len(b)) if a or b else 0.0
+
+
+class NameIndex():
+  """
+  SQLite-backed name index, shared by concurrent threads.
+  """
+
+  def __init__(
+    self,
+    path: str,
+    miss_ttl: float = MISS_TTL,
+    min_similarity: float = MIN_SIMILARITY) -> None:
+    """
+    Args:
+      path: str. Index file, created if needed.
+      miss_ttl: float. Seconds during which a name not found is not searched again.
+      min_similarity: float. Minimum trigram similarity of a fuzzy match, in [0, 1].
+    """
+    import sqlite3
+    self.path = path
+    self.miss_ttl = miss_ttl
+    self.min_similarity = min_similarity
+    if os.path.dirname(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    self._conn = sqlite3.connect(path, check_same_thread=False)
+    self._lock = threading.Lock()
+    with self._conn:
+      self._conn.execute("PRAGMA journal_mode=WAL")
+      for statement in _SCHEMA:
+        self._conn.execute(statement)
+    # Lookups resolved locally, sent to the API, and answered from the negative cache.
+    self.hits = 0
+    self.misses = 0
+    self.negative_hits = 0
+
+  def close(self) -> None:
+    with self._lock:
+      self._conn.close()
+
+  # Filling.
+
+  def add_results(self, query: str, results: List[PersonSummary]) -> None:
+    """
+    Add the results of a Search.person() request for query.
+    """
+    rows = [
+      (
+        r.id, r.name or "", normalize(r.name or ""),
+        r.popularity, r.known_for_department or "", json.dumps(r.to_dict()),
+      )
+      for r in results if r.id
+    ]
+    norm = normalize(query)
+    with self._lock:
+      with self._conn:
+        self._conn.executemany(
+          "INSERT INTO people (id, name, norm, popularity, department, result) "
+          "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET name = excluded.name, "
+          "norm = excluded.norm, popularity = excluded.popularity, "
+          "department = excluded.department, result = excluded.result", rows)
+        self._conn.execute(
+          "INSERT OR REPLACE INTO queries (norm, ids) VALUES (?, ?)",
+          (norm, json.dumps([row[0] for row in rows])))
+        self._conn.execute("DELETE FROM misses WHERE norm = ?", (norm,))
+        self._add_grams([row[2] for row in rows])
+
+  def add_people(self, entries: Iterable[Dict], min_popularity: float = MIN_POPULARITY) -> int:
+    """
+    Add the entries of a person ID export ({"id", "name", "popularity"}),
+    without department. Departments already known are kept.
+    Returns:
+      The number of people added or updated.
+    """
+    rows = [
+      (int(e["id"]), e.get("name", ""), normalize(e.get("name", "")), e.get("popularity", 0))
+      for e in entries
+      if e.get("id") and not e.get("adult") and e.get("popularity", 0) >= min_popularity
+    ]
+    with self._lock:
+      with self._conn:
+        self._conn.executemany(
+          "INSERT INTO people (id, name, norm, popularity) VALUES (?, ?, ?, ?) "
+          "ON CONFLICT (id) DO UPDATE SET name = excluded.name, norm = excluded.norm, "
+          "popularity = excluded.popularity", rows)
+        self._add_grams([row[2] for row in rows])
+    return len(rows)
+
+  def _add_grams(self, norms: Iterable[str]) -> None:
+    self._conn.executemany(
+      "INSERT OR IGNORE INTO grams (gram, norm) VALUES (?, ?)",
+      ((gram, norm) for norm in set(norms) if norm for gram in trigrams(norm)))
+
+  def add_miss(self, name: str) -> None:
+    with self._lock:
+      with self._conn:
+        self._conn.execute(
+          "INSERT OR REPLACE INTO misses (norm, expires) VALUES (?, ?)",
+          (normalize(name), time.time() + self.miss_ttl))
+
+  def is_miss(self, name: str) -> bool:
+    """
+    Returns:
+      True if name was not found by the API recently.
+    """
+    with self._lock:
+      row = self._conn.execute(
+        "SELECT expires FROM misses WHERE norm = ?", (normalize(name),)).fetchone()
+      if row is not None and row[0] > time.time():
+        self.negative_hits += 1
+        return True
+    return False
+
+  def remember(self, name: str, person_id: int) -> None:
+    """Remember the person picked among the homonyms named name."""
+    with self._lock:
+      with self._conn:
+        self._conn.execute(
+          "INSERT OR REPLACE INTO choices (norm, id) VALUES (?, ?)", (normalize(name), person_id))
+
+  def choice(self, name: str) -> Optional[int]:
+    """
+    Returns:
+      The id of the person picked last among the homonyms named name, if any.
+    """
+    with self._lock:
+      row = self._conn.execute(
+        "SELECT id FROM choices WHERE norm = ?", (normalize(name),)).fetchone()
+    return row[0] if row is not None else None
+
+  # Lookups.
+
+  def fuzzy(self, name: str, limit: int = 5) -> List[Tuple[str, float]]:
+    """
+    Returns:
+      Up to limit (normalized name, similarity) tuples of the indexed names
+      closest to name, most similar first, above min_similarity.
+    """
+    grams = trigrams(normalize(name))
+    if not grams:
+      return []
+    with self._lock:
+      # Candidates share the most trigrams with name.
+      rows = self._conn.execute(
+        f"SELECT norm FROM grams WHERE gram IN ({','.join('?' * len(grams))}) "
+        "GROUP BY norm ORDER BY COUNT(*) DESC LIMIT ?", (*grams, 4 * limit)).fetchall()
+    scored = [(norm, _similarity(grams, trigrams(norm))) for norm, in rows]
+    scored = [s for s in scored if s[1] >= self.min_similarity]
+    scored.sort(key=lambda s: (-s[1], s[0]))
+    return scored[:limit]
+
+  def _people(self, where: str, args: Tuple) -> List[Tuple]:
+    with self._lock:
+      return self._conn.execute(
+        f"SELECT id, name, popularity, department, result FROM people WHERE {where}", args).fetchall()
+
+  def candidates(self, name: str) -> List[Tuple]:
+    """
+    Returns:
+      (id, name, popularity, department, result) rows of the people name
+      refers to: the results of a past search for it, or else the people
+      with the same normalized name, or else with the closest one.
+    """
+    norm = normalize(name)
+    with self._lock:
+      row = self._conn.execute("SELECT ids FROM queries WHERE norm = ?", (norm,)).fetchone()
+    if row is not None:
+      ids = json.loads(row[0])
+      if not ids:
+        return []
+      people = {p[0]: p for p in self._people(f"id IN ({','.join('?' * len(ids))})", tuple(ids))}
+      return [people[i] for i in ids if i in people]
+    people = self._people("norm = ?", (norm,))
+    if not people and (matches := self.fuzzy(name, limit=1)):
+      people = self._people("norm = ?", (matches[0][0],))
+    return people
+
+  def lookup(self, name: str) -> Optional[List[PersonSummary]]:
+    """
+    Returns:
+      Search results for name, like those of Search.person(), if they can
+      be told without the API. None if it must be searched.
+    """
+    people = self.candidates(name)
+    # The department of people only known from the ID export is missing.
+    if not people or any(p[3] is None for p in people):
+      self.misses += 1
+      return None
+    self.hits += 1
+    return [
+      PersonSummary.from_json(json.loads(result)) if result else
+      PersonSummary(_id, _name, department, popularity)
+      for _id, _name, popularity, department, result in people
+    ]
+
+  def canonical(self, name: str) -> Optional[str]:
+    """
+    Returns:
+      The name of the most popular person whose name is the closest to
+      name, e.g. to correct a typo before searching it. None if unknown.
+    """
+    matches = self.fuzzy(name, limit=1)
+    if not matches:
+      return None
+    people = self._people("norm = ? ORDER BY popularity DESC LIMIT 1", (matches[0][0],))
+    return people[0][1] if people else None
+
+  def stats(self) -> Dict:
+    with self._lock:
+      people, = self._conn.execute("SELECT COUNT(*) FROM people").fetchone()
+    return {
+      "people": people,
+      "hits": self.hits,
+      "misses": self.misses,
+      "negative_hits": self.negative_hits,
+    }
+
+
+_index: Optional[NameIndex] = None
+
+
+def configure(path: str, **kwargs) -> NameIndex:
+  """
+  Resolve actor names with the index at path first. See NameIndex.
+  """
+  return set_index(NameIndex(os.path.expanduser(path), **kwargs))
+
+
+def set_index(index: Optional[NameIndex]) -> Optional[NameIndex]:
+  """Replace the index used to resolve names. None disables it."""
+  global _index
+  _index = index
+  return index
+
+
+def get_index() -> Optional[NameIndex]:
+  global _index
+  if _index is None and NAME_INDEX:
+    configure(NAME_INDEX)
+  return _index
+
+
+def read_cached_searches(cache_dir: str) -> Iterator[Tuple[str, List[PersonSummary]]]:
+  """
+  Collect the person search responses stored in the on-disk response cache.
+  Yields:
+    Tuples of (query, results) for their first page.
+  """
+  from tmdb_client.cache import CACHE_FILE_NAME, SQLiteCache
+  path = os.path.join(cache_dir, CACHE_FILE_NAME)
+  if not os.path.exists(path):
+    return
+  store = SQLiteCache(path)
+  try:
+    for key, response in store.scan("search/person?"):
+      params = parse_qs(key.split("?", 1)[1])
+      if params.get("page", ["1"])[-1] != "1" or "query" not in params or "fields" in params:
+        continue
+      yield params["query"][-1], parse_all(response.get("results", []), PersonSummary.from_json)
+  finally:
+    store.close()
+
+
+def update_names(
+  path: str,
+  cache_dir: Optional[str] = None,
+  export: Optional[str] = None,
+  min_popularity: float = MIN_POPULARITY) -> NameIndex:
+  """
+  Create or update a name index from the response cache and a person ID export.
+  Args:
+    path: str. Index file.
+    cache_dir: str <optional>. Directory of the on-disk response cache.
+    export: str <optional>. Path of a person ID export file.
+    min_popularity: float. Popularity below which people of the export are skipped.
+  Returns:
+    The updated index.
+  """
+  index = NameIndex(path)
+  if export:
+    from costar_index import read_id_export
+    count = index.add_people(read_id_export(export), min_popularity)
+    log.info(f"Read {count} people from the export.")
+  if cache_dir:
+    # After the export, so that searches have the last word on departments.
+    searches = 0
+    for query, results in read_cached_searches(cache_dir):
+      index.add_results(query, results)
+      searches += 1
+    log.info(f"Read {searches} searches from the cache.")
+  return index
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(
+    prog="tmdb_query update-names",
+    description="Create or update a local actor name index.")
+  parser.add_argument('path', metavar='FILE', help='index file')
+  parser.add_argument(
+    '--cache-dir', metavar='DIR', default=os.environ.get("TMDB_CACHE_DIR"),
+    help='read person searches from this response cache directory')
+  parser.add_argument(
+    '--export', metavar='FILE',
+    help='TMDB daily person ID export (person_ids_MM_DD_YYYY.json.gz)')
+  parser.add_argument(
+    '--min-popularity', type=float, default=MIN_POPULARITY,
+    help='skip the people of the export less popular than this')
+  pargs = parser.parse_args(args)
+
+  index = update_names(pargs.path, pargs.cache_dir, pargs.export, pargs.min_popularity)
+  print(f"Name index {pargs.path}: {index.stats()['people']} people.")
+  index.close()
+  return 0
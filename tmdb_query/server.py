@@ -0,0 +1,343 @@
+"""
+Long-running co-star query service.
+
+Keeps pooled connections and warm response caches for its whole lifetime,
+and answers concurrent queries over a local HTTP or Unix socket JSON API:
+
+  GET /common?name=Keanu+Reeves&name=Laurence+Fishburne[&method=credits]
+  GET /common?id=6384&id=2975
+    {"actor_ids": [...], "movies": ["The Matrix", ...]}
+  GET /actor?name=Keanu+Reeves
+    {"id": 6384, "name": "Keanu Reeves", "known_for_department": "Acting", ...}
+  GET /path?name=Kevin+Bacon&id=6384[&max_degrees=6]
+    {"actor_ids": [4724, 6384], "path": [4724, 9362, ..., 6384], "degrees": 2}
+  GET /collaborators?name=Kevin+Bacon[&k=10]
+    {"actor_id": 4724, "collaborators": [[actor_id, shared movies], ...]}
+  GET /stats
+    Cache, deduplication and retry counters.
+  GET /metrics
+    Per-endpoint API call metrics, in the Prometheus text format.
+  GET /health
+
+Homonyms are resolved without user input, by picking the most popular actor.
+Start it with:
+
+  python3 tmdb_query serve [--port 8000 | --socket /tmp/tmdb_query.sock]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import requests
+from tmdb_client import cache, instrument, ratelimit, session, singleflight
+from tmdb_client.refresh import ChangeRefresher
+from tmdb_client.exceptions import NameNotFound, NotAnActor
+from tmdb_client.models import PersonSummary
+from tmdb_client.util import is_actor
+import cli
+import costar_graph
+import costar_index
+
+log = logging.getLogger(__name__)
+
+
+class BadRequest(Exception):
+  pass
+
+
+class QueryService():
+  """
+  Query logic shared by all the request handler threads.
+  """
+
+  def __init__(
+    self,
+    method: str = "discover",
+    index: Optional[costar_index.CostarIndex] = None,
+    metrics: Optional[instrument.PrometheusMetrics] = None,
+    refresher: Optional[ChangeRefresher] = None,
+    graph_max_edges: int = costar_graph.MAX_EDGES,
+    graph_ttl: float = costar_graph.GRAPH_TTL) -> None:
+    self.method = method
+    self.index = index
+    self.metrics = metrics
+    self.refresher = refresher
+    # Filled by the graph queries, and started over once stale, see get_graph().
+    self.graph = costar_graph.CostarGraph()
+    self.graph_max_edges = graph_max_edges
+    self.graph_ttl = graph_ttl
+    self.graph_resets = 0
+    self.started = time.time()
+    self.queries = 0
+    self._lock = threading.Lock()
+
+  def resolve(self, name: str) -> PersonSummary:
+    """
+    Returns:
+      The search result of the most popular actor named name.
+    """
+    result = cli.search_actor_by_name(name.strip(), interactive=False)
+    if not is_actor(result):
+      raise NotAnActor(f"\"{name}\" is not known for being an actor.")
+    return result
+
+  def common(self, names: List[str], ids: List[int], method: Optional[str] = None) -> Dict:
+    """
+    Returns:
+      The resolved actor ids, and the titles of the movies they share.
+    """
+    method = method or self.method
+    if method not in cli.METHODS:
+      raise BadRequest(f"Invalid method \"{method}\". Expected one of {cli.METHODS}.")
+    actor_ids = set(ids)
+    actor_ids.update(self.resolve(name).id for name in set(names))
+    if len(actor_ids) < 2:
+      raise BadRequest("At least 2 distinct actors are required.")
+    movies = cli.get_common_movies_for_actor_ids(actor_ids, method, self.index)
+    return {"actor_ids": sorted(actor_ids), "movies": movies}
+
+  def actor_ids(self, names: List[str], ids: List[int]) -> List[int]:
+    """
+    Returns:
+      The ids of the actors given by id, then of those given by name.
+    """
+    return list(dict.fromkeys(ids + [self.resolve(name).id for name in names]))
+
+  def path(self, names: List[str], ids: List[int], max_degrees: int) -> Dict:
+    """
+    Returns:
+      The resolved actor ids, and a shortest path between them in the
+      co-star graph, or null if longer than max_degrees movies.
+    """
+    actor_ids = self.actor_ids(names, ids)
+    if len(actor_ids) != 2:
+      raise BadRequest("Exactly 2 distinct actors are required.")
+    if not 0 < max_degrees <= 2 * costar_graph.MAX_DEGREES:
+      raise BadRequest(f"max_degrees must be between 1 and {2 * costar_graph.MAX_DEGREES}.")
+    path = self.get_graph().shortest_path(actor_ids[0], actor_ids[1], max_degrees)
+    return {
+      "actor_ids": actor_ids,
+      "path": path,
+      "degrees": len(path) // 2 if path is not None else None,
+    }
+
+  def collaborators(self, names: List[str], ids: List[int], k: int) -> Dict:
+    """
+    Returns:
+      The resolved actor id, and its k most frequent co-stars with the
+      number of movies they share.
+    """
+    actor_ids = self.actor_ids(names, ids)
+    if len(actor_ids) != 1:
+      raise BadRequest("Exactly 1 actor is required.")
+    top = self.get_graph().top_collaborators(actor_ids[0], k)
+    return {"actor_id": actor_ids[0], "collaborators": [list(item) for item in top]}
+
+  def get_graph(self) -> costar_graph.CostarGraph:
+    """
+    Returns:
+      The co-star graph, replaced by an empty one if it is stale. Queries in
+      progress keep using the graph they started with.
+    """
+    with self._lock:
+      if self.graph.is_stale(self.graph_max_edges, self.graph_ttl):
+        log.info(f"Starting over with an empty co-star graph: {self.graph.stats()}")
+        self.graph = costar_graph.CostarGraph()
+        self.graph_resets += 1
+      return self.graph
+
+  def count_query(self) -> None:
+    with self._lock:
+      self.queries += 1
+
+  def stats(self) -> Dict:
+    store = cache.get_cache()
+    return {
+      "uptime": time.time() - self.started,
+      "queries": self.queries,
+      "cache": store.stats() if store is not None else None,
+      "singleflight": singleflight.stats(),
+      "retries": ratelimit.retry_counts(),
+      "changes": self.refresher.stats() if self.refresher is not None else None,
+      "graph": dict(self.graph.stats(), resets=self.graph_resets),
+    }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+  disable_nagle_algorithm = True
+
+  def do_GET(self) -> None:
+    url = urlsplit(self.path)
+    query = parse_qs(url.query)
+    service: QueryService = self.server.service
+    if url.path.rstrip("/") == "/metrics" and service.metrics is not None:
+      self.send_text(200, service.metrics.exposition(), "text/plain; version=0.0.4")
+      return
+    try:
+      status, body = self.route(service, url.path.rstrip("/"), query)
+    except BadRequest as e:
+      status, body = 400, {"error": str(e)}
+    except (NameNotFound, NotAnActor) as e:
+      status, body = 404, {"error": str(e)}
+    except requests.RequestException as e:
+      log.warning(f"Upstream error for {self.path}: {e}")
+      status, body = 502, {"error": f"TMDB API error: {e}"}
+    except Exception as e:
+      # Invalid API key, malformed upstream response, bug... The client still
+      # gets an answer, and the traceback is logged.
+      log.exception(f"Error for {self.path}")
+      status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+    self.send_json(status, body)
+
+  def route(self, service: QueryService, path: str, query: Dict) -> Tuple[int, Dict]:
+    if path == "/common":
+      service.count_query()
+      ids = self.int_params(query, "id")
+      method = query.get("method", [None])[-1]
+      return 200, service.common(query.get("name", []), ids, method)
+    if path == "/path":
+      service.count_query()
+      max_degrees = self.int_params(query, "max_degrees") or [costar_graph.MAX_DEGREES]
+      return 200, service.path(query.get("name", []), self.int_params(query, "id"), max_degrees[-1])
+    if path == "/collaborators":
+      service.count_query()
+      k = self.int_params(query, "k") or [10]
+      return 200, service.collaborators(query.get("name", []), self.int_params(query, "id"), k[-1])
+    if path == "/actor":
+      service.count_query()
+      if "name" not in query:
+        raise BadRequest("Missing \"name\" parameter.")
+      return 200, service.resolve(query["name"][-1]).to_dict()
+    if path == "/stats":
+      return 200, service.stats()
+    if path == "/health":
+      return 200, {"status": "ok"}
+    return 404, {"error": f"Unknown path {path}."}
+
+  @staticmethod
+  def int_params(query: Dict, name: str) -> List[int]:
+    try:
+      return [int(i) for i in query.get(name, [])]
+    except ValueError:
+      raise BadRequest(f"Parameter \"{name}\" must be an integer.")
+
+  def send_json(self, status: int, body: Dict) -> None:
+    payload = json.dumps(body).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json;charset=utf-8")
+    self.send_header("Content-Length", str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def send_text(self, status: int, text: str, content_type: str) -> None:
+    payload = text.encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+    self.send_header("Content-Length", str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def address_string(self) -> str:
+    # Unix socket clients have no address.
+    return self.client_address[0] if self.client_address else "unix"
+
+  def log_message(self, format, *args) -> None:
+    log.debug(f"{self.address_string()} {format % args}")
+
+
+class UnixQueryHandler(QueryHandler):
+  # TCP_NODELAY is not supported by Unix sockets.
+  disable_nagle_algorithm = False
+
+
+class QueryServer(ThreadingHTTPServer):
+  daemon_threads = True
+
+  def __init__(self, service: QueryService, host: str = "127.0.0.1", port: int = 8000) -> None:
+    super().__init__((host, port), QueryHandler)
+    self.service = service
+
+  @property
+  def url(self) -> str:
+    host, port = self.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+class UnixQueryServer(ThreadingMixIn, UnixStreamServer):
+  daemon_threads = True
+
+  def __init__(self, service: QueryService, path: str) -> None:
+    if os.path.exists(path):
+      os.unlink(path)
+    super().__init__(path, UnixQueryHandler)
+    self.service = service
+
+  def server_close(self) -> None:
+    super().server_close()
+    if os.path.exists(self.server_address):
+      os.unlink(self.server_address)
+
+
+def setup(cache_dir: Optional[str] = None, memory_entries: int = 16384, pool_maxsize: int = 32) -> None:
+  """
+  Share one connection pool between the handler threads, which only live
+  as long as a client connection, and keep responses warm in memory.
+  """
+  session.configure(scope="process", pool_maxsize=pool_maxsize)
+  if cache_dir or cache.get_cache() is None:
+    cache.configure(cache_dir=cache_dir, memory_entries=memory_entries)
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(
+    prog="tmdb_query serve",
+    description="Serve co-star queries over a local JSON API.")
+  parser.add_argument('--host', default="127.0.0.1")
+  parser.add_argument('--port', type=int, default=8000)
+  parser.add_argument('--socket', metavar='PATH', help='listen on a Unix socket instead')
+  parser.add_argument('--method', choices=cli.METHODS, default="discover",
+                      help='default method of /common queries')
+  parser.add_argument('--index', metavar='DIR', help='answer /common queries from a local co-star index')
+  parser.add_argument('--cache-dir', metavar='DIR', default=os.environ.get("TMDB_CACHE_DIR"),
+                      help='on-disk response cache directory')
+  parser.add_argument('--cache-entries', type=int, default=16384,
+                      help='size of the in-memory response cache')
+  parser.add_argument('--refresh-hours', type=float, default=0,
+                      help='invalidate the cached responses of the movies and people changed '
+                           'on TMDB, from its change feeds, every N hours (0 to disable)')
+  pargs = parser.parse_args(args)
+
+  setup(pargs.cache_dir, pargs.cache_entries)
+  index = costar_index.CostarIndex(pargs.index) if pargs.index else None
+  metrics = instrument.PrometheusMetrics()
+  instrument.add_hook(metrics)
+  refresher = None
+  if pargs.refresh_hours > 0:
+    state = os.path.join(pargs.cache_dir, "changes.json") if pargs.cache_dir else None
+    refresher = ChangeRefresher(state_path=state)
+    refresher.start(interval=pargs.refresh_hours * 60 * 60)
+  service = QueryService(pargs.method, index, metrics, refresher)
+  if pargs.socket:
+    server = UnixQueryServer(service, pargs.socket)
+    print(f"Serving co-star queries on unix:{pargs.socket}")
+  else:
+    server = QueryServer(service, pargs.host, pargs.port)
+    print(f"Serving co-star queries on {server.url}")
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+    if refresher is not None:
+      refresher.stop()
+    session.close_sessions()
+    instrument.remove_hook(metrics)
+  return 0
@@ -0,0 +1,434 @@
+"""
+Co-star sweep over every pair of a set of actors, e.g. the 5,000 most
+popular ones, sharded across a process pool.
+
+  1. The filmography of each actor is fetched once (Person.movie_credits) and
+     written to DIR/snapshot, a co-star index (see costar_index) which every
+     worker process memory-maps read-only, sharing its pages.
+  2. The pairs (i < j) are split into shards of consecutive rows holding
+     about the same number of pairs. A worker finds the co-stars of actor i
+     through the cast of each of its movies, rather than intersecting the
+     filmographies of every pair.
+  3. Each shard writes its pairs to DIR/shards/NNNNN.jsonl, then a summary
+     to NNNNN.json which marks it as done.
+  4. Summaries are reduced as shards complete (totals, pairs sharing the most
+     movies), then the shard files are streamed in order into DIR/pairs.jsonl:
+
+       {"actors": [6384, 2975], "count": 4, "movies": [603, 604, 605, 624860]}
+
+The plan (actors and settings) is saved in DIR/sweep.json. Running the sweep
+again on the same directory, e.g. after a crash, skips the shards done.
+
+  python3 tmdb_query sweep DIR --top 5000 [--workers 8] [--min-shared 2]
+  python3 tmdb_query sweep DIR --actors ids.txt
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import sys
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import costar_index
+
+log = logging.getLogger(__name__)
+
+PLAN_VERSION = 1
+# Shards per worker process, so that workers finishing early pick up more.
+SHARDS_PER_WORKER = 16
+
+# (shard number, first row, row after the last)
+Shard = Tuple[int, int, int]
+
+
+def plan_shards(n_actors: int, n_shards: int) -> List[Shard]:
+  """
+  Split the rows of the pair triangle into shards of about the same number
+  of pairs. Row i holds the pairs (i, j) for every j > i.
+
+  >>> plan_shards(5, 2)
+  [(0, 0, 2), (1, 2, 4)]
+  """
+  total = n_actors * (n_actors - 1) // 2
+  if not total:
+    return []
+  n_shards = max(1, min(n_shards, n_actors - 1))
+  target = total / n_shards
+  shards, start, done = [], 0, 0
+  for row in range(n_actors - 1):
+    done += n_actors - 1 - row
+    if done >= target * (len(shards) + 1) or row == n_actors - 2:
+      shards.append((len(shards), start, row + 1))
+      start = row + 1
+  return shards
+
+
+def build_snapshot(path: str, actor_ids: Sequence[int]) -> costar_index.CostarIndex:
+  """
+  Create or extend the filmography snapshot of actor_ids, fetching the
+  movie credits of the actors missing from it.
+  Returns:
+    The snapshot, as a co-star index.
+  """
+  from requests import HTTPError
+  from tmdb_client import BATCH_WORKERS
+  from tmdb_client.util import get_filmography
+
+  casts: Dict[int, List[int]] = {}
+  movies: costar_index.MovieTable = {}
+  missing = list(actor_ids)
+  if os.path.exists(os.path.join(path, "meta.json")):
+    snapshot = costar_index.CostarIndex(path)
+    casts, movies = snapshot.casts(), dict(snapshot.movies)
+    # People without any movie are not in the index and are fetched again.
+    missing = [a for a in actor_ids if a not in snapshot]
+    if not missing:
+      return snapshot
+
+  def fetch(actor_id: int) -> Dict:
+    try:
+      return get_filmography(actor_id)
+    except HTTPError as e:
+      log.warning(f"Skipping actor {actor_id}: {e}")
+      return {}
+
+  log.info(f"Fetching the filmographies of {len(missing)} actors.")
+  with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+    for actor_id, filmography in zip(missing, pool.map(fetch, missing)):
+      for movie_id, movie in filmography.items():
+        casts.setdefault(movie_id, []).append(actor_id)
+        movies[movie_id] = (movie.title or "", movie.release_date or "")
+  return costar_index.CostarIndex.build(path, casts, movies)
+
+
+class ShardWorker():
+  """
+  State of a worker process: the snapshot, mapped once, and the actors of
+  each movie by row, built from it.
+  """
+
+  def __init__(self, sweep_dir: str, actor_ids: Sequence[int], min_shared: int, top: int) -> None:
+    self.shard_dir = os.path.join(sweep_dir, "shards")
+    self.snapshot = costar_index.CostarIndex(os.path.join(sweep_dir, "snapshot"))
+    self.actor_ids = actor_ids
+    self.min_shared = min_shared
+    self.top = top
+    self.filmographies = [self.snapshot.movies_for(a) for a in actor_ids]
+    # Rows of the actors of each movie, in increasing order.
+    self.casts: Dict[int, List[int]] = {}
+    for row, filmography in enumerate(self.filmographies):
+      for movie_id in filmography:
+        self.casts.setdefault(int(movie_id), []).append(row)
+
+  def co_stars(self, row: int) -> Dict[int, List[int]]:
+    """
+    Returns:
+      {j: ids of the movies shared by the actors of rows row and j}, for j > row.
+    """
+    shared: Dict[int, List[int]] = {}
+    for movie_id in self.filmographies[row]:
+      cast = self.casts[int(movie_id)]
+      for other in islice(cast, bisect_right(cast, row), None):
+        shared.setdefault(other, []).append(int(movie_id))
+    return shared
+
+  def run(self, shard: Shard) -> Dict:
+    """
+    Write the pairs of a shard, then its summary.
+    Returns:
+      The summary of the shard.
+    """
+    number, start, stop = shard
+    began = time.perf_counter()
+    n = len(self.actor_ids)
+    top: List[Tuple[int, int, int]] = []
+    matches = 0
+    path = shard_path(self.shard_dir, number)
+    with open(f"{path}.jsonl.tmp", "w", encoding="utf-8") as out:
+      for row in range(start, stop):
+        shared = self.co_stars(row)
+        for other in sorted(shared):
+          movies = shared[other]
+          if len(movies) < self.min_shared:
+            continue
+          pair = (self.actor_ids[row], self.actor_ids[other])
+          out.write(json.dumps(
+            {"actors": pair, "count": len(movies), "movies": movies}, separators=(",", ":")) + "\n")
+          matches += 1
+          entry = (len(movies), -pair[0], -pair[1])
+          if len(top) < self.top:
+            heapq.heappush(top, entry)
+          elif entry > top[0]:
+            heapq.heapreplace(top, entry)
+    os.replace(f"{path}.jsonl.tmp", f"{path}.jsonl")
+    summary = {
+      "shard": number,
+      "rows": [start, stop],
+      "pairs": sum(n - 1 - row for row in range(start, stop)),
+      "matches": matches,
+      "top": [[count, -a, -b] for count, a, b in sorted(top, reverse=True)],
+      "elapsed": time.perf_counter() - began,
+    }
+    # Written last: it marks the shard as done.
+    costar_index._write_atomic(f"{path}.json", json.dumps(summary).encode("utf-8"))
+    return summary
+
+
+_worker: Optional[ShardWorker] = None
+
+
+def _init_worker(sweep_dir: str, actor_ids: Sequence[int], min_shared: int, top: int) -> None:
+  global _worker
+  _worker = ShardWorker(sweep_dir, actor_ids, min_shared, top)
+
+
+def _run_shard(shard: Shard) -> Dict:
+  return _worker.run(shard)
+
+
+def shard_path(shard_dir: str, number: int) -> str:
+  return os.path.join(shard_dir, f"{number:05d}")
+
+
+def read_summary(shard_dir: str, number: int) -> Optional[Dict]:
+  """
+  Returns:
+    The summary of a shard, or None if it is not done.
+  """
+  path = f"{shard_path(shard_dir, number)}.json"
+  if not os.path.exists(path):
+    return None
+  with open(path, encoding="utf-8") as f:
+    return json.load(f)
+
+
+class Reducer():
+  """
+  Streaming merge of shard summaries, in any order.
+  """
+
+  def __init__(self, top: int) -> None:
+    self.top = top
+    self.shards = 0
+    self.pairs = 0
+    self.matches = 0
+    self.elapsed = 0.0
+    self._top: List[Tuple[int, int, int]] = []
+
+  def add(self, summary: Dict) -> None:
+    self.shards += 1
+    self.pairs += summary["pairs"]
+    self.matches += summary["matches"]
+    self.elapsed += summary["elapsed"]
+    for count, a, b in summary["top"]:
+      entry = (count, -a, -b)
+      if len(self._top) < self.top:
+        heapq.heappush(self._top, entry)
+      elif entry > self._top[0]:
+        heapq.heapreplace(self._top, entry)
+
+  def result(self) -> Dict:
+    return {
+      "shards": self.shards,
+      "pairs": self.pairs,
+      "matches": self.matches,
+      "cpu_seconds": self.elapsed,
+      "top": [
+        {"actors": [-a, -b], "count": count} for count, a, b in sorted(self._top, reverse=True)],
+    }
+
+
+def run_shards(
+  sweep_dir: str,
+  actor_ids: Sequence[int],
+  shards: Sequence[Shard],
+  workers: int,
+  min_shared: int = 1,
+  top: int = 20) -> Iterator[Dict]:
+  """
+  Run the shards which are not done yet.
+  Returns:
+    An iterator of the summaries of all the shards, done before or now, in
+    completion order.
+  """
+  shard_dir = os.path.join(sweep_dir, "shards")
+  os.makedirs(shard_dir, exist_ok=True)
+  pending = []
+  for shard in shards:
+    summary = read_summary(shard_dir, shard[0])
+    if summary is not None:
+      yield summary
+    else:
+      pending.append(shard)
+  if not pending:
+    return
+  log.info(f"Running {len(pending)} shards out of {len(shards)} on {workers} processes.")
+  if workers <= 1:
+    worker = ShardWorker(sweep_dir, actor_ids, min_shared, top)
+    for shard in pending:
+      yield worker.run(shard)
+    return
+  with ProcessPoolExecutor(
+    max_workers=workers,
+    initializer=_init_worker,
+    initargs=(sweep_dir, list(actor_ids), min_shared, top)) as pool:
+    for future in as_completed([pool.submit(_run_shard, shard) for shard in pending]):
+      yield future.result()
+
+
+def merge_pairs(sweep_dir: str, shards: Iterable[Shard]) -> str:
+  """
+  Concatenate the pairs of every shard, in shard order.
+  Returns:
+    The path of the merged file.
+  """
+  path = os.path.join(sweep_dir, "pairs.jsonl")
+  shard_dir = os.path.join(sweep_dir, "shards")
+  with open(f"{path}.tmp", "wb") as out:
+    for number, _, _ in shards:
+      with open(f"{shard_path(shard_dir, number)}.jsonl", "rb") as f:
+        while chunk := f.read(1 << 20):
+          out.write(chunk)
+  os.replace(f"{path}.tmp", path)
+  return path
+
+
+def popular_actor_ids(n: int) -> List[int]:
+  """
+  Returns:
+    The ids of the n most popular people known for acting.
+  """
+  from tmdb_client.person import Person
+  actors = (p for p in Person().iter_popular() if p.is_actor)
+  return [p.id for p in islice(actors, n)]
+
+
+def read_actor_ids(path: str) -> List[int]:
+  """
+  Read actor ids, one per line. Blank lines and # comments are ignored.
+  """
+  with open(path, encoding="utf-8") as f:
+    ids = [line.split("#", 1)[0].strip() for line in f]
+  return [int(i) for i in ids if i]
+
+
+def load_plan(sweep_dir: str) -> Optional[Dict]:
+  path = os.path.join(sweep_dir, "sweep.json")
+  if not os.path.exists(path):
+    return None
+  with open(path, encoding="utf-8") as f:
+    plan = json.load(f)
+  if plan.get("version") != PLAN_VERSION:
+    raise Exception(f"Unsupported sweep version in {sweep_dir}: {plan.get('version')}.")
+  return plan
+
+
+def sweep(
+  sweep_dir: str,
+  actor_ids: Optional[Sequence[int]] = None,
+  workers: int = 1,
+  n_shards: Optional[int] = None,
+  min_shared: int = 1,
+  top: int = 20) -> Dict:
+  """
+  Run or resume a sweep, see the module documentation.
+  Args:
+    sweep_dir: str. Directory of the sweep, created if needed.
+    actor_ids: sequence of ints <optional>. Actors of a new sweep. Resumed
+      sweeps use the actors of their plan.
+    workers: int. Number of worker processes.
+    n_shards: int <optional>. Number of shards of a new sweep. Defaults to
+      SHARDS_PER_WORKER per worker.
+    min_shared: int. Only keep the pairs sharing at least this many movies.
+    top: int. Number of pairs sharing the most movies to report.
+  Returns:
+    The reduced summary of the sweep.
+  """
+  plan = load_plan(sweep_dir)
+  resumed = plan is not None
+  if plan is None:
+    if not actor_ids:
+      raise ValueError(f"No sweep in {sweep_dir} to resume, and no actors given.")
+    actor_ids = list(dict.fromkeys(int(a) for a in actor_ids))
+    plan = {
+      "version": PLAN_VERSION,
+      "actors": actor_ids,
+      "shards": plan_shards(len(actor_ids), n_shards or SHARDS_PER_WORKER * max(workers, 1)),
+      "min_shared": min_shared,
+      "top": top,
+    }
+    os.makedirs(sweep_dir, exist_ok=True)
+  elif actor_ids is not None and list(actor_ids) != plan["actors"]:
+    raise ValueError(f"{sweep_dir} holds a sweep of other actors. Use another directory.")
+
+  if not resumed:
+    build_snapshot(os.path.join(sweep_dir, "snapshot"), plan["actors"])
+    # Saved once the snapshot is complete, so that resumed sweeps never fetch.
+    costar_index._write_atomic(
+      os.path.join(sweep_dir, "sweep.json"), json.dumps(plan).encode("utf-8"))
+
+  shards = [tuple(s) for s in plan["shards"]]
+  reducer = Reducer(plan["top"])
+  for summary in run_shards(
+      sweep_dir, plan["actors"], shards, workers, plan["min_shared"], plan["top"]):
+    reducer.add(summary)
+    log.info(f"Shard {summary['shard']} done ({reducer.shards}/{len(shards)}).")
+  result = reducer.result()
+  result["output"] = merge_pairs(sweep_dir, shards)
+  costar_index._write_atomic(
+    os.path.join(sweep_dir, "summary.json"), json.dumps(result, indent=1).encode("utf-8"))
+  return result
+
+
+def main(args=None) -> int:
+  parser = argparse.ArgumentParser(
+    prog="tmdb_query sweep",
+    description="Find the movies shared by every pair of a set of actors, on several processes.")
+  parser.add_argument('path', metavar='DIR', help='sweep directory, resumed if it exists')
+  actors = parser.add_mutually_exclusive_group()
+  actors.add_argument('--top', type=int, metavar='N', help='sweep the N most popular actors')
+  actors.add_argument('--actors', metavar='FILE', help='sweep the actor ids of this file, one per line')
+  parser.add_argument(
+    '--workers', type=int, default=os.cpu_count() or 1,
+    help='number of worker processes (default: one per core)')
+  parser.add_argument('--shards', type=int, help='number of shards of a new sweep')
+  parser.add_argument(
+    '--min-shared', type=int, default=1,
+    help='only keep the pairs sharing at least this many movies')
+  parser.add_argument('--top-pairs', type=int, default=20, help='number of top pairs to report')
+  parser.add_argument(
+    '--cache-dir', metavar='DIR', default=os.environ.get("TMDB_CACHE_DIR"),
+    help='on-disk response cache directory')
+  pargs = parser.parse_args(args)
+
+  if pargs.cache_dir:
+    from tmdb_client import cache
+    cache.configure(cache_dir=pargs.cache_dir)
+  actor_ids = None
+  if load_plan(pargs.path) is None:
+    if pargs.actors:
+      actor_ids = read_actor_ids(pargs.actors)
+    elif pargs.top:
+      actor_ids = popular_actor_ids(pargs.top)
+    else:
+      parser.error("--top or --actors is required to start a sweep.")
+  elif pargs.actors:
+    actor_ids = read_actor_ids(pargs.actors)
+
+  result = sweep(
+    pargs.path, actor_ids, pargs.workers, pargs.shards, pargs.min_shared, pargs.top_pairs)
+  print(
+    f"{result['pairs']} pairs in {result['shards']} shards, {result['matches']} sharing "
+    f"at least {pargs.min_shared} movies, written to {result['output']}.")
+  for pair in result["top"]:
+    print(f"{pair['actors'][0]} {pair['actors'][1]}: {pair['count']}")
+  return 0
+
+
+if __name__ == "__main__":
+  logging.basicConfig(level=logging.INFO)
+  sys.exit(main())
@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from unittest import mock
+from bench.stub_server import StubServer
+from tmdb_client import aio, instrument
+
+
+def run(coro):
+  async def wrapper():
+    try:
+      return await coro
+    finally:
+      await aio.close_client()
+  return asyncio.run(wrapper())
+
+
+class AsyncResourceTestCase(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.server = StubServer().start()
+    cls.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", cls.server.url)
+    cls.patch.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.patch.stop()
+    cls.server.stop()
+
+  def test_movie_credits(self):
+    res = run(aio.AsyncMovie(1).credits())
+    assert [c["id"] for c in res["cast"]] == self.server.catalog.casts[1]
+
+  def test_search_person(self):
+    page = run(aio.AsyncSearch().person(query="Actor 1"))
+    assert page.results[0].id == 1
+
+  def test_discover_all_pages(self):
+    page = run(aio.AsyncDiscover().movie(with_cast="", all_pages=True))
+    assert len(page.results) == page.total_results
+
+  def test_iter_movie(self):
+    async def take(prefetch, n=None):
+      found = []
+      movies = aio.AsyncDiscover().iter_movie(prefetch=prefetch, with_cast="")
+      async for movie in movies:
+        found.append(movie.id)
+        if len(found) == n:
+          break
+      await movies.aclose()
+      return found
+
+    total = run(aio.AsyncDiscover().movie(with_cast="")).total_results
+    for prefetch in (0, 2):
+      assert len(set(run(take(prefetch)))) == total
+    self.server.reset_counters()
+    assert len(run(take(0, 3))) == 3
+    assert self.server.counters["requests"] == 1
+
+  def test_coalesce(self):
+    person = aio.AsyncPerson(3).coalesce("movie_credits")
+    self.server.reset_counters()
+
+    async def fetch():
+      await person.details()
+      return await person.movie_credits()
+    res = run(fetch())
+    assert self.server.counters["requests"] == 1
+    assert {c["id"] for c in res["cast"]} == set(self.server.catalog.filmographies[3])
+
+  def test_batch_details(self):
+    self.server.reset_counters()
+    people = run(aio.AsyncPerson.batch_details([1, 2, 1], append_to_response=("movie_credits",)))
+    assert list(people) == [1, 2]
+    assert people[2].name == self.server.catalog.people[2]["name"]
+    res = run(people[2].movie_credits())
+    assert self.server.counters["requests"] == 2
+    assert {c["id"] for c in res["cast"]} == set(self.server.catalog.filmographies[2])
+
+  def test_get_movie_cast(self):
+    cast = run(aio.get_movie_cast(1))
+    assert cast == set(self.server.catalog.casts[1])
+
+  def test_get_movies_id_for_actor_id(self):
+    movies = run(aio.get_movies_id_for_actor_id(1))
+    assert set(movies) == set(self.server.catalog.filmographies[1])
+
+  def test_get_common_movies_for_actor(self):
+    catalog = self.server.catalog
+    movie_id = catalog.filmographies[1][0]
+    other = catalog.casts[movie_id][-1]
+    common = run(aio.get_common_movies_for_actor(1, {other}))
+    assert movie_id in common
+    for _id in common:
+      assert {1, other} <= set(catalog.casts[_id])
+
+  def test_profile(self):
+    with instrument.profile("casts") as p:
+      run(aio.get_movie_casts(range(1, 4)))
+    assert len(p.calls) == 3
+    assert {c.endpoint for c in p.calls} == {"movie/{id}/credits"}
+    assert all(c.status == 200 and c.bytes > 0 for c in p.calls)
+
+  def test_concurrency_limit(self):
+    aio.configure(max_concurrency=2)
+    try:
+      async def check():
+        await aio.get_movie_casts(range(1, 11))
+        return aio.get_client().semaphore._value
+      assert run(check()) == 2
+    finally:
+      aio.configure(max_concurrency=aio.MAX_CONCURRENCY)
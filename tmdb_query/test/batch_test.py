@@ -0,0 +1,108 @@
+import io
+import json
+import unittest
+from unittest import mock
+from bench.stub_server import StubCatalog, StubServer
+from tmdb_client import cache
+from batch import BatchRunner, main, parse_queries, resolve_names
+
+
+class BatchTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  @classmethod
+  def setUpClass(cls):
+    cls.catalog = StubCatalog(n_people=30, n_movies=100, cast_size=6)
+    cls.shared = cls.catalog.add_movie("Shared", "2000-01-01", [1, 2, 3])
+    cls.catalog.people[1]["popularity"] = 50
+    cls.homonym = cls.catalog.add_person("Actor 1", popularity=1)
+    cls.stub = StubServer(cls.catalog).start()
+    cls.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", cls.stub.url)
+    cls.patch.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.patch.stop()
+    cls.stub.stop()
+
+  def setUp(self):
+    cache.set_cache(None)
+    self.stub.reset_counters()
+
+  def test_parse_queries(self):
+    lines = [
+      '["Actor 1", "Actor 2"]\n',
+      '\n',
+      '[1, 2, "Actor 3"]\n',
+      '{"names": ["Actor 1"], "ids": [2]}\n',
+      '"Actor 1"\n',
+      '{not json\n',
+      '{"names": "Actor 1", "ids": [2]}\n',
+      '{"names": ["Actor 1"], "ids": 2}\n',
+    ]
+    queries = list(parse_queries(lines))
+    assert [(q.line, q.names, q.ids) for q in queries[:3]] == [
+      (1, ["Actor 1", "Actor 2"], []),
+      (3, ["Actor 3"], [1, 2]),
+      (4, ["Actor 1"], [2]),
+    ]
+    assert [q.line for q in queries[3:]] == [5, 6, 7, 8]
+    assert all(isinstance(q, Exception) for q in queries[3:])
+
+    rows = list(parse_queries(io.StringIO('Actor 1,Actor 2\n"Actor 3",2\n'), "csv"))
+    assert [(q.names, q.ids) for q in rows] == [(["Actor 1", "Actor 2"], []), (["Actor 3"], [2])]
+
+  def test_resolve_names_once(self):
+    names = resolve_names(["Actor 1", "Actor 2", "Actor 1", "Nobody"])
+    # Homonyms: the most popular one is picked.
+    assert names["Actor 1"] == 1
+    assert names["Actor 2"] == 2
+    assert isinstance(names["Nobody"], Exception)
+    assert self.stub.counters["requests"] == 3
+
+    picked = resolve_names(["Actor 1"], picks={"Actor 1": self.homonym})
+    assert picked == {"Actor 1": self.homonym}
+    assert self.stub.counters["requests"] == 3
+
+  def test_run(self):
+    queries = parse_queries([
+      '["Actor 1", "Actor 2"]',
+      '[2, 1]',
+      '["Actor 1", "Actor 2", "Actor 3"]',
+      '["Actor 1", "Nobody"]',
+      '["Actor 1"]',
+    ])
+    results = {r["line"]: r for r in BatchRunner(method="credits", workers=4).run(queries)}
+    assert results[1]["actor_ids"] == [1, 2]
+    assert "Shared" in results[1]["movies"]
+    assert results[2]["movies"] == results[1]["movies"]
+    assert "Shared" in results[3]["movies"]
+    assert "error" in results[4]
+    assert "error" in results[5]
+
+  def test_bounded_run(self):
+    consumed = []
+
+    def lines():
+      for line in range(1, 21):
+        consumed.append(line)
+        yield f'[{line % 5 + 1}, {(line + 1) % 5 + 1}]'
+
+    runner = BatchRunner(method="credits", workers=2, max_pending=3, group_entries=2)
+    results = runner.run(parse_queries(lines()))
+    next(results)
+    # Read ahead by chunks, not up to the end.
+    assert len(consumed) <= 2 * runner.max_pending
+    assert len(list(results)) == 19
+    assert len(runner._groups) <= 2
+
+  def test_main(self):
+    stdin = io.StringIO('Actor 1,Actor 2\nActor 1,Nobody\n')
+    stdout = io.StringIO()
+    with mock.patch("sys.stdin", stdin), mock.patch("sys.stdout", stdout):
+      code = main(["-", "--format", "csv", "--method", "credits", "--pick", f"Actor 1={self.homonym}"])
+    assert code == 1
+    results = sorted((json.loads(l) for l in stdout.getvalue().splitlines()), key=lambda r: r["line"])
+    assert results[0]["actor_ids"] == [2, self.homonym]
+    assert "Shared" not in results[0]["movies"]
+    assert "error" in results[1]
@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+from bench.stub_server import StubServer
+from tmdb_client import cache, instrument
+from tmdb_client.movie import Movie
+from tmdb_client.person import Person
+from tmdb_client.search import Search
+
+
+class CacheKeyTestCase(unittest.TestCase):
+  def test_cache_key(self):
+    key = cache.cache_key("/search/person", {"query": "a", "api_key": "x", "page": 2})
+    assert key == "search/person?page=2&query=a"
+    assert cache.cache_key("movie/603", {}) == "movie/603"
+
+  def test_get_ttl(self):
+    assert cache.get_ttl("search/person") == cache.DAY
+    assert cache.get_ttl("movie/603/credits") == 7 * cache.DAY
+    assert cache.get_ttl("person/6384/movie_credits") == 7 * cache.DAY
+    assert cache.get_ttl("person/6384") == 3 * cache.DAY
+
+
+class MemoryCacheTestCase(unittest.TestCase):
+  def test_lru_eviction(self):
+    store = cache.MemoryCache(max_entries=2)
+    store.set("a", {"v": 1}, 60)
+    store.set("b", {"v": 2}, 60)
+    store.get("a")
+    store.set("c", {"v": 3}, 60)
+    assert store.get("b") is None
+    assert store.get("a") == {"v": 1}
+    assert store.get("c") == {"v": 3}
+    assert store.hits == 3 and store.misses == 1
+
+  def test_expiry(self):
+    store = cache.MemoryCache()
+    store.set("a", {"v": 1}, -1)
+    assert store.get("a") is None
+
+  def test_validators(self):
+    assert cache.get_validators({"ETag": '"x"', "Date": "today"}) == {"ETag": '"x"'}
+    assert cache.conditional_headers({"ETag": '"x"'}) == {"If-None-Match": '"x"'}
+    store = cache.MemoryCache()
+    store.set("a", {"v": 1}, -1, validators={"ETag": '"x"'})
+    store.set("b", {"v": 2}, -1)
+    # Expired entries are kept for revalidation when they have validators.
+    assert store.get("a") is None
+    assert store.get_stale("a") == ({"v": 1}, {"ETag": '"x"'})
+    assert store.get_stale("b") is None
+
+  def test_maintenance(self):
+    store = cache.MemoryCache()
+    store.set("movie/1", {"v": 1}, 60)
+    store.set("movie/2", {"v": 2}, 60)
+    store.set("person/1", {"v": 3}, 60)
+    assert sorted(store.keys("movie/")) == ["movie/1", "movie/2"]
+    store.delete_many(["movie/1"])
+    assert store.get("movie/1") is None
+    store.extend_expiry({"movie/2": time.time() + 3600})
+    assert store.stats()["entries"] == 2
+
+
+class SQLiteCacheTestCase(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.tmp.name, "cache.sqlite")
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_persistence(self):
+    store = cache.SQLiteCache(self.path)
+    store.set("a", {"cast": [1, 2, 3]}, 60)
+    store.close()
+    store = cache.SQLiteCache(self.path)
+    assert store.get("a") == {"cast": [1, 2, 3]}
+    assert store.get("b") is None
+    assert store.stats()["hits"] == 1
+    store.close()
+
+  def test_size_eviction(self):
+    store = cache.SQLiteCache(self.path, max_bytes=2000)
+    for i in range(50):
+      store.set(f"key{i}", {"data": os.urandom(64).hex()}, 60)
+      time.sleep(0.001)
+    assert store.stats()["bytes"] <= 2000
+    assert store.get("key49") is not None
+    assert store.get("key0") is None
+    store.close()
+
+  def test_validators(self):
+    store = cache.SQLiteCache(self.path)
+    store.set("movie/1", {"v": 1}, -1, validators={"ETag": '"x"'})
+    store.set("movie/2", {"v": 2}, -1)
+    store.set("movie/3", {"v": 3}, 60)
+    assert store.get("movie/1") is None
+    assert store.get("movie/2") is None
+    assert store.get_stale("movie/1") == ({"v": 1}, {"ETag": '"x"'})
+    assert store.get_stale("movie/2") is None
+    assert sorted(store.keys("movie/")) == ["movie/1", "movie/3"]
+    store.delete_many(["movie/1"])
+    assert store.keys("movie/") == ["movie/3"]
+    store.close()
+
+  def test_migration(self):
+    conn = sqlite3.connect(self.path)
+    conn.execute(
+      "CREATE TABLE responses ("
+      "key TEXT PRIMARY KEY, value BLOB, expires REAL, size INTEGER, accessed REAL)")
+    conn.commit()
+    conn.close()
+    store = cache.SQLiteCache(self.path)
+    store.set("a", {"v": 1}, 60, validators={"ETag": '"x"'})
+    assert store.get("a") == {"v": 1}
+    store.close()
+
+  def test_tier_promotion(self):
+    disk = cache.SQLiteCache(self.path)
+    memory = cache.MemoryCache()
+    tiered = cache.TieredCache(memory, disk)
+    disk.set("a", {"v": 1}, 60)
+    assert tiered.get("a") == {"v": 1}
+    assert memory.get("a") == {"v": 1}
+    disk.close()
+
+  def test_tier_promotion_validators(self):
+    disk = cache.SQLiteCache(self.path)
+    memory = cache.MemoryCache()
+    tiered = cache.TieredCache(memory, disk)
+    disk.set("a", {"v": 1}, 0.05, validators={"ETag": '"x"'})
+    assert tiered.get("a") == {"v": 1}
+    time.sleep(0.1)
+    assert memory.get_stale("a") == ({"v": 1}, {"ETag": '"x"'})
+    disk.close()
+
+  def test_eviction_keeps_validators(self):
+    store = cache.SQLiteCache(self.path, max_bytes=100000)
+    store.set("plain", {"v": 1}, -1)
+    store.set("etag", {"v": 2}, -1, validators={"ETag": '"x"'})
+    store.set("fresh", {"data": os.urandom(64).hex()}, 60)
+    store._evict()
+    assert store.get_stale("etag") == ({"v": 2}, {"ETag": '"x"'})
+    assert store.keys("plain") == []
+    store.close()
+
+
+class CachedCallTestCase(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.server = StubServer().start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+    cache.set_cache(None)
+    self.tmp.cleanup()
+
+  def test_warm_calls_skip_network(self):
+    cache.configure(cache_dir=self.tmp.name)
+    Search().person(query="Actor 1")
+    Person(1).movie_credits()
+    Movie(1).credits()
+    assert self.server.counters["requests"] == 3
+
+    # A new cache on the same directory simulates another process.
+    store = cache.configure(cache_dir=self.tmp.name)
+    res = Movie(1).credits()
+    Person(1).movie_credits()
+    Search().person(query="Actor 1")
+    assert self.server.counters["requests"] == 3
+    assert "cast" in res
+    assert store.stats()["hits"] == 3
+
+  def test_revalidation(self):
+    cache.configure(memory_entries=64, ttls=[("movie/*/credits", 0.05)])
+    Movie(1).credits()
+    time.sleep(0.1)
+    with instrument.profile("revalidate") as p:
+      res = Movie(1).credits()
+    # The expired response was revalidated, not downloaded again.
+    assert self.server.counters["requests"] == 2
+    assert self.server.counters["not_modified"] == 1
+    assert "cast" in res
+    assert p.calls[0].cache == instrument.HIT
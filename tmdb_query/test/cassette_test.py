@@ -0,0 +1,73 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+import requests
+from bench.stub_server import StubCatalog, StubServer
+from tmdb_client import cassette
+from tmdb_client.movie import Movie
+from tmdb_client.person import Person
+from tmdb_client.util import get_movie_cast
+
+
+class CassetteTestCase(unittest.TestCase):
+  """Record from a local stub of the API, see bench/stub_server.py."""
+
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.server = StubServer(StubCatalog(n_people=20, n_movies=10)).start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+    self.tmp.cleanup()
+
+  def record(self, name: str) -> str:
+    path = os.path.join(self.tmp.name, name)
+    with cassette.use(path, mode="record") as recorder:
+      Movie(1).credits()
+      get_movie_cast(2)
+      with self.assertRaises(requests.HTTPError):
+        Person(999).details()
+    assert recorder.recorded == 3
+    return path
+
+  def test_record_and_replay(self):
+    for name in ("movies.json", "movies.json.gz"):
+      path = self.record(name)
+      self.server.reset_counters()
+      previous = cassette.get_cassette()
+      with cassette.use(path, mode="replay") as player:
+        assert Movie(1).credits() == self.server.catalog.credits(1)[1]
+        assert get_movie_cast(2) == set(self.server.catalog.casts[2])
+        with self.assertRaises(requests.HTTPError) as e:
+          Person(999).details()
+        assert e.exception.response.status_code == 404
+        with self.assertRaises(cassette.CassetteMiss):
+          Movie(3).credits()
+      assert self.server.counters["requests"] == 0
+      assert player.played >= 3
+      assert cassette.get_cassette() is previous
+
+  def test_once_and_latency(self):
+    path = os.path.join(self.tmp.name, "once.json")
+    with cassette.use(path, mode="once", latency=0.05) as recorder:
+      Movie(1).credits()
+      start = time.perf_counter()
+      Movie(1).credits()
+      assert time.perf_counter() - start >= 0.05
+    assert (recorder.recorded, recorder.played) == (1, 1)
+    assert cassette.Cassette(path).responses.keys() == {"GET movie/1/credits"}
+
+  def test_other_hosts_pass_through(self):
+    with cassette.use(mode="replay", base_url="https://api.themoviedb.org") as player:
+      assert Movie(1).credits()["id"] == 1
+    assert player.played == 0
+    assert self.server.counters["requests"] == 1
+
+  def test_invalid_mode(self):
+    with self.assertRaises(ValueError):
+      cassette.Cassette(mode="rewind")
@@ -0,0 +1,94 @@
+import json
+import unittest
+from unittest import mock
+from bench.stub_server import StubCatalog, StubServer
+from tmdb_client import cache, codec
+from tmdb_client.movie import Movie
+from tmdb_client.util import CAST_FIELDS, get_movie_cast
+
+CREDITS = {
+  "id": 603,
+  "cast": [
+    {"id": 6384, "name": "Keanu Reeves", "known_for_department": "Acting", "character": "Neo", "order": 0},
+    {"id": 2975, "name": "Laurence Fishburne", "known_for_department": "Acting", "character": "Morpheus"},
+  ],
+  "crew": [{"id": 9339, "name": "Lana Wachowski", "job": "Director"}],
+}
+FIELDS = ("id", "cast[].id", "cast[].known_for_department")
+PROJECTED = {
+  "id": 603,
+  "cast": [
+    {"id": 6384, "known_for_department": "Acting"},
+    {"id": 2975, "known_for_department": "Acting"},
+  ],
+}
+
+
+class CodecTestCase(unittest.TestCase):
+  def tearDown(self):
+    codec.configure("auto")
+
+  def test_field_tree(self):
+    assert codec.normalize_fields("cast[].id, id,cast[].id") == ("cast[].id", "id")
+    assert codec.field_tree(("cast[].id", "id")) == {"cast": {"[]": {"id": {}}}, "id": {}}
+
+  def test_project(self):
+    assert codec.project(CREDITS, FIELDS) == PROJECTED
+    assert codec.project({"cast": None}, FIELDS) == {"cast": None}
+    assert codec.project([{"id": 1, "x": 2}], ["[].id"]) == [{"id": 1}]
+
+  def test_backends(self):
+    body = json.dumps(CREDITS).encode("utf-8")
+    backends = [b for b in codec.BACKENDS[1:] if codec._available(b)]
+    assert "json" in backends
+    for backend in backends:
+      assert codec.configure(backend) == backend
+      assert codec.loads(body) == CREDITS
+      assert codec.loads(body, FIELDS) == PROJECTED
+      assert codec.loads(b'{"id": 1, "cast": null}', FIELDS) == {"id": 1, "cast": None}
+      assert json.loads(codec.dumps(CREDITS)) == CREDITS
+
+  def test_configure(self):
+    with self.assertRaises(ValueError):
+      codec.configure("yaml")
+    if codec.msgspec is None:
+      with self.assertRaises(ImportError):
+        codec.configure("msgspec")
+
+
+class ProjectionTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  @classmethod
+  def setUpClass(cls):
+    cls.server = StubServer(StubCatalog(n_people=20, n_movies=10)).start()
+    cls.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", cls.server.url)
+    cls.patch.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.patch.stop()
+    cls.server.stop()
+
+  def tearDown(self):
+    cache.set_cache(None)
+
+  def test_fields(self):
+    movie = Movie(1)
+    res = movie.credits(fields=("cast[].id",))
+    assert set(res) == {"cast"}
+    assert [c["id"] for c in res["cast"]] == self.server.catalog.casts[1]
+    # Only details responses are copied onto the object.
+    assert not hasattr(movie, "cast")
+    assert get_movie_cast(1) == set(self.server.catalog.casts[1])
+
+  def test_cached_projections(self):
+    cache.configure(memory_entries=16)
+    self.server.reset_counters()
+    get_movie_cast(2)
+    get_movie_cast(2)
+    assert self.server.counters["requests"] == 1
+    # Full responses serve projections too.
+    Movie(3).credits()
+    assert Movie(3).credits(fields=CAST_FIELDS)["cast"][0].keys() <= {"id", "name", "known_for_department"}
+    assert self.server.counters["requests"] == 2
@@ -0,0 +1,65 @@
+"""
+Offline runs of the tests which query the API, with recorded responses
+(see tmdb_client.cassette). Record them once with a valid API key:
+
+  TMDB_CASSETTE_DIR=test/cassettes TMDB_CASSETTE_MODE=record python -m pytest
+
+then replay them without a key or network:
+
+  TMDB_CASSETTE_DIR=test/cassettes python -m pytest
+
+Requests to the local stub server used by other tests are left alone.
+Without TMDB_API_KEY, a dummy key is used: the stub server and the replays
+ignore it, but the client checks its format before the first request.
+"""
+import os
+from importlib import import_module
+from typing import Dict
+import pytest
+import tmdb_client
+from tmdb_client import cassette
+
+DUMMY_API_KEY = "0123456789abcdef" * 2
+# Modules holding a copy of tmdb_client.API_KEY.
+_API_KEY_MODULES = ("tmdb_client", "tmdb_client.tmdb", "tmdb_client.aio")
+
+_cassettes: Dict[str, cassette.Cassette] = {}
+
+
+@pytest.fixture(autouse=True, scope="session")
+def api_key():
+  if tmdb_client.API_KEY:
+    yield tmdb_client.API_KEY
+    return
+  with pytest.MonkeyPatch.context() as patch:
+    # Also for the commands run in a subprocess.
+    patch.setenv("TMDB_API_KEY", DUMMY_API_KEY)
+    for name in _API_KEY_MODULES:
+      patch.setattr(import_module(name), "API_KEY", DUMMY_API_KEY)
+    yield DUMMY_API_KEY
+
+
+@pytest.fixture(autouse=True)
+def api_cassette(request):
+  directory = os.environ.get("TMDB_CASSETTE_DIR")
+  if not directory:
+    yield None
+    return
+  name = request.module.__name__.rsplit(".", 1)[-1]
+  recorder = _cassettes.get(name)
+  if recorder is None:
+    recorder = _cassettes[name] = cassette.Cassette(
+      os.path.join(directory, f"{name}.json.gz"),
+      mode=os.environ.get("TMDB_CASSETTE_MODE", "replay"),
+      latency=float(os.environ.get("TMDB_CASSETTE_LATENCY", 0)),
+      base_url=tmdb_client.API_BASE_URL)
+  previous = cassette.set_cassette(recorder)
+  try:
+    yield recorder
+  finally:
+    cassette.set_cassette(previous)
+
+
+def pytest_sessionfinish(session, exitstatus):
+  for recorder in _cassettes.values():
+    recorder.close()
@@ -0,0 +1,126 @@
+import unittest
+from collections import deque
+from unittest import mock
+from requests import HTTPError
+from bench.stub_server import StubCatalog, StubServer
+from costar_graph import CostarGraph
+
+
+def degrees(catalog, source, target):
+  """Reference BFS over the whole stub catalog."""
+  seen, queue = {source: 0}, deque([source])
+  while queue:
+    actor_id = queue.popleft()
+    for movie_id in catalog.filmographies[actor_id]:
+      for other in catalog.casts[movie_id]:
+        if other not in seen:
+          seen[other] = seen[actor_id] + 1
+          queue.append(other)
+  return seen.get(target)
+
+
+class CostarGraphTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  def setUp(self):
+    self.catalog = StubCatalog(n_people=0, n_movies=0)
+    a, b, c, d, e = (self.catalog.add_person(f"Actor {n}") for n in "abcde")
+    self.ids = (a, b, c, d, e)
+    self.movies = [
+      self.catalog.add_movie("First", "2000-01-01", [a, b]),
+      self.catalog.add_movie("Second", "2001-01-01", [b, c]),
+      self.catalog.add_movie("Third", "2002-01-01", [c, d]),
+      self.catalog.add_movie("Again", "2003-01-01", [a, b]),
+      self.catalog.add_movie("Alone", "2004-01-01", [e]),
+    ]
+    self.server = StubServer(self.catalog).start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+
+  def test_shortest_path(self):
+    a, b, c, d, e = self.ids
+    graph = CostarGraph()
+    first, second, third = self.movies[:3]
+    assert graph.shortest_path(a, d) in (
+      [a, first, b, second, c, third, d], [a, self.movies[3], b, second, c, third, d])
+    assert graph.shortest_path(d, c) == [d, third, c]
+    assert graph.shortest_path(a, a) == [a]
+    assert graph.shortest_path(a, e) is None
+    assert graph.shortest_path(a, d, max_degrees=2) is None
+    assert graph.titles[first] == "First"
+
+  def test_cached_results(self):
+    a, _, _, d, _ = self.ids
+    graph = CostarGraph()
+    path = graph.shortest_path(a, d)
+    requests = self.server.counters["requests"]
+    assert graph.shortest_path(a, d) == path
+    assert graph.result_hits == 1
+    # The neighbourhood is in memory: other queries over it are not fetched.
+    assert graph.shortest_path(a, d, max_degrees=5) == path
+    assert self.server.counters["requests"] == requests
+
+  def test_top_collaborators(self):
+    a, b, c, _, _ = self.ids
+    graph = CostarGraph()
+    assert graph.top_collaborators(b) == [(a, 2), (c, 1)]
+    assert graph.top_collaborators(b, k=1) == [(a, 2)]
+    stats = graph.stats()
+    assert stats["filmographies"] == 1 and stats["casts"] == 3
+
+  def test_csr_layout(self):
+    a, b, *_ = self.ids
+    graph = CostarGraph()
+    graph.expand_actors([a, b])
+    graph.expand_movies(graph.movies_of(b))
+    assert sorted(graph.movies_of(b)) == sorted(self.movies[:2] + [self.movies[3]])
+    assert graph.cast_of(self.movies[1]) == sorted(self.ids[1:3])
+    assert graph.cast_of(self.movies[2]) == []
+    assert graph.stats()["edges"] == len(graph.actor_movies) + len(graph.movie_actors) == 11
+
+
+  def test_errors(self):
+    a = self.ids[0]
+    graph = CostarGraph()
+    # Unknown to the API: a dead end.
+    graph.expand_actors([999999])
+    assert graph.has_filmography(999999) and graph.movies_of(999999) == []
+    # Not retried, and not kept as an empty filmography.
+    self.server.inject(401)
+    with self.assertRaises(HTTPError):
+      graph.expand_actors([a])
+    assert not graph.has_filmography(a)
+    graph.expand_actors([a])
+    assert graph.movies_of(a)
+
+  def test_is_stale(self):
+    graph = CostarGraph()
+    assert not graph.is_stale()
+    graph.expand_actors(self.ids[:2])
+    assert graph.is_stale(max_edges=3)
+    assert graph.is_stale(ttl=-1)
+
+class RandomGraphTestCase(unittest.TestCase):
+
+  def test_against_reference(self):
+    catalog = StubCatalog(n_people=80, n_movies=40, cast_size=3, seed=3)
+    with StubServer(catalog) as server, \
+        mock.patch("tmdb_client.tmdb.API_BASE_URL", server.url):
+      graph = CostarGraph()
+      for source, target in [(1, 2), (5, 70), (10, 33), (40, 41), (80, 3)]:
+        expected = degrees(catalog, source, target)
+        path = graph.shortest_path(source, target, max_degrees=10)
+        if expected is None or expected > 10:
+          assert path is None
+          continue
+        assert len(path) // 2 == expected, (source, target)
+        for i in range(0, len(path) - 1, 2):
+          assert {path[i], path[i + 2]} <= set(catalog.casts[path[i + 1]])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,124 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from bench.stub_server import StubCatalog, StubServer
+from costar_index import CostarIndex, intersect_sorted, update_index
+from tmdb_client import cache
+from tmdb_client.movie import Movie
+
+
+def expected_common(catalog, actor_ids):
+  movies = [
+    catalog.movies[m] for m, cast in catalog.casts.items() if set(actor_ids) <= set(cast)
+  ]
+  return [m["title"] for m in sorted(movies, key=lambda m: m["release_date"])]
+
+
+class IntersectTestCase(unittest.TestCase):
+  def test_intersect_sorted(self):
+    assert intersect_sorted([[1, 3, 5, 7], [3, 4, 5], [0, 3, 5, 9]]) == [3, 5]
+    assert intersect_sorted([[1, 2], []]) == []
+    assert intersect_sorted([]) == []
+
+
+class CostarIndexTestCase(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.catalog = StubCatalog(n_people=50, n_movies=300, cast_size=8)
+    movies = {m: (v["title"], v["release_date"]) for m, v in self.catalog.movies.items()}
+    self.index = CostarIndex.build(self.tmp.name, self.catalog.casts, movies)
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_movies_for(self):
+    assert list(self.index.movies_for(1)) == sorted(self.catalog.filmographies[1])
+    assert list(self.index.movies_for(10000)) == []
+    assert 1 in self.index and 10000 not in self.index
+
+  def test_get_common_movies(self):
+    for actor_ids in ({1, 2}, {3, 4}, {1, 2, 3}, {5}):
+      assert self.index.get_common_movies(actor_ids) == expected_common(self.catalog, actor_ids)
+
+  def test_reload(self):
+    index = CostarIndex(self.tmp.name)
+    assert index.meta["people"] == 50
+    assert index.get_common_movies({1, 2}) == self.index.get_common_movies({1, 2})
+
+  def test_rebuild_swaps_generations(self):
+    old = CostarIndex(self.tmp.name)
+    # A build which failed before its swap.
+    os.makedirs(os.path.join(self.tmp.name, "gen-2"))
+    with open(os.path.join(self.tmp.name, "gen-2", "person_ids.bin"), "wb") as f:
+      f.write(b"\xff" * 4)
+    assert CostarIndex(self.tmp.name).meta["generation"] == "gen-1"
+
+    index = CostarIndex.build(self.tmp.name, {1: [1, 2]}, {1: ("Only", "2000-01-01")})
+    assert index.meta["generation"] == "gen-2"
+    assert index.get_common_movies({1, 2}) == ["Only"]
+    # Readers of the previous generation are unaffected.
+    assert old.get_common_movies({1, 2}) == self.index.get_common_movies({1, 2})
+    CostarIndex.build(self.tmp.name, {1: [1]}, {})
+    assert sorted(n for n in os.listdir(self.tmp.name) if n.startswith("gen-")) == ["gen-2", "gen-3"]
+
+  def test_read_version_1(self):
+    generation = os.path.join(self.tmp.name, self.index.meta["generation"])
+    for name in os.listdir(generation):
+      os.replace(os.path.join(generation, name), os.path.join(self.tmp.name, name))
+    meta = dict(self.index.meta, version=1)
+    del meta["generation"]
+    with open(os.path.join(self.tmp.name, "meta.json"), "w") as f:
+      json.dump(meta, f)
+    assert CostarIndex(self.tmp.name).get_common_movies({1, 2}) == self.index.get_common_movies({1, 2})
+    CostarIndex.build(self.tmp.name, self.catalog.casts, {})
+    # The version 1 arrays are the previous generation, kept until the next build.
+    assert os.path.exists(os.path.join(self.tmp.name, "person_ids.bin"))
+    CostarIndex.build(self.tmp.name, self.catalog.casts, {})
+    assert not os.path.exists(os.path.join(self.tmp.name, "person_ids.bin"))
+
+  def test_casts_roundtrip(self):
+    casts = self.index.casts()
+    assert {m: sorted(c) for m, c in casts.items()} == self.catalog.casts
+
+
+class UpdateIndexTestCase(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.index_dir = os.path.join(self.tmp.name, "index")
+    self.cache_dir = os.path.join(self.tmp.name, "cache")
+    self.catalog = StubCatalog(n_people=30, n_movies=40, cast_size=6)
+    self.server = StubServer(self.catalog).start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+    cache.set_cache(None)
+    self.tmp.cleanup()
+
+  def test_update_from_cache_then_export(self):
+    # Warm the response cache with a few movies.
+    cache.configure(cache_dir=self.cache_dir)
+    for movie_id in (1, 2, 3):
+      Movie(movie_id).credits()
+      Movie(movie_id).details()
+    index = update_index(self.index_dir, cache_dir=self.cache_dir)
+    assert index.meta["movies"] == 3
+    assert self.index_dir and list(index.movies_for(self.catalog.casts[1][0]))
+
+    export = os.path.join(self.tmp.name, "movie_ids.json.gz")
+    with gzip.open(export, "wt") as f:
+      for movie_id in self.catalog.movies:
+        f.write(json.dumps({"id": movie_id, "original_title": "", "adult": False}) + "\n")
+      f.write(json.dumps({"id": 9999, "original_title": "Deleted"}) + "\n")
+    self.server.reset_counters()
+    index = update_index(self.index_dir, cache_dir=self.cache_dir, export=export)
+    # Only movies missing from the index are fetched, one request each.
+    assert self.server.counters["requests"] == len(self.catalog.movies) - 3 + 1
+    assert index.meta["movies"] == len(self.catalog.movies)
+    for actor_ids in ({1, 2}, {4, 5}):
+      assert index.get_common_movies(actor_ids) == expected_common(self.catalog, actor_ids)
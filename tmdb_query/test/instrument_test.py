@@ -0,0 +1,104 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import requests
+from bench.stub_server import StubCatalog, StubServer
+from tmdb_client import cache, instrument, ratelimit
+from tmdb_client.movie import Movie
+from tmdb_client.person import Person
+import cli
+
+
+class InstrumentTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  def setUp(self):
+    self.catalog = StubCatalog(n_people=20, n_movies=40, cast_size=5)
+    self.catalog.add_movie("Shared", "2000-01-01", [1, 2])
+    self.server = StubServer(self.catalog).start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+    cache.set_cache(None)
+
+  def test_disabled(self):
+    assert not instrument.enabled()
+    assert instrument.start_call("movie/1", "get") is None
+    with instrument.phase("nothing"):
+      pass
+
+  def test_profile_calls(self):
+    with instrument.profile("details") as p:
+      Movie(1).details()
+      with self.assertRaises(requests.HTTPError):
+        Person(999).details()
+    assert instrument.get_profile() is None
+    assert len(p.calls) == 2
+    ok, missing = p.calls
+    assert ok.endpoint == "movie/{id}" and ok.method == "GET"
+    assert ok.status == 200 and ok.bytes > 0 and ok.latency > 0
+    assert ok.cache == instrument.OFF and ok.error is None
+    assert missing.status == 404 and "HTTPError" in missing.error
+    rows = {r["endpoint"]: r for r in p.summary()}
+    assert rows["person/{id}"]["errors"] == 1
+    assert "movie/{id}" in p.format()
+
+  def test_cache_outcomes(self):
+    cache.configure(memory_entries=64)
+    with instrument.profile("cached") as p:
+      Movie(1).credits()
+      Movie(1).credits()
+    assert [c.cache for c in p.calls] == [instrument.MISS, instrument.HIT]
+    assert p.calls[1].bytes == 0
+
+  def test_retries(self):
+    ratelimit.configure(backoff_base=0.01, max_retries=2)
+    self.server.inject(503)
+    try:
+      with instrument.profile("retry") as p:
+        Movie(1).details()
+    finally:
+      ratelimit.configure(backoff_base=0.5, max_retries=ratelimit.MAX_RETRIES)
+    assert p.calls[0].retries == 1
+    assert p.summary()[0]["retries"] == 1
+
+  def test_bind(self):
+    with instrument.profile("threads") as p:
+      with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(instrument.bind(lambda i: Movie(i).details()), range(1, 5)))
+      # Unbound threads are not part of the profile.
+      thread = threading.Thread(target=lambda: Movie(5).details())
+      thread.start()
+      thread.join()
+    assert len(p.calls) == 4
+
+  def test_query_phases(self):
+    with instrument.profile("get_common_movies") as p:
+      movies = cli.get_common_movies({"Actor 1", "Actor 2"}, method="credits", interactive=False)
+    assert "Shared" in movies
+    phases = p.phase_totals()
+    assert {"resolve", "filmographies", "intersect", "verify", "decode"} <= set(phases)
+    endpoints = {c.endpoint for c in p.calls}
+    assert {"search/person", "person/{id}/movie_credits", "movie/{id}/credits"} <= endpoints
+
+  def test_prometheus(self):
+    metrics = instrument.PrometheusMetrics()
+    instrument.add_hook(metrics)
+    try:
+      Movie(1).details()
+      with instrument.phase("intersect"):
+        pass
+    finally:
+      instrument.remove_hook(metrics)
+    text = metrics.exposition()
+    assert 'tmdb_requests_total{endpoint="movie/{id}",cache="off",status="200"} 1' in text
+    assert 'tmdb_request_seconds_count{endpoint="movie/{id}"} 1' in text
+    assert 'tmdb_phase_seconds_total{phase="intersect"}' in text
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,48 @@
+from tmdb_client.models import CastCredit, MediaSummary, MovieSummary, Page, PersonSummary, parse_all
+from tmdb_client.person import Person
+
+
+def test_movie_summary():
+  movie = MovieSummary.from_json({"id": "603", "title": "The Matrix", "release_date": "1999-03-30", "overview": "..."})
+  assert movie == MovieSummary(603, "The Matrix", "1999-03-30")
+  assert movie.to_dict() == {"id": 603, "title": "The Matrix", "release_date": "1999-03-30"}
+  assert not hasattr(movie, "__dict__")
+  undated = MovieSummary.from_json({"id": 1, "title": "Untitled", "release_date": None})
+  assert sorted([undated, movie], key=MovieSummary.sort_key) == [movie, undated]
+
+
+def test_cast_and_person():
+  credit = CastCredit.from_json({"id": 6384, "name": "Keanu Reeves", "known_for_department": "Acting", "character": "Neo"})
+  assert credit.is_actor
+  person = PersonSummary.from_json({
+    "id": 6384, "name": "Keanu Reeves", "known_for_department": "Acting", "popularity": 50.1,
+    "known_for": [{"title": "The Matrix"}, {"name": "Swedish Dicks"}, {}]})
+  assert person.is_actor
+  assert person.known_for == ("The Matrix", "Swedish Dicks")
+  # As stored by the name index.
+  assert PersonSummary.from_json(person.to_dict()) == person
+
+
+def test_page():
+  page = Page.from_json(
+    {"page": 2, "total_pages": 3, "total_results": 41, "results": [{"id": 1, "title": "A"}, {"title": "No id"}]},
+    MovieSummary.from_json)
+  assert (page.page, page.total_pages, page.total_results) == (2, 3, 41)
+  assert page.results == [MovieSummary(1, "A")]
+  assert parse_all([], CastCredit.from_json) == []
+
+
+def test_route_ignores_response_fields():
+  person = Person(6384)
+  person._set_val_as_attrs({"name": "Keanu Reeves", "cast": [{"id": 1}] * 100, "details": "not a method"})
+  assert person._get_route("movie_credits") == ("person/6384/movie_credits", "GET")
+  assert callable(person.details)
+
+
+def test_media_summary():
+  show = MediaSummary.from_json({"media_type": "tv", "id": 1668, "name": "Friends", "first_air_date": "1994-09-22"})
+  movie = MediaSummary.from_json({"media_type": "movie", "id": 1668, "title": "Hackers", "release_date": None})
+  assert show.key == ("tv", 1668) and movie.key == ("movie", 1668)
+  assert sorted([movie, show], key=MediaSummary.sort_key) == [show, movie]
+  assert movie.label() == "Hackers"
+  assert MediaSummary.from_json({"id": 1668, "name": "Friends"}, media_type="tv").key == ("tv", 1668)
@@ -1,5 +1,8 @@
+import asyncio
 import unittest
+from unittest import mock
 import tmdb_client.movie
+from tmdb_client import aio, cache, util
 
 MOVIE_NAME = "The Matrix"
 MOVIE_ID = 603
@@ -15,9 +18,8 @@ class MovieTestCase(unittest.TestCase):
     assert movie.title == MOVIE_NAME
   
   def test_movie_credits(self):
-    movie = tmdb_client.movie.Movie(MOVIE_ID)
-    movie.credits()
-    assert hasattr(movie, "cast")
+    res = tmdb_client.movie.Movie(MOVIE_ID).credits()
+    assert "cast" in res
 
 
 class TVTestCase(unittest.TestCase):
@@ -28,6 +30,69 @@ class TVTestCase(unittest.TestCase):
     assert tv.name == TV_NAME
   
   def test_tv_credits(self):
-    tv = tmdb_client.movie.TV(TV_ID)
-    tv.credits()
-    assert hasattr(tv, "cast")
+    res = tmdb_client.movie.TV(TV_ID).credits()
+    assert "cast" in res
+
+
+class SeasonsTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  def setUp(self):
+    from bench.stub_server import StubCatalog, StubServer
+    self.catalog = StubCatalog(n_people=20, n_movies=0)
+    seasons = [[1, 2], [2, 3], [3, 4], [4, 5], [5, 6], [6, 7]]
+    self.show = self.catalog.add_show("Long Show", "2000-01-01", [], seasons)
+    self.server = StubServer(self.catalog, latency=0.02).start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+    cache.configure(memory_entries=256)
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+    cache.set_cache(None)
+
+  def test_credits(self):
+    tv = tmdb_client.movie.TV(self.show)
+    assert {c["id"] for c in tv.credits()["cast"]} == {6, 7}
+    assert {c["id"] for c in tv.aggregate_credits()["cast"]} == set(range(1, 8))
+    assert {c["id"] for c in tv.season_credits(2)["cast"]} == {2, 3}
+    assert tv.id == self.show
+    assert util.get_show_cast(self.show) == set(range(1, 8))
+
+  def test_find_actors_in_show(self):
+    assert util.find_actors_in_show(self.show, {1, 7, 19}) == {1, 7}
+    # Every season was fetched, once.
+    assert self.server.counters["requests"] == 1 + 6
+    self.server.reset_counters()
+    assert util.find_actors_in_show(self.show, {1, 7}) == {1, 7}
+    # Details and seasons come from the response cache.
+    assert self.server.counters["requests"] == 0
+
+  def test_memoized_without_cache(self):
+    cache.set_cache(None)
+    with mock.patch.object(util, "_season_casts", cache.MemoryCache()):
+      for _ in range(2):
+        assert util.get_season_cast(self.show, 1) == {1, 2}
+    assert self.server.counters["requests"] == 1
+
+  def test_early_stop(self):
+    assert util.find_actors_in_show(self.show, {1, 2}, workers=1) == {1, 2}
+    # The first season was enough: at most the one started meanwhile is
+    # fetched on top of it, not the 4 others.
+    assert self.server.counters["requests"] <= 3
+
+  def test_async_season_credits(self):
+    async def fetch():
+      try:
+        tv = aio.AsyncTV(self.show)
+        # The path is built on call, before the id could change.
+        pending = [tv.season_credits(n) for n in (1, 2)]
+        return tv, await asyncio.gather(*pending)
+      finally:
+        await aio.close_client()
+    tv, (first, second) = asyncio.run(fetch())
+    assert {c["id"] for c in first["cast"]} == {1, 2}
+    assert {c["id"] for c in second["cast"]} == {2, 3}
+    assert tv.id == self.show
+
@@ -0,0 +1,128 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from bench.stub_server import StubCatalog, StubServer
+from tmdb_client import cache
+from tmdb_client.exceptions import NameNotFound
+from tmdb_client.models import PersonSummary
+import cli
+import name_index
+
+
+class NameIndexTestCase(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.index = name_index.NameIndex(os.path.join(self.tmp.name, "names.sqlite"))
+
+  def tearDown(self):
+    self.index.close()
+    self.tmp.cleanup()
+
+  def test_exact_and_fuzzy(self):
+    self.index.add_results("keanu", [
+      PersonSummary(6384, "Keanu Reeves", "Acting", 50),
+    ])
+    self.index.add_results("Zoë Saldaña", [
+      PersonSummary(8691, "Zoë Saldaña", "Acting", 40),
+    ])
+    assert [r.id for r in self.index.lookup("Keanu")] == [6384]
+    assert [r.id for r in self.index.lookup("keanu reeves")] == [6384]
+    assert [r.id for r in self.index.lookup("Zoe Saldana")] == [8691]
+    # Typo.
+    assert [r.id for r in self.index.lookup("Keanu Reves")] == [6384]
+    assert self.index.canonical("keanu reevs") == "Keanu Reeves"
+    assert self.index.lookup("Someone Else") is None
+    stats = self.index.stats()
+    assert stats["hits"] == 4 and stats["misses"] == 1
+
+  def test_export(self):
+    path = os.path.join(self.tmp.name, "person_ids.json.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+      for entry in [
+        {"adult": False, "id": 1, "name": "Known Actor", "popularity": 10},
+        {"adult": False, "id": 2, "name": "Obscure Actor", "popularity": 0.1},
+      ]:
+        f.write(json.dumps(entry) + "\n")
+    index = name_index.update_names(self.index.path, export=path)
+    try:
+      assert index.stats()["people"] == 1
+      # The department is unknown until searched.
+      assert index.lookup("Known Actor") is None
+      assert index.canonical("Known Actr") == "Known Actor"
+      index.add_results("Known Actor", [
+        PersonSummary(1, "Known Actor", "Acting", 12)])
+      assert index.lookup("known actor")[0].popularity == 12
+    finally:
+      index.close()
+
+  def test_choices_and_misses(self):
+    self.index.remember("Actor 1", 21)
+    assert self.index.choice("actor  1") == 21
+    assert self.index.choice("Actor 2") is None
+    self.index.add_miss("Nobody")
+    assert self.index.is_miss("nobody")
+    self.index.miss_ttl = -1
+    self.index.add_miss("Gone")
+    assert not self.index.is_miss("Gone")
+
+
+class NameResolutionTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.catalog = StubCatalog(n_people=20, n_movies=10)
+    self.catalog.people[1]["popularity"] = 50
+    self.homonym = self.catalog.add_person("Actor 1", popularity=1)
+    self.server = StubServer(self.catalog).start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+    self.index = name_index.configure(os.path.join(self.tmp.name, "names.sqlite"))
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+    name_index.set_index(None)
+    self.index.close()
+    self.tmp.cleanup()
+
+  def test_local_resolution(self):
+    assert cli.search_actor_by_name("Actor 2", interactive=False).id == 2
+    assert self.server.counters["requests"] == 1
+    assert cli.search_actor_by_name("actor 2", interactive=False).id == 2
+    assert self.server.counters["requests"] == 1
+
+  def test_homonym_memory(self):
+    with mock.patch("cli.input", return_value="2"), mock.patch("builtins.print"):
+      picked = cli.search_actor_by_name("Actor 1")
+    assert picked.id == self.homonym
+    # Remembered, without asking again nor searching.
+    assert cli.search_actor_by_name("Actor 1", interactive=False).id == self.homonym
+    assert self.server.counters["requests"] == 1
+
+  def test_negative_cache(self):
+    for _ in range(2):
+      with self.assertRaises(NameNotFound):
+        cli.search_actor_by_name("Nobody", interactive=False)
+    assert self.server.counters["requests"] == 1
+
+  def test_cached_searches(self):
+    name_index.set_index(None)
+    cache_dir = os.path.join(self.tmp.name, "cache")
+    cache.configure(cache_dir=cache_dir)
+    try:
+      cli.search_actor_by_name("Actor 3", interactive=False)
+    finally:
+      cache.set_cache(None)
+    index = name_index.update_names(os.path.join(self.tmp.name, "other.sqlite"), cache_dir)
+    try:
+      assert [r.id for r in index.lookup("Actor 3")] == [3]
+    finally:
+      index.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
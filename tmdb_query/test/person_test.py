@@ -1,5 +1,10 @@
+import time
 import unittest
+from unittest import mock
 import tmdb_client.person
+from tmdb_client import cache
+from tmdb_client.models import PersonSummary
+from tmdb_client.util import get_filmography, is_actor
 
 PERSON_NAME = "Keanu Reeves"
 PERSON_ID = 6384
@@ -12,11 +17,77 @@ class PersonTestCase(unittest.TestCase):
     assert person.name == PERSON_NAME
   
   def test_person_combined_credits(self):
-    person = tmdb_client.person.Person(PERSON_ID)
-    person.combined_credits()
-    assert hasattr(person, "cast")
+    res = tmdb_client.person.Person(PERSON_ID).combined_credits()
+    assert "cast" in res
 
   def test_movie_credits(self):
-    person = tmdb_client.person.Person(PERSON_ID)
+    res = tmdb_client.person.Person(PERSON_ID).combined_credits()
+    assert "cast" in res
+
+  def test_tv_credits(self):
+    res = tmdb_client.person.Person(PERSON_ID).tv_credits()
+    assert "cast" in res
+
+class CoalescingTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  def setUp(self):
+    from bench.stub_server import StubServer
+    self.server = StubServer().start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+
+  def test_coalesce(self):
+    person = tmdb_client.person.Person(1).coalesce("movie_credits", "combined_credits")
+    creds = person.movie_credits()
     person.combined_credits()
-    assert hasattr(person, "cast")
\ No newline at end of file
+    assert self.server.counters["requests"] == 1
+    assert person.name == "Actor 1"
+    assert {m["id"] for m in creds["cast"]} == \
+      set(self.server.catalog.filmographies[1])
+    # Parts are handed out once, the next call is a regular request.
+    person.movie_credits()
+    assert self.server.counters["requests"] == 2
+
+  def test_appended_parts_not_shared_without_cache(self):
+    tmdb_client.person.Person(2).details(append_to_response="movie_credits")
+    tmdb_client.person.Person(2).movie_credits()
+    assert self.server.counters["requests"] == 2
+
+  def test_appended_parts_cached_with_details_expiry(self):
+    store = cache.configure(memory_entries=64, ttls=[("person/*/movie_credits", 3600), ("person/*", 60)])
+    try:
+      tmdb_client.person.Person(2).details(append_to_response="movie_credits")
+      tmdb_client.person.Person(2).movie_credits()
+      assert self.server.counters["requests"] == 1
+      _, expires = store.get_with_expiry("person/2/movie_credits")
+      assert expires <= time.time() + 60
+    finally:
+      cache.set_cache(None)
+
+  def test_is_actor_coalesces_credits(self):
+    cache.configure(memory_entries=64)
+    try:
+      assert is_actor(PersonSummary(3), coalesce=("movie_credits",))
+      assert set(get_filmography(3)) == set(self.server.catalog.filmographies[3])
+      assert self.server.counters["requests"] == 1
+    finally:
+      cache.set_cache(None)
+
+  def test_invalid_coalesce(self):
+    with self.assertRaises(Exception):
+      tmdb_client.person.Person(1).coalesce("credits")
+
+  def test_batch_details(self):
+    people = tmdb_client.person.Person.batch_details(
+      [1, 2, 3, 2], append_to_response=("movie_credits",))
+    assert list(people) == [1, 2, 3]
+    assert self.server.counters["requests"] == 3
+    for person_id, person in people.items():
+      assert person.name == f"Actor {person_id}"
+      person.movie_credits()
+    assert self.server.counters["requests"] == 3
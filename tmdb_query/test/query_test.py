@@ -1,5 +1,7 @@
+import time
 import unittest
 from unittest import mock
+import cli
 from cli import *
 from tmdb_client.exceptions import NotAnActor, NameNotFound
 
@@ -15,7 +17,7 @@ class TestActorSearch(unittest.TestCase):
 
   def test_search_actor_by_name(self):
     for name in self.valid_actors:
-      assert search_actor_by_name(name).get("id") is not None
+      assert search_actor_by_name(name).id is not None
 
     for name in self.invalid_actors:
       with self.assertRaises(NotAnActor):
@@ -31,7 +33,7 @@ class TestActorSearch(unittest.TestCase):
     mock_input.return_value = "1"
 
     for name in self.homonymous_actors:
-      assert search_actor_by_name(name).get("id") is not None
+      assert search_actor_by_name(name).id is not None
 
 
 class TestQuery(unittest.TestCase):
@@ -76,3 +78,128 @@ class TestQuery(unittest.TestCase):
     for expected_title in self.expected:
       assert expected_title in movie_titles
     print(f"Found movies: {movie_titles}. Expected: {self.expected}")
+
+
+class TestCommonMoviesOffline(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  @classmethod
+  def setUpClass(cls):
+    from bench.stub_server import StubCatalog, StubServer
+    cls.catalog = StubCatalog(n_people=30, n_movies=200, cast_size=6)
+    cls.shared = [
+      cls.catalog.add_movie("Shared B", "2001-01-01", [1, 2, 3]),
+      cls.catalog.add_movie("Shared A", "1999-01-01", [1, 2, 3, 4]),
+    ]
+    cls.server = StubServer(cls.catalog).start()
+    cls.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", cls.server.url)
+    cls.patch.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.patch.stop()
+    cls.server.stop()
+
+  def expected(self, actor_ids):
+    movies = [
+      self.catalog.movies[m] for m, cast in self.catalog.casts.items()
+      if set(actor_ids) <= set(cast)
+    ]
+    return [m["title"] for m in sorted(movies, key=lambda m: m["release_date"])]
+
+  def test_get_common_movies_for_ids(self):
+    titles = get_common_movies_for_ids({1, 2, 3})
+    assert titles == self.expected({1, 2, 3})
+    assert titles.index("Shared A") < titles.index("Shared B")
+
+  def test_credits_matches_discover(self):
+    for actor_ids in ({1, 2}, {2, 4}, {1, 2, 3, 4}):
+      assert get_common_movies_for_ids(actor_ids) == discover_movies_for_ids(actor_ids)
+
+  def test_no_cast_fetch_without_candidates(self):
+    a = self.catalog.add_person("Lonely A")
+    b = self.catalog.add_person("Lonely B")
+    self.catalog.add_movie("Alone A", "2000-01-01", [a])
+    self.catalog.add_movie("Alone B", "2000-01-01", [b])
+    self.server.reset_counters()
+    assert get_common_movies_for_ids({a, b}) == []
+    # Only the two movie_credits requests were needed.
+    assert self.server.counters["requests"] == 2
+
+  def test_combined_credits(self):
+    show = self.catalog.add_show("Shared Show", "2000-06-01", [1, 2, 5])
+    self.catalog.add_show("Other Show", "2002-01-01", [1])
+    # A show and a movie with the same id are different titles.
+    self.catalog.add_show("Same Id", "2003-01-01", [2])
+    self.server.reset_counters()
+    credits = get_common_credits_for_ids({1, 2})
+    assert self.server.counters["requests"] == 2
+    assert [(m.media_type, m.id) for m in credits if m.media_type == "tv"] == [("tv", show)]
+    assert [m.title for m in credits if m.media_type == "movie"] == self.expected({1, 2})
+    dates = [m.date for m in credits]
+    assert dates == sorted(dates)
+    assert "Shared Show (TV, 2000-06-01)" in get_common_movies_for_actor_ids({1, 2}, "combined")
+
+  def test_method_selection(self):
+    with mock.patch("builtins.print"):
+      assert get_common_movies({"Actor 1", "Actor 2"}, method="credits") == \
+        self.expected({1, 2})
+
+
+class TestPrefetch(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  def setUp(self):
+    from bench.stub_server import StubCatalog, StubServer
+    from tmdb_client import cache
+    self.catalog = StubCatalog(n_people=20, n_movies=60, cast_size=5)
+    self.catalog.add_movie("Shared", "2000-01-01", [1, 2])
+    self.catalog.people[1]["popularity"] = 50
+    self.homonyms = [self.catalog.add_person("Actor 1", popularity=p) for p in (1, 2, 3)]
+    self.server = StubServer(self.catalog, latency=0.05).start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+    self.cache = cache.configure(memory_entries=256)
+
+  def tearDown(self):
+    from tmdb_client import cache
+    self.patch.stop()
+    self.server.stop()
+    cache.set_cache(None)
+
+  def wait_for_requests(self, count):
+    deadline = time.time() + 5
+    while self.server.counters["requests"] < count and time.time() < deadline:
+      time.sleep(0.01)
+
+  def test_discover_pages(self):
+    prefetcher = Prefetcher("discover")
+
+    def pick(prompt):
+      # 2 searches, then the first Discover page of the 4 candidates with Actor 2.
+      self.wait_for_requests(6)
+      return "1"
+
+    with mock.patch("cli.input", side_effect=pick), mock.patch("builtins.print"):
+      actor_ids = get_actor_ids(["Actor 2", "Actor 1"], prefetcher=prefetcher)
+    assert actor_ids == {1, 2}
+    assert prefetcher.sent == 4
+    self.server.reset_counters()
+    assert "Shared" in discover_movies_for_ids(actor_ids)
+    assert self.server.counters["requests"] == 0
+
+  def test_searches_and_cancellation(self):
+    prefetcher = Prefetcher("credits", budget=3)
+    with mock.patch("cli.input", return_value="1"), mock.patch("cli.MAX_WORKERS", 1), \
+        mock.patch("builtins.print"):
+      actor_ids = get_actor_ids(["Actor 1", "Actor 2"], prefetcher=prefetcher)
+    assert actor_ids == {1, 2}
+    # The search for Actor 2, then the filmographies of the 2 most popular
+    # homonyms, of which the one not picked did not start.
+    assert prefetcher.sent == 3 and prefetcher.budget == 0
+    assert prefetcher.cancelled == 1
+
+  def test_disabled(self):
+    assert cli._prefetcher("discover", None, False, 8) is None
+    assert cli._prefetcher("discover", None, True, 0) is None
+
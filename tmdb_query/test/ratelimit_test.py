@@ -0,0 +1,95 @@
+import time
+import unittest
+from unittest import mock
+import requests
+from bench.stub_server import StubServer
+from tmdb_client import ratelimit
+from tmdb_client.movie import Movie
+
+
+class TokenBucketTestCase(unittest.TestCase):
+  def test_burst_then_rate(self):
+    bucket = ratelimit.TokenBucket(rate=10, burst=3)
+    waits = [bucket.reserve() for _ in range(5)]
+    assert waits[:3] == [0, 0, 0]
+    assert 0.05 < waits[3] <= 0.1
+    assert 0.15 < waits[4] <= 0.2
+
+  def test_disabled(self):
+    bucket = ratelimit.TokenBucket(rate=0)
+    assert all(bucket.reserve() == 0 for _ in range(100))
+
+  def test_pause(self):
+    bucket = ratelimit.TokenBucket(rate=0)
+    bucket.pause(0.5)
+    assert 0.4 < bucket.reserve() <= 0.5
+
+
+class RetryTestCase(unittest.TestCase):
+  def test_endpoint_template(self):
+    assert ratelimit.endpoint_template("movie/603/credits") == "movie/{id}/credits"
+    assert ratelimit.endpoint_template("person/6384") == "person/{id}"
+    assert ratelimit.endpoint_template("search/person") == "search/person"
+
+  def test_parse_retry_after(self):
+    assert ratelimit.parse_retry_after("3") == 3.0
+    assert ratelimit.parse_retry_after(None) is None
+    assert ratelimit.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert ratelimit.parse_retry_after("soon") is None
+
+  def test_retry_delay(self):
+    scheduler = ratelimit.RetryScheduler(ratelimit.TokenBucket(0), max_retries=2)
+    assert scheduler.retry_delay("movie/1", 0, status=404) is None
+    assert scheduler.retry_delay("movie/1", 0, status=429, headers={"Retry-After": "2"}) == 2
+    assert 0 <= scheduler.retry_delay("movie/1", 1, status=503) <= 1
+    assert scheduler.retry_delay("movie/1", 2, status=503) is None
+    assert scheduler.retry_counts["movie/{id}"] == 2
+
+  def test_max_retry_after(self):
+    limiter = ratelimit.TokenBucket(0)
+    scheduler = ratelimit.RetryScheduler(limiter, max_retries=2, max_retry_after=5)
+    assert scheduler.retry_delay("movie/1", 0, status=429, headers={"Retry-After": "3600"}) == 5
+    assert limiter._paused_until - time.monotonic() <= 5
+
+
+class RetryCallTestCase(unittest.TestCase):
+  def setUp(self):
+    self.server = StubServer().start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+    ratelimit.configure(backoff_base=0.01, max_retries=3)
+    ratelimit.get_scheduler().retry_counts.clear()
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+    ratelimit.configure(
+      rate=ratelimit.RATE_LIMIT, burst=ratelimit.RATE_BURST,
+      backoff_base=0.5, max_retries=ratelimit.MAX_RETRIES)
+
+  def test_retry_after(self):
+    self.server.inject(429, headers={"Retry-After": "0.2"})
+    start = time.monotonic()
+    res = Movie(1).credits()
+    assert time.monotonic() - start >= 0.2
+    assert "cast" in res
+    assert ratelimit.retry_counts() == {"movie/{id}/credits": 1}
+
+  def test_server_errors(self):
+    self.server.inject(503, count=2)
+    Movie(1).details()
+    assert self.server.counters["requests"] == 3
+    assert ratelimit.retry_counts() == {"movie/{id}": 2}
+
+  def test_give_up(self):
+    self.server.inject(500, count=10)
+    with self.assertRaises(requests.HTTPError):
+      Movie(1).details()
+    assert self.server.counters["requests"] == 4
+
+  def test_rate_limit(self):
+    ratelimit.configure(rate=20, burst=1)
+    start = time.monotonic()
+    for _ in range(5):
+      Movie(1).details()
+    assert time.monotonic() - start >= 0.2
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from bench.stub_server import StubCatalog, StubServer
+from tmdb_client import cache
+from tmdb_client.changes import Changes
+from tmdb_client.movie import Movie
+from tmdb_client.person import Person
+from tmdb_client.refresh import ChangeRefresher, MAX_WINDOW
+
+
+class ChangeRefresherTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.catalog = StubCatalog(n_people=20, n_movies=40, cast_size=5)
+    self.server = StubServer(self.catalog).start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+    self.store = cache.configure(memory_entries=256)
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+    cache.set_cache(None)
+    self.tmp.cleanup()
+
+  def test_iter_ids(self):
+    self.catalog.changes = {"movie": list(range(1, 50)), "person": [3]}
+    assert list(Changes().iter_ids("movie")) == list(range(1, 50))
+    assert list(Changes().iter_ids("person")) == [3]
+    assert list(Changes().iter_ids("tv")) == []
+
+  def test_sync(self):
+    for i in (1, 2):
+      Movie(i).details()
+      Movie(i).credits()
+    Person(1).movie_credits()
+    self.catalog.changes = {"movie": [1]}
+    state = os.path.join(self.tmp.name, "changes.json")
+    refresher = ChangeRefresher(state_path=state)
+    assert refresher.sync() == {"movie": 2, "person": 0}
+    assert self.store.keys("movie/1") == []
+    assert sorted(self.store.keys("movie/2")) == ["movie/2", "movie/2/credits"]
+    assert refresher.stats()["extended"] == 2
+
+    requests = self.server.counters["requests"]
+    Movie(2).credits()
+    Movie(1).credits()
+    assert self.server.counters["requests"] == requests + 1
+
+    with open(state, encoding="utf-8") as f:
+      assert set(json.load(f)) == {"movie", "person"}
+    assert ChangeRefresher(state_path=state).last_sync == refresher.last_sync
+
+  def test_person_credits_not_extended(self):
+    Person(1).details()
+    Person(1).movie_credits()
+    Person(1).combined_credits()
+    Person(2).movie_credits()
+    expiries = {k: self.store.get_with_expiry(k)[1] for k in self.store.keys("person/")}
+    # A new movie of person 1 shows up in the movie feed only.
+    self.catalog.changes = {"movie": [self.catalog.filmographies[1][0]], "person": [2]}
+    ChangeRefresher().sync(now=time.time() + 60)
+    assert self.store.keys("person/2") == []
+    after = {k: self.store.get_with_expiry(k)[1] for k in self.store.keys("person/")}
+    assert after["person/1"] > expiries["person/1"]
+    assert after["person/1/movie_credits"] == expiries["person/1/movie_credits"]
+    assert after["person/1/combined_credits"] == expiries["person/1/combined_credits"]
+
+  def test_windows(self):
+    refresher = ChangeRefresher(kinds=("tv",))
+    now = time.time()
+    with mock.patch.object(Changes, "iter_ids", return_value=iter(())) as iter_ids:
+      refresher.changed_ids("tv", now - 2 * MAX_WINDOW - 60, now)
+    assert iter_ids.call_count == 3
+
+  def test_invalid_kind(self):
+    with self.assertRaises(ValueError):
+      ChangeRefresher(kinds=("company",))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 from typing import List, Any
 import tmdb_client.search
 from test.movie_test import TV_NAME, MOVIE_ID, MOVIE_NAME
@@ -11,7 +12,7 @@ def iterate_results(results: List, look_for: Any, key: str) -> bool:
   """
   found = False
   for movie_entry in results:
-    if movie_entry.get(key) == look_for:
+    if getattr(movie_entry, key) == look_for:
       found = True
       break
   return found
@@ -19,27 +20,81 @@ def iterate_results(results: List, look_for: Any, key: str) -> bool:
 
 class SearchTestCase(unittest.TestCase):
   def test_search_movie(self):
-    search = tmdb_client.search.Search()
-    search.movie(query=MOVIE_NAME)
-    assert hasattr(search, "results")
-    results = getattr(search, "results")
-    assert iterate_results(results, MOVIE_ID, "id")
+    page = tmdb_client.search.Search().movie(query=MOVIE_NAME)
+    assert iterate_results(page.results, MOVIE_ID, "id")
 
   def test_search_person(self):
-    search = tmdb_client.search.Search()
-    search.person(query=PERSON_NAME)
-    assert hasattr(search, "results")
-    results = getattr(search, "results")
-    assert iterate_results(results, PERSON_ID, "id")
+    page = tmdb_client.search.Search().person(query=PERSON_NAME)
+    assert iterate_results(page.results, PERSON_ID, "id")
 
 
 class DiscoverTestCase(unittest.TestCase):
   def test_discover_movie(self):
-    discover = tmdb_client.search.Discover()
-    discover.movie(query=MOVIE_NAME)
-    assert hasattr(discover, "results")
+    page = tmdb_client.search.Discover().movie(query=MOVIE_NAME)
+    assert page.results
 
   def test_discover_tv(self):
+    page = tmdb_client.search.Discover().tv(query=TV_NAME)
+    assert all(show.media_type == "tv" for show in page.results)
+
+
+class PaginationTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  @classmethod
+  def setUpClass(cls):
+    from bench.stub_server import StubCatalog, StubServer
+    catalog = StubCatalog(n_people=20, n_movies=0)
+    for i in range(55):
+      catalog.add_movie(f"Shared {i}", f"{2000 + i % 20}-01-{1 + i // 20:02d}", [1, 2])
+    cls.server = StubServer(catalog).start()
+    cls.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", cls.server.url)
+    cls.patch.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.patch.stop()
+    cls.server.stop()
+
+  def test_discover_all_pages(self):
     discover = tmdb_client.search.Discover()
-    discover.tv(query=TV_NAME)
-    assert hasattr(discover, "results")
+    page = discover.movie(with_cast="1,2", sort_by="release_date.asc", all_pages=True)
+    assert self.server.counters["requests"] >= 3
+    assert page.total_results == 55
+    assert len(page.results) == 55
+    dates = [m.release_date for m in page.results]
+    assert dates == sorted(dates)
+    assert not hasattr(discover, "results")
+
+  def test_discover_movies_for_ids(self):
+    from cli import discover_movies_for_ids
+    titles = discover_movies_for_ids({1, 2})
+    assert len(titles) == 55
+    assert len(set(titles)) == 55
+
+  def test_iter_movie(self):
+    discover = tmdb_client.search.Discover()
+    for prefetch in (0, 1, 3):
+      movies = list(discover.iter_movie(prefetch=prefetch, with_cast="1,2", sort_by="release_date.asc"))
+      assert len(movies) == 55
+      dates = [m.release_date for m in movies]
+      assert dates == sorted(dates)
+    assert not hasattr(discover, "results")
+
+  def test_iter_movie_stops_early(self):
+    self.server.reset_counters()
+    movies = tmdb_client.search.Discover().iter_movie(prefetch=0, with_cast="1,2")
+    assert self.server.counters["requests"] == 0
+    first = [next(movies) for _ in range(5)]
+    movies.close()
+    assert len(first) == 5
+    assert self.server.counters["requests"] == 1
+
+  def test_iter_common_movies(self):
+    from itertools import islice
+    from cli import iter_common_movies
+    self.server.reset_counters()
+    titles = list(islice(iter_common_movies({"Actor 1", "Actor 2"}, interactive=False), 5))
+    assert len(titles) == 5
+    # 2 searches, the first Discover page, and at most 1 page prefetched.
+    assert self.server.counters["requests"] <= 4
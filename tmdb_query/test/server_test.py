@@ -0,0 +1,126 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import requests
+from bench.stub_server import StubCatalog, StubServer
+from tmdb_client import cache, instrument, session
+import server
+
+
+class ServerTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  @classmethod
+  def setUpClass(cls):
+    cls.catalog = StubCatalog(n_people=30, n_movies=100, cast_size=6)
+    cls.shared = cls.catalog.add_movie("Shared", "2000-01-01", [1, 2])
+    # A less popular homonym of Actor 1.
+    cls.catalog.people[1]["popularity"] = 50
+    cls.homonym = cls.catalog.add_person("Actor 1", popularity=1)
+    cls.stub = StubServer(cls.catalog).start()
+    cls.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", cls.stub.url)
+    cls.patch.start()
+    server.setup()
+    cls.metrics = instrument.PrometheusMetrics()
+    instrument.add_hook(cls.metrics)
+    cls.server = server.QueryServer(server.QueryService(metrics=cls.metrics), port=0)
+    threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.shutdown()
+    cls.server.server_close()
+    cls.patch.stop()
+    cls.stub.stop()
+    instrument.remove_hook(cls.metrics)
+    cache.set_cache(None)
+    session.configure(scope="process")
+
+  def get(self, path, **params):
+    return requests.get(f"{self.server.url}{path}", params=params)
+
+  def test_common(self):
+    response = self.get("/common", name=["Actor 1", "Actor 2"])
+    assert response.status_code == 200
+    body = response.json()
+    assert body["actor_ids"] == [1, 2]
+    assert "Shared" in body["movies"]
+    by_id = self.get("/common", id=["1", "2"], method="credits").json()
+    assert by_id["movies"] == body["movies"]
+
+  def test_graph(self):
+    body = self.get("/path", name="Actor 2", id="1").json()
+    assert body["actor_ids"] == [1, 2]
+    assert body["degrees"] == 1 and len(body["path"]) == 3
+    body = self.get("/collaborators", id="1", k="3").json()
+    assert body["actor_id"] == 1 and len(body["collaborators"]) == 3
+    assert self.get("/path", id="1").status_code == 400
+    assert self.get("/path", id=["1", "2"], max_degrees="x").status_code == 400
+    assert self.get("/stats").json()["graph"]["casts"] > 0
+
+  def test_stale_graph(self):
+    service = server.QueryService(graph_max_edges=0)
+    first = service.get_graph()
+    first.expand_actors([1])
+    assert service.get_graph() is not first
+    assert service.stats()["graph"]["resets"] == 1
+
+  def test_warm_queries(self):
+    self.get("/common", name=["Actor 1", "Actor 2"])
+    self.stub.reset_counters()
+    self.get("/common", name=["Actor 1", "Actor 2"])
+    assert self.stub.counters["requests"] == 0
+
+  def test_actor_homonyms(self):
+    body = self.get("/actor", name="Actor 1").json()
+    assert body["id"] == 1
+
+  def test_errors(self):
+    assert self.get("/actor", name="Nobody").status_code == 404
+    assert self.get("/actor").status_code == 400
+    assert self.get("/common", name="Actor 1").status_code == 400
+    assert self.get("/common", id="x").status_code == 400
+    assert self.get("/common", id=["1", "2"], method="magic").status_code == 400
+
+  def test_internal_error(self):
+    with mock.patch.object(server.QueryService, "resolve", side_effect=KeyError("cast")), \
+        self.assertLogs("server", "ERROR"):
+      response = self.get("/actor", name="Actor 1")
+    assert response.status_code == 500
+    assert "KeyError" in response.json()["error"]
+    assert self.get("/health").status_code == 200
+    assert self.get("/nowhere").status_code == 404
+
+  def test_stats(self):
+    self.get("/actor", name="Actor 2")
+    stats = self.get("/stats").json()
+    assert stats["queries"] >= 1
+    assert stats["cache"]["misses"] >= 1
+
+  def test_metrics(self):
+    self.get("/actor", name="Actor 2")
+    response = self.get("/metrics")
+    assert response.headers["Content-Type"].startswith("text/plain")
+    assert 'tmdb_requests_total{endpoint="search/person"' in response.text
+
+  def test_unix_socket(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      path = os.path.join(tmp, "query.sock")
+      unix_server = server.UnixQueryServer(server.QueryService(), path)
+      threading.Thread(target=unix_server.serve_forever, daemon=True).start()
+      try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+          client.connect(path)
+          client.sendall(b"GET /health HTTP/1.1\r\nHost: local\r\nConnection: close\r\n\r\n")
+          data = b""
+          while chunk := client.recv(4096):
+            data += chunk
+        assert data.startswith(b"HTTP/1.1 200")
+        assert json.loads(data.split(b"\r\n\r\n", 1)[1]) == {"status": "ok"}
+      finally:
+        unix_server.shutdown()
+        unix_server.server_close()
@@ -0,0 +1,123 @@
+import gc
+import importlib.util
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import requests
+from bench.stub_server import StubCatalog, StubServer
+from tmdb_client import session
+from tmdb_client.movie import Movie
+from tmdb_client.person import Person
+
+
+class SessionTestCase(unittest.TestCase):
+  def tearDown(self):
+    session.configure(scope="process", pooling=True, transport="requests")
+
+  def test_thread_scope(self):
+    session.configure(scope="thread")
+    main_session = session.get_session()
+    assert session.get_session() is main_session
+    other = []
+    thread = threading.Thread(target=lambda: other.append(session.get_session()))
+    thread.start()
+    thread.join()
+    assert other[0] is not main_session
+
+  def test_process_scope(self):
+    session.configure(scope="process")
+    main_session = session.get_session()
+    other = []
+    thread = threading.Thread(target=lambda: other.append(session.get_session()))
+    thread.start()
+    thread.join()
+    assert other[0] is main_session
+
+  def test_thread_sessions_closed(self):
+    session.configure(scope="thread")
+
+    def run_thread():
+      thread = threading.Thread(target=session.get_session)
+      thread.start()
+      thread.join()
+
+    with mock.patch.object(requests.Session, "close", autospec=True) as close:
+      run_thread()
+      gc.collect()
+      close.assert_called_once()
+    run_thread()
+    gc.collect()
+    # Only the session of the main thread, if any, is left.
+    assert len(session._sessions) <= 1
+
+  def test_configure_renews_sessions(self):
+    old = session.get_session()
+    session.configure(pool_maxsize=2)
+    assert session.get_session() is not old
+
+  def test_invalid_scope(self):
+    with self.assertRaises(ValueError):
+      session.configure(scope="galaxy")
+    with self.assertRaises(ValueError):
+      session.configure(transport="pigeon")
+
+  def test_connection_reuse(self):
+    with StubServer() as server, \
+        mock.patch("tmdb_client.tmdb.API_BASE_URL", server.url):
+      Movie(1).credits()
+      Person(1).movie_credits()
+      Movie(2).details()
+      assert server.counters["requests"] == 3
+      assert server.counters["connections"] == 1
+
+      session.configure(pooling=False)
+      server.reset_counters()
+      Movie(1).credits()
+      Movie(2).credits()
+      assert server.counters["connections"] == 2
+
+  def test_custom_transport(self):
+    sent = []
+
+    class Recorder(session.Transport):
+      def request(self, method, url, **kwargs):
+        sent.append((method, url))
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"id": 1, "cast": [], "crew": []}'
+        return response
+
+    with mock.patch.dict(session.TRANSPORTS, recorder=Recorder):
+      session.configure(transport="recorder")
+      assert Movie(1).credits()["id"] == 1
+    assert sent[0][0] == "GET" and sent[0][1].endswith("/3/movie/1/credits")
+
+  def test_http2_transport(self):
+    session.configure(transport="http2")
+    if importlib.util.find_spec("httpx") is None or importlib.util.find_spec("h2") is None:
+      with self.assertRaises(ImportError):
+        session.get_transport()
+      return
+    with StubServer(StubCatalog(n_movies=40), http2=True) as server, \
+        mock.patch("tmdb_client.tmdb.API_BASE_URL", server.url):
+      with ThreadPoolExecutor(max_workers=20) as pool:
+        casts = list(pool.map(lambda m: Movie(m).credits()["cast"], range(1, 41)))
+      assert all(casts)
+      assert server.counters["requests"] == 40
+      # Every request in flight shares one connection.
+      assert server.counters["connections"] == 1
+
+      server.inject(404)
+      with self.assertRaises(requests.HTTPError):
+        Movie(1).details()
+
+  def test_reuse_across_worker_pools(self):
+    with StubServer() as server, \
+        mock.patch("tmdb_client.tmdb.API_BASE_URL", server.url):
+      Movie.batch_details(range(1, 17))
+      opened = server.counters["connections"]
+      # New worker threads, same connections.
+      Movie.batch_details(range(17, 33))
+      assert server.counters["requests"] == 32
+      assert server.counters["connections"] == opened
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from bench.stub_server import StubServer
+from tmdb_client import aio, singleflight
+from tmdb_client.movie import Movie
+
+
+class SingleFlightTestCase(unittest.TestCase):
+  def test_concurrent_calls_share_result(self):
+    group = singleflight.SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow():
+      calls.append(1)
+      release.wait(1)
+      return {"value": 42}
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+      futures = [pool.submit(group.do, "key", slow) for _ in range(5)]
+      time.sleep(0.1)
+      release.set()
+      results = [f.result() for f in futures]
+    assert len(calls) == 1
+    assert all(r == {"value": 42} for r in results)
+    assert group.stats() == {"executed": 1, "coalesced": 4}
+
+  def test_errors_are_shared(self):
+    group = singleflight.SingleFlight()
+
+    def fail():
+      raise ValueError("boom")
+
+    with self.assertRaises(ValueError):
+      group.do("key", fail)
+    # Nothing stays in flight after a failure.
+    assert group.do("key", lambda: 1) == 1
+
+  def test_async(self):
+    group = singleflight.AsyncSingleFlight()
+    calls = []
+
+    async def slow():
+      calls.append(1)
+      await asyncio.sleep(0.05)
+      return 42
+
+    async def main():
+      return await asyncio.gather(*(group.do("key", slow) for _ in range(5)))
+
+    assert asyncio.run(main()) == [42] * 5
+    assert len(calls) == 1
+    assert group.stats() == {"executed": 1, "coalesced": 4}
+
+
+class DeduplicatedCallTestCase(unittest.TestCase):
+  def setUp(self):
+    self.server = StubServer(latency=0.1).start()
+    self.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", self.server.url)
+    self.patch.start()
+
+  def tearDown(self):
+    self.patch.stop()
+    self.server.stop()
+
+  def test_identical_requests(self):
+    before = singleflight.stats()["coalesced"]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+      results = list(pool.map(lambda _: Movie(1).credits(), range(4)))
+    assert self.server.counters["requests"] == 1
+    assert all(r == results[0] for r in results)
+    assert singleflight.stats()["coalesced"] - before == 3
+
+  def test_async_identical_requests(self):
+    async def main():
+      try:
+        return await asyncio.gather(*(aio.AsyncMovie(1).credits() for _ in range(4)))
+      finally:
+        await aio.close_client()
+    results = asyncio.run(main())
+    assert self.server.counters["requests"] == 1
+    assert len(results) == 4
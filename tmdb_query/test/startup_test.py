@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+import tmdb_client
+from tmdb_client.exceptions import InvalidAPIKey
+from bench.import_bench import LAZY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(*args):
+  env = dict(os.environ)
+  env.pop("TMDB_API_KEY", None)
+  return subprocess.run(
+    [sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+class StartupTestCase(unittest.TestCase):
+  def test_lazy_imports(self):
+    result = run("-c", "import sys, cli; print(' '.join(sys.modules))")
+    assert result.returncode == 0, result.stderr
+    loaded = set(result.stdout.split())
+    assert not loaded & set(LAZY_MODULES)
+
+  def test_help_without_key(self):
+    result = run("cli.py", "--help")
+    assert result.returncode == 0, result.stderr
+    assert "ACTORS" in result.stdout
+
+  def test_check_api_key(self):
+    for key in ("", "0" * 31, "z" * 32):
+      with mock.patch.multiple(tmdb_client, API_KEY=key, _api_key_checked=False):
+        with self.assertRaises(InvalidAPIKey):
+          tmdb_client.check_api_key()
+    with mock.patch.multiple(tmdb_client, API_KEY="0123456789abcdef" * 2, _api_key_checked=False):
+      tmdb_client.check_api_key()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+import unittest
+from itertools import combinations
+from unittest import mock
+from bench.stub_server import StubCatalog, StubServer
+import sweep
+
+
+class SweepTestCase(unittest.TestCase):
+  """Run against a local stub of the API, see bench/stub_server.py."""
+
+  @classmethod
+  def setUpClass(cls):
+    cls.catalog = StubCatalog(n_people=25, n_movies=60, cast_size=6)
+    cls.server = StubServer(cls.catalog).start()
+    cls.patch = mock.patch("tmdb_client.tmdb.API_BASE_URL", cls.server.url)
+    cls.patch.start()
+    cls.actor_ids = list(range(1, 21))
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.patch.stop()
+    cls.server.stop()
+
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def expected(self, min_shared=1):
+    pairs = []
+    for a, b in combinations(self.actor_ids, 2):
+      shared = sorted(set(self.catalog.filmographies[a]) & set(self.catalog.filmographies[b]))
+      if len(shared) >= min_shared:
+        pairs.append({"actors": [a, b], "count": len(shared), "movies": shared})
+    return pairs
+
+  def read_pairs(self, result):
+    with open(result["output"], encoding="utf-8") as f:
+      return [json.loads(line) for line in f]
+
+  def test_plan_shards(self):
+    for n, k in ((2, 4), (10, 3), (100, 16)):
+      shards = sweep.plan_shards(n, k)
+      assert [s[0] for s in shards] == list(range(len(shards)))
+      assert shards[0][1] == 0 and shards[-1][2] == n - 1
+      assert all(a[2] == b[1] for a, b in zip(shards, shards[1:]))
+    assert sweep.plan_shards(1, 4) == []
+
+  def test_sweep(self):
+    result = sweep.sweep(self.tmp.name, self.actor_ids, workers=1, n_shards=5)
+    assert result["shards"] == 5
+    assert result["pairs"] == 20 * 19 // 2
+    pairs = self.read_pairs(result)
+    assert pairs == self.expected()
+    assert result["matches"] == len(pairs)
+    best = max(pairs, key=lambda p: (p["count"], [-a for a in p["actors"]]))
+    assert result["top"][0] == {"actors": best["actors"], "count": best["count"]}
+
+  def test_processes(self):
+    single = sweep.sweep(os.path.join(self.tmp.name, "1"), self.actor_ids, workers=1, n_shards=6)
+    multi = sweep.sweep(
+      os.path.join(self.tmp.name, "2"), self.actor_ids, workers=2, n_shards=6, min_shared=2)
+    assert self.read_pairs(multi) == self.expected(min_shared=2)
+    assert multi["pairs"] == single["pairs"]
+
+  def test_resume(self):
+    sweep.sweep(self.tmp.name, self.actor_ids, workers=1, n_shards=4)
+    # A crash in the middle of shard 2.
+    os.remove(os.path.join(self.tmp.name, "shards", "00002.json"))
+    os.remove(os.path.join(self.tmp.name, "pairs.jsonl"))
+    self.server.reset_counters()
+    result = sweep.sweep(self.tmp.name, workers=1)
+    assert self.server.counters["requests"] == 0
+    assert self.read_pairs(result) == self.expected()
+    with self.assertRaises(ValueError):
+      sweep.sweep(self.tmp.name, [1, 2, 3])
+
+  def test_popular_actors(self):
+    ids = sweep.popular_actor_ids(5)
+    by_popularity = sorted(self.catalog.people.values(), key=lambda p: -p["popularity"])
+    assert ids == [p["id"] for p in by_popularity[:5]]
+
+
+if __name__ == '__main__':
+  unittest.main()
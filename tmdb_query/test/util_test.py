@@ -3,12 +3,9 @@ from test.movie_test import MOVIE_ID
 from test.person_test import PERSON_ID
 
 def test_add_all_to():
-  class Object(object):
-    pass
-  obj = Object()
-  setattr(obj, "results", [{"title": "a_title"}, {"title": "another_title"}])
+  page = Page(1, 1, 2, [MovieSummary(1, "a_title"), MovieSummary(2, "another_title")])
   _list = []
-  add_all_to(_list, obj)
+  add_all_to(_list, page)
   assert "a_title" in _list
   assert "another_title" in _list 
 
@@ -19,10 +16,10 @@ def test_get_first_known_key():
 
 
 def test_is_actor():
-  a_valid_person = {"id": 1} # George Lucas
-  not_an_actor = {"known_for_department": "Production"}
-  an_actor = {"known_for_department": "Acting"}
-  invalid = dict()
+  a_valid_person = PersonSummary(1) # George Lucas
+  not_an_actor = PersonSummary(0, known_for_department="Production")
+  an_actor = PersonSummary(0, known_for_department="Acting")
+  invalid = PersonSummary(0)
   assert is_actor(a_valid_person) == False
   assert is_actor(not_an_actor) == False
   assert is_actor(an_actor) == True
@@ -1,14 +1,67 @@
 from os import environ
 
 API_KEY = environ.get("TMDB_API_KEY", "")
-API_BASE_URL = "https://api.themoviedb.org"
+API_BASE_URL = environ.get("TMDB_API_BASE_URL", "https://api.themoviedb.org")
 API_VERSION = 3
 
-if len(API_KEY) != 32:
-  raise Exception(
-    "Invalid API key length. Should be 128 bits hexadecimal value. "
-    f"Length was {len(API_KEY)}.")
-try:
-  int(API_KEY, 16)
-except:
-  raise Exception("Invalid API key. Must be 128 bits hexadecimal value.")
\ No newline at end of file
+# Connection pool settings shared by every TMDB resource instance.
+# See tmdb_client.session for details.
+POOL_CONNECTIONS = int(environ.get("TMDB_POOL_CONNECTIONS", 4))
+POOL_MAXSIZE = int(environ.get("TMDB_POOL_MAXSIZE", 16))
+# "process": one session for all threads, whose connection pool is thread-safe.
+# "thread": one session per thread.
+SESSION_SCOPE = environ.get("TMDB_SESSION_SCOPE", "process")
+# HTTP transport: "requests" (HTTP/1.1 keep-alive pools) or "http2" (a
+# single multiplexed connection per host, needs httpx[http2]).
+TRANSPORT = environ.get("TMDB_TRANSPORT", "requests")
+# (connect, read) timeouts in seconds.
+CONNECT_TIMEOUT = float(environ.get("TMDB_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(environ.get("TMDB_READ_TIMEOUT", 10))
+# Maximum number of requests in flight for the async client (tmdb_client.aio).
+MAX_CONCURRENCY = int(environ.get("TMDB_MAX_CONCURRENCY", 16))
+# Client-side rate limit shared by all requests of the process, in requests
+# per second (0 disables it), and number of retries for 429, 5xx and
+# connection errors. See tmdb_client.ratelimit.
+RATE_LIMIT = float(environ.get("TMDB_RATE_LIMIT", 40))
+RATE_BURST = int(environ.get("TMDB_RATE_BURST", 20))
+MAX_RETRIES = int(environ.get("TMDB_MAX_RETRIES", 5))
+# Longest Retry-After delay honoured, in seconds. Longer delays are clamped.
+MAX_RETRY_AFTER = float(environ.get("TMDB_MAX_RETRY_AFTER", 60))
+# Number of pages fetched concurrently when all pages of a result are requested.
+PAGE_WORKERS = int(environ.get("TMDB_PAGE_WORKERS", 8))
+
+# Number of resources fetched concurrently by batch_details().
+BATCH_WORKERS = int(environ.get("TMDB_BATCH_WORKERS", 8))
+
+# JSON backend: "auto" (orjson or msgspec when installed), "orjson", "msgspec"
+# or "json". See tmdb_client.codec.
+JSON_DECODER = environ.get("TMDB_JSON_DECODER", "auto")
+
+# Response cache (see tmdb_client.cache). Disabled unless one of these is set.
+CACHE_DIR = environ.get("TMDB_CACHE_DIR", "")
+CACHE_ENTRIES = int(environ.get("TMDB_CACHE_ENTRIES", 0))
+CACHE_MAX_BYTES = int(environ.get("TMDB_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+_api_key_checked = False
+
+
+def check_api_key() -> None:
+  """
+  Raise InvalidAPIKey unless API_KEY is a 128 bits hexadecimal value.
+  Called before the first request sent to the API rather than at import time,
+  so that commands which never reach the API (--help, replays of recorded
+  responses...) start fast and work without a key.
+  """
+  global _api_key_checked
+  if _api_key_checked:
+    return
+  from .exceptions import InvalidAPIKey
+  if len(API_KEY) != 32:
+    raise InvalidAPIKey(
+      "Invalid API key length. Should be 128 bits hexadecimal value. "
+      f"Length was {len(API_KEY)}.")
+  try:
+    int(API_KEY, 16)
+  except ValueError:
+    raise InvalidAPIKey("Invalid API key. Must be 128 bits hexadecimal value.")
+  _api_key_checked = True
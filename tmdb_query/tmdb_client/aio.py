@@ -0,0 +1,421 @@
+"""
+Asyncio variants of the TMDB resources, built on aiohttp.
+
+The async classes share the BASE_PATH/SUB_PATH routing tables and the
+methods of their blocking counterparts, only _get() and _call_api() are
+coroutines, and the iter_* methods async iterators:
+
+  cast = await AsyncMovie(603).credits()
+  async for movie in AsyncDiscover().iter_movie(with_cast="6384"):
+    ...
+
+All requests issued from the same event loop share one aiohttp session, and
+the number of requests in flight is capped by a semaphore (see
+MAX_CONCURRENCY). Call `await close_client()` before the loop ends.
+"""
+import asyncio
+import time
+from collections import deque
+from itertools import islice
+from json import dumps
+from typing import AbstractSet, AsyncIterator, Callable, Dict, Iterable, List, Optional, TypeVar
+from weakref import WeakKeyDictionary
+from logging import getLogger
+log = getLogger(__name__)
+
+T = TypeVar("T")
+
+try:
+  import aiohttp
+except ImportError:
+  aiohttp = None
+
+from . import API_KEY, MAX_CONCURRENCY, POOL_MAXSIZE, CONNECT_TIMEOUT, READ_TIMEOUT, check_api_key
+from . import cache, codec, instrument, ratelimit
+from .singleflight import AsyncSingleFlight
+from .tmdb import TMDB
+from .models import MediaSummary, MovieSummary, Page, PersonSummary, parse_all
+from .movie import Movie, TV
+from .person import Person
+from .search import Search, Discover, TV_SUMMARY
+from .util import (
+  CAST_FIELDS, FILMOGRAPHY_FIELDS, get_actor_ids_from_credits, get_movies_from_credits
+)
+
+
+class AsyncClient():
+  """
+  An aiohttp session bound to one event loop, with a semaphore limiting the
+  number of concurrent requests.
+  """
+
+  def __init__(self, max_concurrency: int = MAX_CONCURRENCY) -> None:
+    if aiohttp is None:
+      raise ImportError(
+        "The async client requires aiohttp. Install it with `pip install aiohttp`.")
+    self.semaphore = asyncio.Semaphore(max_concurrency)
+    self.flights = AsyncSingleFlight()
+    self.session = aiohttp.ClientSession(
+      connector=aiohttp.TCPConnector(limit_per_host=POOL_MAXSIZE),
+      timeout=aiohttp.ClientTimeout(
+        sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+    )
+
+  async def request(
+    self,
+    method: str,
+    url: str,
+    endpoint: str,
+    params: Dict,
+    data: Optional[str] = None,
+    fields: Optional[Iterable[str]] = None,
+    call: Optional[instrument.Call] = None) -> Dict:
+    """
+    Send a request within the rate limit of the process, retrying on 429,
+    5xx and connection errors like the blocking client does.
+    Returns:
+      The decoded response, projected on fields if given.
+    """
+    check_api_key()
+    scheduler = ratelimit.get_scheduler()
+    attempt = 0
+    while True:
+      wait = scheduler.limiter.reserve()
+      await asyncio.sleep(wait)
+      if call is not None:
+        call.queue_wait += wait
+        call.retries = attempt
+      async with self.semaphore:
+        try:
+          async with self.session.request(method, url, params=params, data=data) as response:
+            delay = scheduler.retry_delay(
+              endpoint, attempt, status=response.status, headers=response.headers)
+            if delay is None:
+              log.debug(f"Fetched URL: {response.url}")
+              if call is None:
+                response.raise_for_status()
+                return codec.loads(await response.read(), fields)
+              call.status = response.status
+              response.raise_for_status()
+              body = await response.read()
+              call.bytes = len(body)
+              start = time.perf_counter()
+              res = codec.loads(body, fields)
+              call.decode = time.perf_counter() - start
+              return res
+        except aiohttp.ClientConnectionError as e:
+          delay = scheduler.retry_delay(endpoint, attempt, error=e)
+          if delay is None:
+            raise
+      await asyncio.sleep(delay)
+      attempt += 1
+
+  async def close(self) -> None:
+    await self.session.close()
+
+
+_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient]" = WeakKeyDictionary()
+_max_concurrency = MAX_CONCURRENCY
+
+
+def configure(max_concurrency: int) -> None:
+  """
+  Set the maximum number of requests in flight for clients created from now on.
+  """
+  global _max_concurrency
+  _max_concurrency = max_concurrency
+
+
+def get_client() -> AsyncClient:
+  """
+  Returns:
+    The client of the running event loop, creating it if needed.
+  """
+  loop = asyncio.get_running_loop()
+  client = _clients.get(loop)
+  if client is None:
+    client = AsyncClient(_max_concurrency)
+    _clients[loop] = client
+  return client
+
+
+async def close_client() -> None:
+  """Close the client of the running event loop, if any."""
+  client = _clients.pop(asyncio.get_running_loop(), None)
+  if client is not None:
+    await client.close()
+
+
+class AsyncTMDB(TMDB):
+  """
+  Base class of the async resources. Resource methods such as details() or
+  credits() return awaitables, and iter_* methods async iterators.
+  Sub-resources appended to a details response, with coalesce() or
+  append_to_response, are handed out like in the blocking client.
+  """
+
+  @classmethod
+  async def batch_details(
+    cls,
+    ids: Iterable[int],
+    append_to_response: Iterable[str] = (),
+    **kwargs) -> Dict[int, "AsyncTMDB"]:
+    """
+    Async variant of TMDB.batch_details(). The requests in flight are capped
+    by the client of the event loop, see MAX_CONCURRENCY.
+    """
+    ids = list(dict.fromkeys(ids))
+    append_to_response = tuple(append_to_response)
+
+    async def fetch(_id: int) -> "AsyncTMDB":
+      resource = cls(_id).coalesce(*append_to_response)
+      await resource.details(**kwargs)
+      return resource
+
+    return dict(zip(ids, await asyncio.gather(*(fetch(_id) for _id in ids))))
+
+  async def _get(self, info_type, **kwargs) -> Dict:
+    if self._pending and (info_type == "details" or info_type in self._pending):
+      return await self._get_coalesced(info_type, **kwargs)
+
+    path, method = self._get_route(info_type)
+    payload = kwargs.pop("payload", None)
+    fields = kwargs.pop("fields", None)
+    appended = self._appended.pop(cache.cache_key(path, kwargs), None)
+    if appended is not None:
+      res = codec.project(appended, fields) if fields else appended
+    elif kwargs.pop("all_pages", False):
+      res = self._merge_pages(await self._get_pages(path, method, params=kwargs))
+      res = codec.project(res, fields) if fields else res
+    else:
+      res = await self._call_api(path, method, params=kwargs, data=payload, fields=fields)
+    if info_type == "details":
+      self._spread_appended(res, kwargs)
+      self._set_val_as_attrs(res)
+    return res
+
+  async def _get_coalesced(self, info_type, **kwargs) -> Dict:
+    parts = self._pending | ({info_type} - {"details"})
+    self._pending = set()
+    if extra := kwargs.pop("append_to_response", ""):
+      parts.update(p for p in extra.split(",") if p)
+    details = await self._get("details", append_to_response=",".join(sorted(parts)), **kwargs)
+    if info_type == "details":
+      return details
+    return await self._get(info_type, **kwargs)
+
+  async def _iter_pages(self, info_type, prefetch: int = 1, **kwargs) -> AsyncIterator[Dict]:
+    """
+    Async variant of TMDB._iter_pages(): prefetch pages are requested ahead
+    while the current one is consumed, and those not consumed are cancelled.
+    """
+    path, method = self._get_route(info_type)
+
+    def fetch(page: int) -> asyncio.Future:
+      return asyncio.ensure_future(self._call_api(path, method, params=dict(kwargs, page=page)))
+
+    start = int(kwargs.get("page", 1))
+    first = await self._call_api(path, method, params=dict(kwargs, page=start))
+    last = min(int(first.get("total_pages", 1)), self.MAX_PAGES)
+    pages = iter(range(start + 1, last + 1))
+    prefetch = max(prefetch, 0)
+    ahead = deque()
+    try:
+      ahead.extend(fetch(page) for page in islice(pages, prefetch))
+      yield first
+      while True:
+        if not ahead:
+          ahead.extend(fetch(page) for page in islice(pages, 1))
+          if not ahead:
+            return
+        response = await ahead.popleft()
+        ahead.extend(fetch(page) for page in islice(pages, prefetch - len(ahead)))
+        yield response
+    finally:
+      for future in ahead:
+        future.cancel()
+
+  async def _iter_results(
+    self,
+    info_type,
+    parse: Optional[Callable[[Dict], T]] = None,
+    prefetch: int = 1,
+    **kwargs) -> AsyncIterator:
+    async for page in self._iter_pages(info_type, prefetch=prefetch, **kwargs):
+      results = page.get("results", [])
+      for result in results if parse is None else parse_all(results, parse):
+        yield result
+
+  async def _get_pages(self, endpoint, method: str, params: Dict) -> List[Dict]:
+    start = int(params.get("page", 1))
+    first = await self._call_api(endpoint, method, params=dict(params, page=start))
+    last = min(int(first.get("total_pages", 1)), self.MAX_PAGES)
+    pages = await asyncio.gather(*(
+      self._call_api(endpoint, method, params=dict(params, page=page))
+      for page in range(start + 1, last + 1)
+    ))
+    return [first] + list(pages)
+
+  async def _call_api(
+    self,
+    endpoint,
+    method: str,
+    params={},
+    data: Optional[Dict] = None,
+    fields: Optional[Iterable[str]] = None) -> Dict:
+    call = instrument.start_call(endpoint, method)
+    if call is None:
+      return await self._get_response(endpoint, method, params, data, fields)
+    start = time.perf_counter()
+    try:
+      return await self._get_response(endpoint, method, params, data, fields, call)
+    except Exception as e:
+      call.error = f"{type(e).__name__}: {e}"
+      raise
+    finally:
+      call.latency = time.perf_counter() - start
+      instrument.emit(call)
+
+  async def _get_response(
+    self,
+    endpoint,
+    method: str,
+    params: Dict,
+    data: Optional[Dict] = None,
+    fields: Optional[Iterable[str]] = None,
+    call: Optional[instrument.Call] = None) -> Dict:
+    key, cached = self._get_cached(endpoint, method, params)
+    if cached is not None:
+      if call is not None:
+        call.cache = instrument.HIT
+      return codec.project(cached, fields) if fields else cached
+    if fields:
+      fields = codec.normalize_fields(fields)
+      params_key = dict(params, fields=",".join(fields))
+      key, cached = self._get_cached(endpoint, method, params_key)
+      if cached is not None:
+        if call is not None:
+          call.cache = instrument.HIT
+        return cached
+    else:
+      params_key = params
+    if call is not None and key is not None:
+      call.cache = instrument.MISS
+
+    full_url = f"{self.base_url}/{endpoint}"
+    client = get_client()
+    # aiohttp only accepts str, int and float query values.
+    query = {k: v if isinstance(v, str) else str(v) for k, v in params.items()}
+    query.update({ "api_key": API_KEY })
+
+    leader = []
+    async def fetch() -> Dict:
+      leader.append(True)
+      res = await client.request(
+        method.upper(), full_url, endpoint,
+        params=query, data=dumps(data) if data else None, fields=fields, call=call)
+      self._set_cached(key, endpoint, res)
+      return res
+
+    if method.upper() != "GET":
+      return await fetch()
+    # Identical requests in flight share a single fetch.
+    res = await client.flights.do(key or cache.cache_key(endpoint, params_key), fetch)
+    if call is not None and not leader:
+      call.cache = instrument.COALESCED
+    return res
+
+
+class AsyncMovie(AsyncTMDB, Movie):
+  """Async variant of Movie."""
+
+
+class AsyncTV(AsyncTMDB, TV):
+  """Async variant of TV."""
+
+
+class AsyncPerson(AsyncTMDB, Person):
+  """Async variant of Person."""
+
+  async def popular(self, **kwargs) -> Page[PersonSummary]:
+    return Page.from_json(await self._get("popular", **kwargs), PersonSummary.from_json)
+
+
+class AsyncSearch(AsyncTMDB, Search):
+  """Async variant of Search."""
+
+  async def movie(self, **kwargs) -> Page[MovieSummary]:
+    if "query" not in kwargs.keys():
+      raise Exception(f"Missing \"query\" parameter.")
+    return Page.from_json(await self._get("movie", **kwargs), MovieSummary.from_json)
+
+  async def person(self, **kwargs) -> Page[PersonSummary]:
+    if "query" not in kwargs.keys():
+      raise Exception(f"Missing \"query\" parameter.")
+    return Page.from_json(await self._get("person", **kwargs), PersonSummary.from_json)
+
+
+class AsyncDiscover(AsyncTMDB, Discover):
+  """Async variant of Discover."""
+
+  async def movie(self, **kwargs) -> Page[MovieSummary]:
+    return Page.from_json(await self._get("movie", **kwargs), MovieSummary.from_json)
+
+  async def tv(self, **kwargs) -> Page[MediaSummary]:
+    return Page.from_json(await self._get("tv", **kwargs), TV_SUMMARY)
+
+
+async def get_movie_cast(movie_id: int) -> AbstractSet[int]:
+  """
+  Async variant of util.get_movie_cast.
+  Args:
+    movie_id: int. Unique TMDB movie ID.
+  Returns:
+    A set of unique TMDB actor IDs.
+  """
+  return get_actor_ids_from_credits(await AsyncMovie(movie_id).credits(fields=CAST_FIELDS))
+
+
+async def get_movies_id_for_actor_id(actor_id: int) -> Dict[int, str]:
+  """
+  Async variant of util.get_movies_id_for_actor_id.
+  Args:
+    actor_id: int. ID of the actor to look up.
+  Returns:
+    A dictionary of {movie_id: movie_title}
+  """
+  return get_movies_from_credits(
+    await AsyncPerson(actor_id).movie_credits(fields=FILMOGRAPHY_FIELDS))
+
+
+async def get_movie_casts(movie_ids: Iterable[int]) -> Dict[int, AbstractSet[int]]:
+  """
+  Fetch the cast of many movies concurrently.
+  Args:
+    movie_ids: iterable. Unique TMDB movie IDs.
+  Returns:
+    A dictionary of {movie_id: set of actor ids}
+  """
+  movie_ids = list(movie_ids)
+  casts = await asyncio.gather(*(get_movie_cast(m) for m in movie_ids))
+  return dict(zip(movie_ids, casts))
+
+
+async def get_common_movies_for_actor(
+  actor_id: int,
+  other_actor_ids: AbstractSet[int]) -> Dict[int, str]:
+  """
+  Check the cast of every movie of actor_id at once, keeping the movies where
+  all of other_actor_ids were also part of the cast.
+  Args:
+    actor_id: int. ID of the actor whose filmography is checked.
+    other_actor_ids: set. IDs of the actors that must also be in the cast.
+  Returns:
+    A dictionary of {movie_id: movie_title}
+  """
+  movies = await get_movies_id_for_actor_id(actor_id)
+  casts = await get_movie_casts(movies)
+  return {
+    movie_id: title for movie_id, title in movies.items()
+    if other_actor_ids <= casts[movie_id]
+  }
@@ -0,0 +1,542 @@
+"""
+Response cache used by TMDB._call_api.
+
+Responses are keyed on the endpoint and its sorted query parameters, without
+the API key, and expire after a time-to-live that depends on the endpoint
+(see DEFAULT_TTLS). Two tiers are provided:
+
+  MemoryCache: bounded in-memory LRU.
+  SQLiteCache: on-disk store of compressed JSON, bounded in bytes.
+
+TieredCache chains them so that disk hits are promoted to memory. Caching
+is disabled unless configure() is called, or the TMDB_CACHE_DIR or
+TMDB_CACHE_ENTRIES environment variables are set.
+
+Responses stored with validators (ETag, Last-Modified) are kept once expired,
+so that TMDB._call_api() can revalidate them with a conditional request: a
+304 answer renews the stale entry without downloading it again. Expired
+entries without validators are dropped.
+
+Cached responses are shared between callers and must be treated as read-only.
+"""
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+from logging import getLogger
+log = getLogger(__name__)
+
+from . import CACHE_DIR, CACHE_ENTRIES, CACHE_MAX_BYTES
+from . import codec
+
+DAY = 24 * 60 * 60
+
+# (endpoint pattern, time-to-live in seconds). The first matching pattern wins.
+DEFAULT_TTLS: List[Tuple[str, float]] = [
+  ("search/*", DAY),
+  ("discover/*", DAY),
+  # Change feeds are never cached.
+  ("*/changes", 0),
+  ("*/credits", 7 * DAY),
+  ("*/aggregate_credits", 7 * DAY),
+  ("person/*/*_credits", 7 * DAY),
+  ("*", 3 * DAY),
+]
+
+CACHE_FILE_NAME = "responses.sqlite"
+
+# Response headers kept to revalidate a cached response, and the request
+# header sending each of them back.
+VALIDATORS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+
+
+def cache_key(endpoint: str, params: Dict) -> str:
+  """
+  Args:
+    endpoint: str. Endpoint path, e.g. "movie/603/credits".
+    params: dict. Query parameters. The API key is ignored.
+  Returns:
+    A normalized key such as "movie/603/credits?language=en".
+  """
+  items = sorted(
+    (str(k), str(v)) for k, v in params.items() if k != "api_key" and v is not None)
+  endpoint = endpoint.strip("/")
+  return f"{endpoint}?{urlencode(items)}" if items else endpoint
+
+
+def get_ttl(endpoint: str, ttls: Sequence[Tuple[str, float]] = DEFAULT_TTLS) -> float:
+  """
+  Returns:
+    The time-to-live in seconds of the first pattern matching endpoint.
+  """
+  endpoint = endpoint.strip("/")
+  for pattern, ttl in ttls:
+    if fnmatchcase(endpoint, pattern):
+      return ttl
+  return DAY
+
+
+def get_validators(headers: Mapping[str, str]) -> Optional[Dict[str, str]]:
+  """
+  Returns:
+    The validators found in response headers, or None.
+  """
+  found = {name: headers[name] for name in VALIDATORS if headers.get(name)}
+  return found or None
+
+
+def conditional_headers(validators: Mapping[str, str]) -> Dict[str, str]:
+  """
+  Returns:
+    The headers of a conditional request for a response with validators.
+  """
+  return {VALIDATORS[name]: value for name, value in validators.items() if name in VALIDATORS}
+
+
+class ResponseCache():
+  """
+  Interface of a response cache tier. Implementations are thread-safe.
+  """
+
+  def __init__(self) -> None:
+    self.hits = 0
+    self.misses = 0
+    self._stats_lock = threading.Lock()
+
+  def get(self, key: str) -> Optional[Dict]:
+    """
+    Returns:
+      The cached response, or None if missing or expired.
+    """
+    entry = self.get_with_expiry(key)
+    return entry[0] if entry is not None else None
+
+  def set(self, key: str, value: Dict, ttl: float, validators: Optional[Dict] = None) -> None:
+    """Store value for ttl seconds, with its validators if any."""
+    self.set_with_expiry(key, value, time.time() + ttl, validators)
+
+  def get_with_expiry(self, key: str) -> Optional[Tuple[Dict, float]]:
+    """
+    Returns:
+      A tuple of the cached response and its expiry timestamp, or None.
+    """
+    entry = self.get_entry(key)
+    return entry[:2] if entry is not None else None
+
+  def get_entry(self, key: str) -> Optional[Tuple[Dict, float, Optional[Dict]]]:
+    """
+    Returns:
+      A tuple of the cached response, its expiry timestamp and its
+      validators (None without any), or None if missing or expired.
+    """
+    raise NotImplementedError
+
+  def set_with_expiry(
+    self,
+    key: str,
+    value: Dict,
+    expires: float,
+    validators: Optional[Dict] = None) -> None:
+    raise NotImplementedError
+
+  def get_stale(self, key: str) -> Optional[Tuple[Dict, Dict]]:
+    """
+    Returns:
+      A tuple of the response and its validators, expired or not, or None
+      if there is no response to revalidate. Hits are not counted.
+    """
+    raise NotImplementedError
+
+  def keys(self, prefix: str = "") -> List[str]:
+    """
+    Returns:
+      The keys starting with prefix, expired or not.
+    """
+    raise NotImplementedError
+
+  def extend_expiry(self, expiries: Mapping[str, float]) -> None:
+    """
+    Push the expiry of unexpired entries back to the given timestamps, if
+    later than their current ones.
+    """
+    raise NotImplementedError
+
+  def delete(self, key: str) -> None:
+    raise NotImplementedError
+
+  def delete_many(self, keys: Iterable[str]) -> None:
+    for key in keys:
+      self.delete(key)
+
+  def clear(self) -> None:
+    raise NotImplementedError
+
+  def __len__(self) -> int:
+    raise NotImplementedError
+
+  def _count(self, hit: bool) -> None:
+    with self._stats_lock:
+      if hit:
+        self.hits += 1
+      else:
+        self.misses += 1
+
+  def stats(self) -> Dict:
+    return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+
+class MemoryCache(ResponseCache):
+  """
+  In-memory LRU cache holding at most max_entries responses.
+  """
+
+  def __init__(self, max_entries: int = 1024) -> None:
+    super().__init__()
+    self.max_entries = max_entries
+    # key -> (value, expires, validators)
+    self._entries: "OrderedDict[str, Tuple[Dict, float, Optional[Dict]]]" = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get_entry(self, key: str) -> Optional[Tuple[Dict, float, Optional[Dict]]]:
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None and entry[1] <= time.time():
+        if entry[2] is None:
+          del self._entries[key]
+        entry = None
+      if entry is not None:
+        self._entries.move_to_end(key)
+      self._count(entry is not None)
+      return entry
+
+  def set_with_expiry(
+    self,
+    key: str,
+    value: Dict,
+    expires: float,
+    validators: Optional[Dict] = None) -> None:
+    with self._lock:
+      self._entries[key] = (value, expires, validators)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def get_stale(self, key: str) -> Optional[Tuple[Dict, Dict]]:
+    with self._lock:
+      entry = self._entries.get(key)
+    if entry is None or entry[2] is None:
+      return None
+    return entry[0], entry[2]
+
+  def keys(self, prefix: str = "") -> List[str]:
+    with self._lock:
+      return [k for k in self._entries if k.startswith(prefix)]
+
+  def extend_expiry(self, expiries: Mapping[str, float]) -> None:
+    now = time.time()
+    with self._lock:
+      for key, expires in expiries.items():
+        entry = self._entries.get(key)
+        if entry is not None and now < entry[1] < expires:
+          self._entries[key] = (entry[0], expires, entry[2])
+
+  def delete(self, key: str) -> None:
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+
+class SQLiteCache(ResponseCache):
+  """
+  On-disk cache storing zlib-compressed JSON in a SQLite database. When the
+  stored size exceeds max_bytes, the least recently used entries are evicted.
+  """
+
+  def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024) -> None:
+    super().__init__()
+    self.path = path
+    self.max_bytes = max_bytes
+    self._lock = threading.Lock()
+    # Imported on demand, like the cache itself.
+    import sqlite3
+    self._conn = sqlite3.connect(path, check_same_thread=False)
+    with self._conn:
+      self._conn.execute("PRAGMA journal_mode=WAL")
+      self._conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "key TEXT PRIMARY KEY, value BLOB, expires REAL, size INTEGER, accessed REAL, "
+        "validators TEXT)")
+      self._conn.execute(
+        "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+      columns = [row[1] for row in self._conn.execute("PRAGMA table_info(responses)")]
+      if "validators" not in columns:
+        # Caches written before validators were stored.
+        self._conn.execute("ALTER TABLE responses ADD COLUMN validators TEXT")
+    self._size = self._total_size()
+
+  def _total_size(self) -> int:
+    return self._conn.execute(
+      "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+  def get_entry(self, key: str) -> Optional[Tuple[Dict, float, Optional[Dict]]]:
+    now = time.time()
+    with self._lock:
+      row = self._conn.execute(
+        "SELECT value, expires, validators FROM responses WHERE key = ?", (key,)).fetchone()
+      if row is not None and row[1] <= now:
+        if row[2] is None:
+          self._delete(key)
+        row = None
+      if row is not None:
+        with self._conn:
+          self._conn.execute(
+            "UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+      self._count(row is not None)
+    if row is None:
+      return None
+    return codec.loads(zlib.decompress(row[0])), row[1], codec.loads(row[2]) if row[2] else None
+
+  def set_with_expiry(
+    self,
+    key: str,
+    value: Dict,
+    expires: float,
+    validators: Optional[Dict] = None) -> None:
+    blob = zlib.compress(codec.dumps(value))
+    stored = codec.dumps(validators).decode("utf-8") if validators else None
+    with self._lock:
+      with self._conn:
+        row = self._conn.execute(
+          "SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        self._conn.execute(
+          "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+          (key, blob, expires, len(blob), time.time(), stored))
+      self._size += len(blob) - (row[0] if row else 0)
+      if self._size > self.max_bytes:
+        self._evict()
+
+  def get_stale(self, key: str) -> Optional[Tuple[Dict, Dict]]:
+    with self._lock:
+      row = self._conn.execute(
+        "SELECT value, validators FROM responses WHERE key = ? AND validators IS NOT NULL",
+        (key,)).fetchone()
+    if row is None:
+      return None
+    return codec.loads(zlib.decompress(row[0])), codec.loads(row[1])
+
+  def keys(self, prefix: str = "") -> List[str]:
+    with self._lock:
+      rows = self._conn.execute(
+        "SELECT key FROM responses WHERE key LIKE ? ESCAPE '\\'", (_like_prefix(prefix),)).fetchall()
+    return [row[0] for row in rows]
+
+  def extend_expiry(self, expiries: Mapping[str, float]) -> None:
+    now = time.time()
+    with self._lock:
+      with self._conn:
+        self._conn.executemany(
+          "UPDATE responses SET expires = ? WHERE key = ? AND expires > ? AND expires < ?",
+          [(expires, key, now, expires) for key, expires in expiries.items()])
+
+  def _evict(self) -> None:
+    """
+    Delete the expired entries which cannot be revalidated, then down to 90%
+    of max_bytes, the expired entries with validators and then the least
+    recently used ones.
+    """
+    target = self.max_bytes * 0.9
+    now = time.time()
+    with self._conn:
+      self._conn.execute(
+        "DELETE FROM responses WHERE expires <= ? AND validators IS NULL", (now,))
+      size = self._total_size()
+      rows = self._conn.execute(
+        "SELECT key, size FROM responses ORDER BY expires > ?, accessed", (now,)).fetchall()
+      evicted = []
+      for key, entry_size in rows:
+        if size <= target:
+          break
+        evicted.append((key,))
+        size -= entry_size
+      self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+    log.debug(f"Evicted {len(evicted)} cached responses.")
+    self._size = size
+
+  def _delete(self, key: str) -> None:
+    with self._conn:
+      row = self._conn.execute(
+        "SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+      if row:
+        self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._size -= row[0]
+
+  def delete(self, key: str) -> None:
+    with self._lock:
+      self._delete(key)
+
+  def delete_many(self, keys: Iterable[str]) -> None:
+    with self._lock:
+      with self._conn:
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in keys])
+      self._size = self._total_size()
+
+  def scan(self, prefix: str = "") -> Iterator[Tuple[str, Dict]]:
+    """
+    Iterate over the unexpired entries whose key starts with prefix, without
+    counting hits or updating their access time.
+    Yields:
+      Tuples of (key, response).
+    """
+    with self._lock:
+      rows = self._conn.execute(
+        "SELECT key, value FROM responses WHERE key LIKE ? ESCAPE '\\' AND expires > ?",
+        (_like_prefix(prefix), time.time())).fetchall()
+    for key, value in rows:
+      yield key, codec.loads(zlib.decompress(value))
+
+  def clear(self) -> None:
+    with self._lock:
+      with self._conn:
+        self._conn.execute("DELETE FROM responses")
+      self._size = 0
+
+  def __len__(self) -> int:
+    with self._lock:
+      return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+  def stats(self) -> Dict:
+    return dict(super().stats(), bytes=self._size)
+
+  def close(self) -> None:
+    self._conn.close()
+
+
+def _like_prefix(prefix: str) -> str:
+  """
+  Returns:
+    A LIKE pattern (escaped with a backslash) matching the strings starting with prefix.
+  """
+  return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class TieredCache(ResponseCache):
+  """
+  Look up each tier in order. Hits in a lower tier are copied to the tiers
+  above, writes go to every tier.
+  """
+
+  def __init__(self, *tiers: ResponseCache, ttls: Sequence[Tuple[str, float]] = DEFAULT_TTLS) -> None:
+    super().__init__()
+    self.tiers = tiers
+    self.ttls = ttls
+
+  def get_entry(self, key: str) -> Optional[Tuple[Dict, float, Optional[Dict]]]:
+    for index, tier in enumerate(self.tiers):
+      entry = tier.get_entry(key)
+      if entry is not None:
+        # With the validators, so that the upper tiers can revalidate it too.
+        for upper in self.tiers[:index]:
+          upper.set_with_expiry(key, *entry)
+        self._count(True)
+        return entry
+    self._count(False)
+    return None
+
+  def set_with_expiry(
+    self,
+    key: str,
+    value: Dict,
+    expires: float,
+    validators: Optional[Dict] = None) -> None:
+    for tier in self.tiers:
+      tier.set_with_expiry(key, value, expires, validators)
+
+  def get_stale(self, key: str) -> Optional[Tuple[Dict, Dict]]:
+    for tier in self.tiers:
+      entry = tier.get_stale(key)
+      if entry is not None:
+        return entry
+    return None
+
+  def keys(self, prefix: str = "") -> List[str]:
+    keys: Dict[str, None] = {}
+    for tier in self.tiers:
+      keys.update(dict.fromkeys(tier.keys(prefix)))
+    return list(keys)
+
+  def extend_expiry(self, expiries: Mapping[str, float]) -> None:
+    for tier in self.tiers:
+      tier.extend_expiry(expiries)
+
+  def delete(self, key: str) -> None:
+    for tier in self.tiers:
+      tier.delete(key)
+
+  def delete_many(self, keys: Iterable[str]) -> None:
+    keys = list(keys)
+    for tier in self.tiers:
+      tier.delete_many(keys)
+
+  def clear(self) -> None:
+    for tier in self.tiers:
+      tier.clear()
+
+  def __len__(self) -> int:
+    return max((len(t) for t in self.tiers), default=0)
+
+  def stats(self) -> Dict:
+    stats = super().stats()
+    stats["tiers"] = [dict(t.stats(), type=type(t).__name__) for t in self.tiers]
+    return stats
+
+
+_cache: Optional[TieredCache] = None
+
+
+def configure(
+  cache_dir: Optional[str] = None,
+  memory_entries: int = 1024,
+  max_bytes: int = CACHE_MAX_BYTES,
+  ttls: Sequence[Tuple[str, float]] = DEFAULT_TTLS) -> TieredCache:
+  """
+  Enable the response cache for all TMDB resources.
+  Args:
+    cache_dir: str <optional>. Directory of the on-disk tier. Memory only if None.
+    memory_entries: int. Size of the in-memory LRU tier. 0 to disable it.
+    max_bytes: int. Maximum size of the on-disk tier.
+    ttls: sequence. (endpoint pattern, seconds) pairs, see DEFAULT_TTLS.
+  Returns:
+    The new cache.
+  """
+  tiers: List[ResponseCache] = []
+  if memory_entries > 0:
+    tiers.append(MemoryCache(memory_entries))
+  if cache_dir:
+    os.makedirs(cache_dir, exist_ok=True)
+    tiers.append(SQLiteCache(os.path.join(cache_dir, CACHE_FILE_NAME), max_bytes))
+  return set_cache(TieredCache(*tiers, ttls=ttls))
+
+
+def set_cache(cache: Optional[TieredCache]) -> Optional[TieredCache]:
+  """Replace the cache used by all TMDB resources. None disables caching."""
+  global _cache
+  _cache = cache
+  return cache
+
+
+def get_cache() -> Optional[TieredCache]:
+  return _cache
+
+
+if CACHE_DIR or CACHE_ENTRIES:
+  configure(cache_dir=CACHE_DIR or None, memory_entries=CACHE_ENTRIES or 1024)
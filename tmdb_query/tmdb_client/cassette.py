@@ -0,0 +1,201 @@
+"""
+Record and replay of API responses, to run tests and benchmarks offline.
+
+A cassette is a JSON file of the responses received, keyed by HTTP method,
+endpoint and parameters (without the API key):
+
+  {"version": 1, "responses": {"GET movie/603/credits": {"status": 200, "body": {...}}}}
+
+While a cassette is in use, the requests sent by TMDB._call_api() are:
+
+  replay: answered from the cassette. Missing entries raise CassetteMiss.
+  record: sent to the API, and their responses stored in the cassette.
+  once: answered from the cassette when possible, otherwise recorded.
+
+Replayed responses skip the rate limiter, and can be delayed by a simulated
+latency to keep benchmarks realistic:
+
+  with cassette.use("test/cassettes/query.json", mode="replay", latency=0.05):
+    get_common_movies({"Keanu Reeves", "Laurence Fishburne"})
+
+Files ending with .gz are compressed.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+from logging import getLogger
+log = getLogger(__name__)
+
+from . import cache, codec
+
+CASSETTE_VERSION = 1
+MODES = ("replay", "record", "once")
+
+
+class CassetteMiss(Exception):
+  pass
+
+
+class Cassette():
+  """
+  Thread-safe store of recorded responses.
+  """
+
+  def __init__(
+    self,
+    path: Optional[str] = None,
+    mode: str = "once",
+    latency: float = 0.0,
+    base_url: Optional[str] = None) -> None:
+    """
+    Args:
+      path: str <optional>. JSON file to load responses from, and to save
+        them to. None keeps them in memory only.
+      mode: str. One of MODES.
+      latency: float. Seconds to wait before answering each replayed request.
+      base_url: str <optional>. Only requests to this API host go through
+        the cassette, others are sent as usual (e.g. to a local stub).
+    """
+    if mode not in MODES:
+      raise ValueError(f"Invalid cassette mode \"{mode}\". Expected one of {MODES}.")
+    self.path = path
+    self.mode = mode
+    self.latency = latency
+    self.base_url = base_url
+    self.responses: Dict[str, Dict] = {}
+    self.played = 0
+    self.recorded = 0
+    self._dirty = False
+    self._lock = threading.Lock()
+    if path and os.path.exists(path):
+      self.load(path)
+
+  @staticmethod
+  def key(method: str, endpoint: str, params: Dict) -> str:
+    return f"{method.upper()} {cache.cache_key(endpoint, params)}"
+
+  def load(self, path: str) -> None:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+      data = json.load(f)
+    if data.get("version") != CASSETTE_VERSION:
+      raise ValueError(f"Unsupported cassette version {data.get('version')} in {path}.")
+    with self._lock:
+      self.responses.update(data["responses"])
+
+  def save(self, path: Optional[str] = None) -> None:
+    """Write the responses to path, or to the file the cassette was loaded from."""
+    path = path or self.path
+    if not path:
+      return
+    with self._lock:
+      data = {"version": CASSETTE_VERSION, "responses": dict(sorted(self.responses.items()))}
+      self._dirty = False
+    if os.path.dirname(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    opener = gzip.open if path.endswith(".gz") else open
+    tmp = f"{path}.tmp"
+    with opener(tmp, "wt", encoding="utf-8") as f:
+      json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+  def play(
+    self,
+    method: str,
+    endpoint: str,
+    params: Dict,
+    send: Callable[[], "requests.Response"],
+    base_url: Optional[str] = None) -> "requests.Response":
+    """
+    Args:
+      method: str. HTTP method.
+      endpoint: str. Endpoint path.
+      params: dict. Query parameters.
+      send: callable. Sends the request to the API, when recording.
+      base_url: str <optional>. URL the request is meant for.
+    Returns:
+      The recorded or received response. Its status is not checked.
+    """
+    if self.base_url and base_url and not base_url.startswith(self.base_url):
+      return send()
+    key = self.key(method, endpoint, params)
+    if self.mode != "record":
+      with self._lock:
+        entry = self.responses.get(key)
+        if entry is not None:
+          self.played += 1
+      if entry is not None:
+        if self.latency:
+          time.sleep(self.latency)
+        return _to_response(entry, endpoint)
+      if self.mode == "replay":
+        raise CassetteMiss(f"No recorded response for \"{key}\".")
+
+    response = send()
+    try:
+      body = response.json()
+    except ValueError:
+      body = None
+    with self._lock:
+      self.responses[key] = {"status": response.status_code, "body": body}
+      self.recorded += 1
+      self._dirty = True
+    log.debug(f"Recorded {key}")
+    return response
+
+  def close(self) -> None:
+    """Save new recordings, if any."""
+    if self._dirty:
+      self.save()
+
+
+def _to_response(entry: Dict, endpoint: str) -> "requests.Response":
+  import requests
+  response = requests.Response()
+  response.status_code = entry["status"]
+  response._content = codec.dumps(entry["body"])
+  response.headers["Content-Type"] = "application/json;charset=utf-8"
+  response.url = f"cassette:{endpoint}"
+  return response
+
+
+_cassette: Optional[Cassette] = None
+
+
+def get_cassette() -> Optional[Cassette]:
+  return _cassette
+
+
+def set_cassette(cassette: Optional[Cassette]) -> Optional[Cassette]:
+  """
+  Use cassette for the requests of the whole process, None to go back to
+  the network.
+  Returns:
+    The cassette previously in use.
+  """
+  global _cassette
+  previous, _cassette = _cassette, cassette
+  return previous
+
+
+@contextmanager
+def use(
+  path: Optional[str] = None,
+  mode: str = "once",
+  latency: float = 0.0,
+  base_url: Optional[str] = None) -> Iterator[Cassette]:
+  """
+  Use a cassette within a with block, saving new recordings at the end.
+  See Cassette for the arguments.
+  """
+  cassette = Cassette(path, mode, latency, base_url)
+  previous = set_cassette(cassette)
+  try:
+    yield cassette
+  finally:
+    set_cassette(previous)
+    cassette.close()
@@ -0,0 +1,71 @@
+from typing import Dict, Iterator
+from .tmdb import TMDB
+
+
+class Changes(TMDB):
+  """
+  Represent TMDB's changes API interface: the ids of the movies, TV shows and
+  people edited in the last 24 hours, or between start_date and end_date (14
+  days apart at most).
+  Documentation @ https://developers.themoviedb.org/3/changes
+  """
+
+  BASE_PATH = ""
+  SUB_PATH = {
+    "movie": ("movie/changes", "GET"),
+    "tv": ("tv/changes", "GET"),
+    "person": ("person/changes", "GET"),
+  }
+
+  def movie(self, **kwargs) -> Dict:
+    """
+    Get the ids of the movies changed.
+    Docs @ https://developers.themoviedb.org/3/changes/get-movie-change-list
+
+    Kwargs:
+      start_date: str (optional). YYYY-MM-DD.
+      end_date: str (optional). YYYY-MM-DD.
+      page: int (optional).
+      all_pages: bool (optional). Fetch and merge the results of every page.
+    Returns:
+      JSON response as a dict.
+    """
+    return self._get("movie", **kwargs)
+
+  def tv(self, **kwargs) -> Dict:
+    """
+    Get the ids of the TV shows changed.
+    Docs @ https://developers.themoviedb.org/3/changes/get-tv-change-list
+
+    Kwargs:
+      See movie().
+    Returns:
+      JSON response as a dict.
+    """
+    return self._get("tv", **kwargs)
+
+  def person(self, **kwargs) -> Dict:
+    """
+    Get the ids of the people changed.
+    Docs @ https://developers.themoviedb.org/3/changes/get-person-change-list
+
+    Kwargs:
+      See movie().
+    Returns:
+      JSON response as a dict.
+    """
+    return self._get("person", **kwargs)
+
+  def iter_ids(self, kind: str, prefetch: int = 1, **kwargs) -> Iterator[int]:
+    """
+    Args:
+      kind: str. "movie", "tv" or "person".
+      prefetch: int. Number of pages fetched ahead while results are consumed.
+    Kwargs:
+      See movie().
+    Returns:
+      An iterator of the ids changed, lazily page by page.
+    """
+    for result in self._iter_results(kind, prefetch=prefetch, **kwargs):
+      if result.get("id") is not None:
+        yield int(result["id"])
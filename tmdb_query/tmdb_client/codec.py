@@ -0,0 +1,197 @@
+"""
+JSON decoding and encoding of API responses, with pluggable backends.
+
+  orjson: fastest full decoding, used by default when installed.
+  msgspec: also decodes projections straight from the raw bytes, skipping
+    the fields nobody asked for.
+  json: the standard library, always available.
+
+A projection keeps only some fields of a response, given as paths where "[]"
+stands for every element of a list:
+
+  >>> loads(body, fields=("id", "cast[].id", "cast[].known_for_department"))
+  {"id": 603, "cast": [{"id": 6384, "known_for_department": "Acting"}, ...]}
+
+Without msgspec, the body is decoded in full and then pruned, which still
+saves the memory of the dropped fields.
+"""
+import json
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from logging import getLogger
+log = getLogger(__name__)
+
+from . import JSON_DECODER
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+try:
+  import msgspec
+except ImportError:
+  msgspec = None
+
+BACKENDS = ("auto", "orjson", "msgspec", "json")
+
+# Nested {key: subtree} mapping of the fields to keep. "[]" maps list elements,
+# and an empty subtree keeps the whole value.
+FieldTree = Dict[str, "FieldTree"]
+
+
+def _json_dumps(value: Any) -> bytes:
+  return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _available(backend: str) -> bool:
+  return {"orjson": orjson, "msgspec": msgspec, "json": json}[backend] is not None
+
+
+def _resolve(backend: str) -> str:
+  if backend not in BACKENDS:
+    raise ValueError(f"Invalid JSON backend \"{backend}\". Expected one of {BACKENDS}.")
+  if backend == "auto":
+    return next(b for b in ("orjson", "msgspec", "json") if _available(b))
+  if not _available(backend):
+    raise ImportError(f"The \"{backend}\" JSON backend is not installed.")
+  return backend
+
+
+_backend = "json"
+_loads: Callable[[Union[bytes, str]], Any] = json.loads
+_dumps: Callable[[Any], bytes] = _json_dumps
+
+
+def configure(backend: str = "auto") -> str:
+  """
+  Select the JSON backend of the process.
+  Args:
+    backend: str. One of BACKENDS. "auto" picks the fastest one installed.
+  Returns:
+    The name of the backend in use.
+  """
+  global _backend, _loads, _dumps
+  _backend = _resolve(backend)
+  if _backend == "orjson":
+    _loads, _dumps = orjson.loads, orjson.dumps
+  elif _backend == "msgspec":
+    _loads, _dumps = msgspec.json.decode, msgspec.json.encode
+  else:
+    _loads, _dumps = json.loads, _json_dumps
+  log.debug(f"JSON backend: {_backend}")
+  return _backend
+
+
+def get_backend() -> str:
+  return _backend
+
+
+def dumps(value: Any) -> bytes:
+  """
+  Returns:
+    The compact JSON encoding of value, as UTF-8 bytes.
+  """
+  return _dumps(value)
+
+
+def loads(data: Union[bytes, str], fields: Optional[Iterable[str]] = None) -> Any:
+  """
+  Args:
+    data: bytes or str. A JSON document.
+    fields: iterable of strings <optional>. Only keep these fields, see
+      the module documentation.
+  Returns:
+    The decoded document.
+  """
+  if not fields:
+    return _loads(data)
+  fields = normalize_fields(fields)
+  if _backend != "json" and msgspec is not None:
+    try:
+      return msgspec.to_builtins(_projection_decoder(fields).decode(data))
+    except msgspec.ValidationError as e:
+      # The document does not have the expected shape, e.g. null instead of
+      # a list. Fall back to pruning the full document.
+      log.debug(f"Projection {fields} failed, decoding in full: {e}")
+  return _project(_loads(data), field_tree(fields))
+
+
+def normalize_fields(fields: Iterable[str]) -> Tuple[str, ...]:
+  """
+  Returns:
+    The fields as a sorted tuple of unique paths, usable as a cache key.
+  """
+  if isinstance(fields, str):
+    fields = fields.split(",")
+  return tuple(sorted({f.strip() for f in fields if f.strip()}))
+
+
+@lru_cache(maxsize=256)
+def field_tree(fields: Tuple[str, ...]) -> FieldTree:
+  """
+  >>> field_tree(("id", "cast[].id"))
+  {'id': {}, 'cast': {'[]': {'id': {}}}}
+  """
+  tree: FieldTree = {}
+  for path in fields:
+    node = tree
+    for part in path.replace("[]", ".[].").split("."):
+      if part:
+        node = node.setdefault(part, {})
+  return tree
+
+
+def project(value: Any, fields: Iterable[str]) -> Any:
+  """
+  Args:
+    value: A decoded document.
+    fields: iterable of strings. Fields to keep, see the module documentation.
+  Returns:
+    A copy of value holding only the given fields.
+  """
+  return _project(value, field_tree(normalize_fields(fields)))
+
+
+def _project(value: Any, tree: FieldTree) -> Any:
+  if not tree:
+    return value
+  if "[]" in tree:
+    if not isinstance(value, list):
+      return value
+    sub = tree["[]"]
+    if sub and not any(sub.values()) and "[]" not in sub:
+      # Common case of a list of objects projected on some of their keys.
+      keys = tuple(sub)
+      return [
+        {k: v[k] for k in keys if k in v} if isinstance(v, dict) else v for v in value]
+    return [_project(v, sub) for v in value]
+  if isinstance(value, dict):
+    return {k: _project(value[k], sub) for k, sub in tree.items() if k in value}
+  return value
+
+
+@lru_cache(maxsize=256)
+def _projection_decoder(fields: Tuple[str, ...]) -> "msgspec.json.Decoder":
+  """
+  Returns:
+    A msgspec decoder of structs holding only the given fields. Other fields
+    are skipped by the parser without being built.
+  """
+  return msgspec.json.Decoder(_projection_type(field_tree(fields)))
+
+
+def _projection_type(tree: FieldTree, name: str = "Projection") -> Any:
+  if not tree:
+    return Any
+  if "[]" in tree:
+    return Optional[List[_projection_type(tree["[]"], name)]]
+  struct = msgspec.defstruct(
+    name,
+    [(key, Union[_projection_type(sub, f"{name}_{key}"), msgspec.UnsetType], msgspec.UNSET)
+     for key, sub in tree.items()],
+    omit_defaults=True)
+  return Optional[struct]
+
+
+configure(JSON_DECODER)
@@ -3,4 +3,7 @@ class NotAnActor(Exception):
   pass
 
 class NameNotFound(Exception):
-  pass
\ No newline at end of file
+  pass
+
+class InvalidAPIKey(Exception):
+  pass
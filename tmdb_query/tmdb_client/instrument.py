@@ -0,0 +1,328 @@
+"""
+Instrumentation of API calls and local query phases.
+
+Every call to TMDB._call_api() produces a Call record: endpoint template,
+latency, bytes received, cache outcome, retries, time spent waiting for the
+rate limiter, and decoding time. Local phases of a query (name resolution,
+intersection...) produce Phase records. Records go to:
+
+  profiles: collect the records of one high-level query, including those
+    of the worker threads it starts (see bind()), and print a summary.
+
+    with instrument.profile("get_common_movies") as p:
+      get_common_movies({"Keanu Reeves", "Laurence Fishburne"})
+    print(p.format())
+
+  hooks: callables receiving every record of the process, e.g. to feed a
+    metrics stack. PrometheusMetrics and OpenTelemetrySpans are provided.
+
+Nothing is recorded unless a profile or a hook is active.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
+from .ratelimit import endpoint_template
+
+try:
+  from opentelemetry import trace as otel_trace
+except ImportError:
+  otel_trace = None
+
+T = TypeVar("T")
+
+# Cache outcomes of a call.
+HIT, MISS, OFF, COALESCED = "hit", "miss", "off", "coalesced"
+
+
+class Call():
+  """
+  One call to the API, or to the response cache in front of it.
+  """
+  __slots__ = (
+    "endpoint", "method", "start", "latency", "status", "bytes", "cache",
+    "retries", "queue_wait", "decode", "error")
+
+  def __init__(self, endpoint: str, method: str) -> None:
+    self.endpoint = endpoint_template(endpoint)
+    self.method = method.upper()
+    # Wall clock start time, and durations in seconds.
+    self.start = time.time()
+    self.latency = 0.0
+    self.status: Optional[int] = None
+    self.bytes = 0
+    self.cache = OFF
+    self.retries = 0
+    self.queue_wait = 0.0
+    self.decode = 0.0
+    self.error: Optional[str] = None
+
+
+class Phase():
+  """
+  A local phase of a query, such as the intersection of filmographies.
+  """
+  __slots__ = ("name", "start", "duration")
+
+  def __init__(self, name: str, start: float, duration: float) -> None:
+    self.name = name
+    self.start = start
+    self.duration = duration
+
+
+Record = Union[Call, Phase]
+
+
+class Profile():
+  """
+  Records of one high-level query.
+  """
+
+  def __init__(self, name: str) -> None:
+    self.name = name
+    self.calls: List[Call] = []
+    self.phases: List[Phase] = []
+    self.elapsed = 0.0
+    self._lock = threading.Lock()
+
+  def add(self, record: Record) -> None:
+    with self._lock:
+      (self.calls if isinstance(record, Call) else self.phases).append(record)
+
+  def summary(self) -> List[Dict]:
+    """
+    Returns:
+      One row of totals per endpoint template, most expensive first.
+    """
+    rows: Dict[Tuple[str, str], Dict] = {}
+    with self._lock:
+      calls = list(self.calls)
+    for call in calls:
+      row = rows.setdefault((call.method, call.endpoint), {
+        "method": call.method, "endpoint": call.endpoint, "calls": 0,
+        HIT: 0, MISS: 0, OFF: 0, COALESCED: 0, "errors": 0, "retries": 0,
+        "bytes": 0, "latency": 0.0, "max_latency": 0.0, "queue_wait": 0.0, "decode": 0.0,
+      })
+      row["calls"] += 1
+      row[call.cache] += 1
+      row["errors"] += call.error is not None
+      row["retries"] += call.retries
+      row["bytes"] += call.bytes
+      row["latency"] += call.latency
+      row["max_latency"] = max(row["max_latency"], call.latency)
+      row["queue_wait"] += call.queue_wait
+      row["decode"] += call.decode
+    return sorted(rows.values(), key=lambda r: r["latency"], reverse=True)
+
+  def phase_totals(self) -> Dict[str, float]:
+    totals: Dict[str, float] = defaultdict(float)
+    with self._lock:
+      for phase in self.phases:
+        totals[phase.name] += phase.duration
+      totals["decode"] += sum(c.decode for c in self.calls)
+    return dict(totals)
+
+  def format(self) -> str:
+    """
+    Returns:
+      A summary table of the calls and phases of the query.
+    """
+    lines = [
+      f"Profile of {self.name}: {self.elapsed * 1000:.1f} ms, {len(self.calls)} API calls.",
+      f"{'endpoint':<36} {'calls':>5} {'hit':>4} {'miss':>4} {'dedup':>5} {'retry':>5} "
+      f"{'KiB':>8} {'total ms':>9} {'max ms':>8} {'wait ms':>8} {'decode ms':>9}",
+    ]
+    for r in self.summary():
+      lines.append(
+        f"{(r['method'] + ' ' + r['endpoint'])[:36]:<36} {r['calls']:>5} {r[HIT]:>4} "
+        f"{r[MISS]:>4} {r[COALESCED]:>5} {r['retries']:>5} {r['bytes'] / 1024:>8.1f} "
+        f"{r['latency'] * 1000:>9.1f} {r['max_latency'] * 1000:>8.1f} "
+        f"{r['queue_wait'] * 1000:>8.1f} {r['decode'] * 1000:>9.1f}")
+    phases = self.phase_totals()
+    if phases:
+      lines.append("Phases: " + ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in phases.items()))
+    return "\n".join(lines)
+
+
+_profile: "ContextVar[Optional[Profile]]" = ContextVar("tmdb_profile", default=None)
+_hooks: List[Callable[[Record], None]] = []
+
+
+def enabled() -> bool:
+  return bool(_hooks) or _profile.get() is not None
+
+
+def get_profile() -> Optional[Profile]:
+  return _profile.get()
+
+
+@contextmanager
+def profile(name: str) -> Iterator[Profile]:
+  """
+  Collect the records of the calls made within the with block, and of the
+  worker threads started with bind().
+  """
+  current = Profile(name)
+  token = _profile.set(current)
+  start = time.perf_counter()
+  try:
+    yield current
+  finally:
+    current.elapsed = time.perf_counter() - start
+    _profile.reset(token)
+
+
+def bind(fn: Callable[..., T]) -> Callable[..., T]:
+  """
+  Returns:
+    fn, running within the profile of the calling thread, to be handed to a
+    thread pool.
+  """
+  current = _profile.get()
+  if current is None:
+    return fn
+
+  def bound(*args, **kwargs) -> T:
+    token = _profile.set(current)
+    try:
+      return fn(*args, **kwargs)
+    finally:
+      _profile.reset(token)
+  return bound
+
+
+def add_hook(hook: Callable[[Record], None]) -> None:
+  """Send every record of the process to hook, from any thread."""
+  _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[Record], None]) -> None:
+  _hooks.remove(hook)
+
+
+def emit(record: Record) -> None:
+  current = _profile.get()
+  if current is not None:
+    current.add(record)
+  for hook in list(_hooks):
+    hook(record)
+
+
+def start_call(endpoint: str, method: str) -> Optional[Call]:
+  """
+  Returns:
+    A new call record, or None if nothing is listening.
+  """
+  return Call(endpoint, method) if enabled() else None
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+  """Time a local phase of a query."""
+  if not enabled():
+    yield
+    return
+  start, perf = time.time(), time.perf_counter()
+  try:
+    yield
+  finally:
+    emit(Phase(name, start, time.perf_counter() - perf))
+
+
+class PrometheusMetrics():
+  """
+  Hook aggregating records as Prometheus metrics:
+
+    instrument.add_hook(metrics := PrometheusMetrics())
+    metrics.exposition()  # Text exposition format, e.g. for a /metrics endpoint.
+  """
+  BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+  def __init__(self, prefix: str = "tmdb") -> None:
+    self.prefix = prefix
+    self._requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+    self._latency: Dict[str, List[float]] = {}
+    self._totals: Dict[Tuple[str, str], float] = defaultdict(float)
+    self._phases: Dict[str, float] = defaultdict(float)
+    self._lock = threading.Lock()
+
+  def __call__(self, record: Record) -> None:
+    with self._lock:
+      if isinstance(record, Phase):
+        self._phases[record.name] += record.duration
+        return
+      self._requests[(record.endpoint, record.cache, str(record.status or ""))] += 1
+      # Bucket counts, then the sum and count of the histogram.
+      hist = self._latency.setdefault(record.endpoint, [0.0] * (len(self.BUCKETS) + 2))
+      for i, bound in enumerate(self.BUCKETS):
+        if record.latency <= bound:
+          hist[i] += 1
+      hist[-2] += record.latency
+      hist[-1] += 1
+      self._totals[("response_bytes", record.endpoint)] += record.bytes
+      self._totals[("retries", record.endpoint)] += record.retries
+      self._totals[("queue_wait_seconds", record.endpoint)] += record.queue_wait
+      self._totals[("decode_seconds", record.endpoint)] += record.decode
+
+  def exposition(self) -> str:
+    p = self.prefix
+    lines = [f"# TYPE {p}_requests_total counter"]
+    with self._lock:
+      for (endpoint, cache, status), n in sorted(self._requests.items()):
+        lines.append(
+          f'{p}_requests_total{{endpoint="{endpoint}",cache="{cache}",status="{status}"}} {n}')
+      lines.append(f"# TYPE {p}_request_seconds histogram")
+      for endpoint, hist in sorted(self._latency.items()):
+        for bound, n in zip(self.BUCKETS, hist):
+          lines.append(f'{p}_request_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {n:g}')
+        lines.append(f'{p}_request_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {hist[-1]:g}')
+        lines.append(f'{p}_request_seconds_sum{{endpoint="{endpoint}"}} {hist[-2]:g}')
+        lines.append(f'{p}_request_seconds_count{{endpoint="{endpoint}"}} {hist[-1]:g}')
+      for name in ("response_bytes", "retries", "queue_wait_seconds", "decode_seconds"):
+        lines.append(f"# TYPE {p}_{name}_total counter")
+        for (metric, endpoint), value in sorted(self._totals.items()):
+          if metric == name:
+            lines.append(f'{p}_{name}_total{{endpoint="{endpoint}"}} {value:g}')
+      lines.append(f"# TYPE {p}_phase_seconds_total counter")
+      for name, value in sorted(self._phases.items()):
+        lines.append(f'{p}_phase_seconds_total{{phase="{name}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+
+class OpenTelemetrySpans():
+  """
+  Hook turning records into OpenTelemetry spans, under the current span of
+  the thread which made the call. Requires opentelemetry-api.
+  """
+
+  def __init__(self, tracer=None) -> None:
+    if otel_trace is None:
+      raise ImportError(
+        "OpenTelemetry spans require opentelemetry-api. Install it with `pip install opentelemetry-api`.")
+    self.tracer = tracer or otel_trace.get_tracer(__name__)
+
+  def __call__(self, record: Record) -> None:
+    start = int(record.start * 1e9)
+    if isinstance(record, Phase):
+      span = self.tracer.start_span(record.name, start_time=start)
+      span.end(end_time=start + int(record.duration * 1e9))
+      return
+    span = self.tracer.start_span(
+      f"{record.method} {record.endpoint}",
+      kind=otel_trace.SpanKind.CLIENT,
+      start_time=start,
+      attributes={
+        "http.method": record.method,
+        "http.status_code": record.status or 0,
+        "tmdb.endpoint": record.endpoint,
+        "tmdb.cache": record.cache,
+        "tmdb.retries": record.retries,
+        "tmdb.response_bytes": record.bytes,
+        "tmdb.queue_wait": record.queue_wait,
+        "tmdb.decode": record.decode,
+      })
+    if record.error is not None:
+      span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, record.error))
+    span.end(end_time=start + int(record.latency * 1e9))
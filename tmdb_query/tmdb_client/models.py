@@ -0,0 +1,203 @@
+"""
+Compact records for the parts of API responses this project uses.
+
+Responses are plain JSON dicts holding many fields we never read. These
+records are parsed once from them and keep only a few fields, in __slots__,
+which is much lighter than dicts for large credit lists and result pages.
+Plain classes rather than dataclasses, since slotted dataclasses require
+Python 3.10.
+"""
+from typing import Any, Callable, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class Record():
+  """
+  Base of the records: equality, repr and dict conversion over __slots__.
+  """
+  __slots__ = ()
+
+  def __eq__(self, other: Any) -> bool:
+    if type(other) is not type(self):
+      return NotImplemented
+    return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+  def __repr__(self) -> str:
+    fields = ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__)
+    return f"{type(self).__name__}({fields})"
+
+  def to_dict(self) -> Dict:
+    return {k: getattr(self, k) for k in self.__slots__}
+
+
+class MovieSummary(Record):
+  """
+  A movie, as found in Discover and search results, or in the movie credits
+  of a person.
+  """
+  __slots__ = ("id", "title", "release_date")
+
+  def __init__(self, id: int, title: Optional[str] = None, release_date: str = "") -> None:
+    self.id = id
+    self.title = title
+    self.release_date = release_date
+
+  @classmethod
+  def from_json(cls, entry: Dict) -> "MovieSummary":
+    return cls(int(entry["id"]), entry.get("title"), entry.get("release_date") or "")
+
+  def sort_key(self) -> Tuple[bool, str]:
+    """Release date order, undated movies last."""
+    return (not self.release_date, self.release_date)
+
+
+class MediaSummary(Record):
+  """
+  A movie or a TV show, as found in the combined credits of a person.
+  """
+  __slots__ = ("media_type", "id", "title", "date")
+
+  def __init__(self, media_type: str, id: int, title: Optional[str] = None, date: str = "") -> None:
+    self.media_type = media_type
+    self.id = id
+    self.title = title
+    # Release date of a movie, first air date of a show.
+    self.date = date
+
+  @classmethod
+  def from_json(cls, entry: Dict, media_type: str = "movie") -> "MediaSummary":
+    """
+    Args:
+      entry: dict. A credit or result entry.
+      media_type: str. Media type of entries without one, e.g. "tv" for the
+        results of Discover.tv().
+    """
+    media_type = entry.get("media_type", media_type)
+    if media_type == "tv":
+      return cls(media_type, int(entry["id"]), entry.get("name"), entry.get("first_air_date") or "")
+    return cls(media_type, int(entry["id"]), entry.get("title"), entry.get("release_date") or "")
+
+  @property
+  def key(self) -> Tuple[str, int]:
+    """Movies and shows have separate id spaces."""
+    return (self.media_type, self.id)
+
+  def sort_key(self) -> Tuple[bool, str]:
+    """Release or first air date order, undated ones last."""
+    return (not self.date, self.date)
+
+  def label(self) -> str:
+    """
+    >>> MediaSummary("tv", 1668, "Friends", "1994-09-22").label()
+    'Friends (TV, 1994-09-22)'
+    >>> MediaSummary("movie", 603, "The Matrix").label()
+    'The Matrix'
+    """
+    details = ", ".join(filter(None, ("TV" if self.media_type == "tv" else "", self.date)))
+    return f"{self.title} ({details})" if details else f"{self.title}"
+
+
+class CastCredit(Record):
+  """
+  A cast member of a movie or TV show credits response.
+  """
+  __slots__ = ("id", "name", "known_for_department", "character")
+
+  def __init__(
+    self,
+    id: int,
+    name: Optional[str] = None,
+    known_for_department: Optional[str] = None,
+    character: Optional[str] = None) -> None:
+    self.id = id
+    self.name = name
+    self.known_for_department = known_for_department
+    self.character = character
+
+  @classmethod
+  def from_json(cls, entry: Dict) -> "CastCredit":
+    return cls(
+      int(entry["id"]), entry.get("name"), entry.get("known_for_department"), entry.get("character"))
+
+  @property
+  def is_actor(self) -> bool:
+    return self.known_for_department == "Acting"
+
+
+class PersonSummary(Record):
+  """
+  A person, as found in search results.
+  """
+  __slots__ = ("id", "name", "known_for_department", "popularity", "known_for")
+
+  def __init__(
+    self,
+    id: int,
+    name: Optional[str] = None,
+    known_for_department: Optional[str] = None,
+    popularity: float = 0.0,
+    known_for: Tuple[str, ...] = ()) -> None:
+    self.id = id
+    self.name = name
+    self.known_for_department = known_for_department
+    self.popularity = popularity
+    # Titles of the movies and shows the person is known for.
+    self.known_for = known_for
+
+  @classmethod
+  def from_json(cls, entry: Dict) -> "PersonSummary":
+    return cls(
+      int(entry["id"]),
+      entry.get("name"),
+      entry.get("known_for_department"),
+      entry.get("popularity") or 0.0,
+      tuple(filter(None, (_known_title(k) for k in entry.get("known_for", [])))))
+
+  @property
+  def is_actor(self) -> bool:
+    return self.known_for_department == "Acting"
+
+
+def _known_title(known_for: Any) -> Optional[str]:
+  """
+  Title of a known_for entry: movies have a title, TV shows a name. Titles
+  already extracted, as output by PersonSummary.to_dict(), are kept.
+  """
+  if isinstance(known_for, str):
+    return known_for
+  return known_for.get("title") or known_for.get("name")
+
+
+class Page(Record, Generic[T]):
+  """
+  One page of a paginated response, with its results parsed.
+  """
+  __slots__ = ("page", "total_pages", "total_results", "results")
+
+  def __init__(self, page: int, total_pages: int, total_results: int, results: List[T]) -> None:
+    self.page = page
+    self.total_pages = total_pages
+    self.total_results = total_results
+    self.results = results
+
+  @classmethod
+  def from_json(cls, response: Dict, parse: Callable[[Dict], T]) -> "Page[T]":
+    """
+    Args:
+      response: dict. A paginated response.
+      parse: callable. Parses each entry of "results", e.g. MovieSummary.from_json.
+    """
+    return cls(
+      int(response.get("page", 1)),
+      int(response.get("total_pages", 1)),
+      int(response.get("total_results", 0)),
+      parse_all(response.get("results", []), parse))
+
+
+def parse_all(entries: Iterable[Dict], parse: Callable[[Dict], T]) -> List[T]:
+  """
+  Returns:
+    The parsed entries, skipping those without an id.
+  """
+  return [parse(e) for e in entries if e.get("id")]
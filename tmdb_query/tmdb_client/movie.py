@@ -13,6 +13,7 @@ class Movie(TMDB):
     "details": ("/{id}", "GET"),
     "credits": ("/{id}/credits", "GET"),
   }
+  APPENDABLE = ("credits",)
 
   def __init__(self, id = None) -> None:
       super().__init__()
@@ -54,8 +55,11 @@ class TV(TMDB):
   BASE_PATH = "tv"
   SUB_PATH = {
     "details": ("/{id}", "GET"),
-    "credits": ("/{id}/credits", "GET")
+    "credits": ("/{id}/credits", "GET"),
+    "aggregate_credits": ("/{id}/aggregate_credits", "GET"),
+    "season_credits": ("/{id}/season/{season_number}/credits", "GET"),
   }
+  APPENDABLE = ("credits", "aggregate_credits")
 
   def __init__(self, id = None) -> None:
       super().__init__()
@@ -85,3 +89,33 @@ class TV(TMDB):
       JSON response as a dict.
     """
     return self._get("credits", **kwargs)
+
+  def aggregate_credits(self, **kwargs) -> Dict:
+    """
+    Get the cast and crew of every season of a TV show, rather than only the
+    latest one like credits(). Each cast member lists their roles and total
+    episode count.
+    Docs @ https://developers.themoviedb.org/3/tv/get-tv-aggregate-credits
+
+    Kwargs:
+      language: str (optional).
+    Returns:
+      JSON response as a dict.
+    """
+    return self._get("aggregate_credits", **kwargs)
+
+  def season_credits(self, season_number: int, **kwargs) -> Dict:
+    """
+    Get the cast and crew of one season of a TV show.
+    Docs @ https://developers.themoviedb.org/3/tv-seasons/get-tv-season-credits
+
+    Args:
+      season_number: int. 0 for specials.
+    Kwargs:
+      language: str (optional).
+    Returns:
+      JSON response as a dict. Its "id" is the season's, not the show's.
+    """
+    path, method = self._get_route("season_credits", season_number=season_number)
+    fields = kwargs.pop("fields", None)
+    return self._call_api(path, method, params=kwargs, fields=fields)
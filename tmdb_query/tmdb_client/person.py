@@ -1,5 +1,6 @@
-from typing import Dict
+from typing import Dict, Iterator
 from .tmdb import TMDB
+from .models import Page, PersonSummary
 
 
 class Person(TMDB):
@@ -14,7 +15,9 @@ class Person(TMDB):
     "combined_credits": ("/{id}/combined_credits", "GET"),
     "movie_credits": ("/{id}/movie_credits", "GET"),
     "tv_credits": ("/{id}/tv_credits", "GET"),
+    "popular": ("/popular", "GET"),
   }
+  APPENDABLE = ("combined_credits", "movie_credits", "tv_credits")
 
   def __init__(self, id=None) -> None:
     super().__init__()
@@ -56,3 +59,41 @@ class Person(TMDB):
       JSON response as a dict.
     """
     return self._get("movie_credits", **kwargs)
+
+  def tv_credits(self, **kwargs) -> Dict:
+    """
+    Get the TV show credits for a person.
+    Docs @ https://developers.themoviedb.org/3/people/get-person-tv-credits
+
+    Kwargs:
+      language: str (optional).
+    Return:
+      JSON response as a dict.
+    """
+    return self._get("tv_credits", **kwargs)
+
+  def popular(self, **kwargs) -> Page[PersonSummary]:
+    """
+    Get the list of popular people, updated daily.
+    Docs @ https://developers.themoviedb.org/3/people/get-popular-people
+
+    Kwargs:
+      language: str (optional).
+      page: int (optional).
+      all_pages: bool (optional). Fetch and merge all pages of results.
+    Returns:
+      A Page of PersonSummary.
+    """
+    return Page.from_json(self._get("popular", **kwargs), PersonSummary.from_json)
+
+  def iter_popular(self, prefetch: int = 1, **kwargs) -> Iterator[PersonSummary]:
+    """
+    Popular people, most popular first, lazily page by page.
+    Args:
+      prefetch: int. Number of pages fetched ahead while results are consumed.
+    Kwargs:
+      See popular().
+    Returns:
+      An iterator of PersonSummary.
+    """
+    return self._iter_results("popular", PersonSummary.from_json, prefetch=prefetch, **kwargs)
@@ -0,0 +1,268 @@
+"""
+Client-side rate limiting and retries shared by every TMDB resource.
+
+A token bucket spaces requests out to RATE_LIMIT requests per second, with
+bursts of up to RATE_BURST requests. Failed requests are retried by the
+retry scheduler:
+
+  HTTP 429: wait for the Retry-After delay, and pause every other request
+    of the process for as long.
+  HTTP 5xx and connection errors: jittered exponential backoff.
+
+Both the blocking and the async clients go through the same limiter, which
+only computes delays so that callers may sleep the way they need to.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Mapping, Optional
+from logging import getLogger
+log = getLogger(__name__)
+
+from . import RATE_LIMIT, RATE_BURST, MAX_RETRIES, MAX_RETRY_AFTER
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class TokenBucket():
+  """
+  Thread-safe token bucket, implemented as a generic cell rate algorithm:
+  each reservation pushes back the theoretical arrival time of the next
+  request by 1/rate seconds.
+  """
+
+  def __init__(self, rate: float, burst: int = 1) -> None:
+    """
+    Args:
+      rate: float. Sustained requests per second. 0 disables the limit.
+      burst: int. Number of requests allowed at once after an idle period.
+    """
+    self.rate = rate
+    self.burst = max(burst, 1)
+    self._tat = 0.0
+    self._paused_until = 0.0
+    self._lock = threading.Lock()
+
+  def reserve(self) -> float:
+    """
+    Reserve a slot for one request.
+    Returns:
+      The number of seconds to wait before sending the request.
+    """
+    if self.rate <= 0 and not self._paused_until:
+      return 0.0
+    with self._lock:
+      now = time.monotonic()
+      start = max(now, self._paused_until)
+      if self.rate > 0:
+        interval = 1.0 / self.rate
+        tat = max(self._tat, now)
+        start = max(start, tat - interval * (self.burst - 1))
+        self._tat = max(tat, start) + interval
+      return start - now
+
+  def acquire(self) -> float:
+    """
+    Block until a request may be sent.
+    Returns:
+      The number of seconds waited.
+    """
+    wait = self.reserve()
+    if wait > 0:
+      time.sleep(wait)
+    return wait
+
+  def pause(self, seconds: float) -> None:
+    """Hold every request back for the next seconds."""
+    with self._lock:
+      self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def endpoint_template(endpoint: str) -> str:
+  """
+  >>> endpoint_template("movie/603/credits")
+  'movie/{id}/credits'
+  """
+  return re.sub(r"(^|/)\d+(?=/|$)", r"\1{id}", endpoint.strip("/"))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+  """
+  Args:
+    value: str. A Retry-After header, either seconds or an HTTP date.
+  Returns:
+    The delay in seconds, or None if missing or invalid.
+  """
+  if not value:
+    return None
+  try:
+    return max(float(value), 0.0)
+  except ValueError:
+    pass
+  # Rarely used, and slow to import.
+  from email.utils import parsedate_to_datetime
+  try:
+    return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+  except (TypeError, ValueError):
+    return None
+
+
+class RetryScheduler():
+  """
+  Decide whether and when to retry a request, and count retries per
+  endpoint template (e.g. "movie/{id}/credits").
+  """
+
+  def __init__(
+    self,
+    limiter: TokenBucket,
+    max_retries: int = MAX_RETRIES,
+    backoff_base: float = 0.5,
+    backoff_max: float = 30.0,
+    max_retry_after: float = MAX_RETRY_AFTER) -> None:
+    self.limiter = limiter
+    self.max_retries = max_retries
+    self.backoff_base = backoff_base
+    self.backoff_max = backoff_max
+    self.max_retry_after = max_retry_after
+    self.retry_counts: Counter = Counter()
+    self._lock = threading.Lock()
+
+  def backoff(self, attempt: int) -> float:
+    """Full jitter exponential backoff."""
+    return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+  def retry_delay(
+    self,
+    endpoint: str,
+    attempt: int,
+    status: Optional[int] = None,
+    headers: Optional[Mapping] = None,
+    error: Optional[Exception] = None) -> Optional[float]:
+    """
+    Args:
+      endpoint: str. Endpoint path of the request.
+      attempt: int. Number of retries already made for this request.
+      status: int <optional>. HTTP status of the response.
+      headers: mapping <optional>. Headers of the response.
+      error: exception <optional>. Connection error raised instead of a response.
+    Returns:
+      The number of seconds to wait before retrying, or None if the request
+      should not be retried.
+    """
+    if attempt >= self.max_retries:
+      return None
+    if error is not None:
+      delay = self.backoff(attempt)
+    elif status == 429:
+      delay = parse_retry_after((headers or {}).get("Retry-After"))
+      if delay is None:
+        delay = self.backoff(attempt)
+      # A server asking for minutes or hours must not stall the whole process.
+      delay = min(delay, self.max_retry_after)
+      # Everybody in the process is over the limit, not just this request.
+      self.limiter.pause(delay)
+    elif status in RETRY_STATUSES:
+      delay = self.backoff(attempt)
+    else:
+      return None
+    template = endpoint_template(endpoint)
+    with self._lock:
+      self.retry_counts[template] += 1
+    log.debug(
+      f"Retrying {endpoint} in {delay:.2f}s (attempt {attempt + 1}, "
+      f"{'error ' + repr(error) if error else 'status ' + str(status)}).")
+    return delay
+
+  def send(
+    self,
+    request: Callable[[], "requests.Response"],
+    endpoint: str,
+    stats: Optional[Dict] = None) -> "requests.Response":
+    """
+    Send a request once the rate limiter allows it, retrying as needed.
+    Args:
+      request: callable. Sends the request and returns a requests.Response.
+      endpoint: str. Endpoint path, used to count retries.
+      stats: dict <optional>. Filled with the number of "retries" made, and
+        the seconds spent waiting for the rate limiter ("queue_wait").
+    Returns:
+      The last response received. Its status is not checked.
+    """
+    import requests
+    attempt = 0
+    waited = 0.0
+    try:
+      while True:
+        waited += self.limiter.acquire()
+        try:
+          response = request()
+        except requests.ConnectionError as e:
+          delay = self.retry_delay(endpoint, attempt, error=e)
+          if delay is None:
+            raise
+        else:
+          delay = self.retry_delay(
+            endpoint, attempt, status=response.status_code, headers=response.headers)
+          if delay is None:
+            return response
+        time.sleep(delay)
+        attempt += 1
+    finally:
+      if stats is not None:
+        stats.update(retries=attempt, queue_wait=waited)
+
+
+_limiter = TokenBucket(RATE_LIMIT, RATE_BURST)
+_scheduler = RetryScheduler(_limiter)
+
+
+def configure(
+  rate: Optional[float] = None,
+  burst: Optional[int] = None,
+  max_retries: Optional[int] = None,
+  backoff_base: Optional[float] = None,
+  backoff_max: Optional[float] = None,
+  max_retry_after: Optional[float] = None) -> None:
+  """
+  Change the rate limit and retry settings of the process.
+  Args:
+    rate: float. Requests per second. 0 disables rate limiting.
+    burst: int. Number of requests allowed at once.
+    max_retries: int. Retries per request. 0 disables retries.
+    backoff_base: float. Initial backoff in seconds, doubled on each retry.
+    backoff_max: float. Maximum backoff in seconds.
+    max_retry_after: float. Maximum Retry-After delay in seconds.
+  """
+  global _limiter
+  if rate is not None or burst is not None:
+    _limiter = TokenBucket(
+      _limiter.rate if rate is None else rate,
+      _limiter.burst if burst is None else burst)
+    _scheduler.limiter = _limiter
+  if max_retries is not None:
+    _scheduler.max_retries = max_retries
+  if backoff_base is not None:
+    _scheduler.backoff_base = backoff_base
+  if backoff_max is not None:
+    _scheduler.backoff_max = backoff_max
+  if max_retry_after is not None:
+    _scheduler.max_retry_after = max_retry_after
+
+
+def get_limiter() -> TokenBucket:
+  return _limiter
+
+
+def get_scheduler() -> RetryScheduler:
+  return _scheduler
+
+
+def retry_counts() -> Dict[str, int]:
+  """
+  Returns:
+    The number of retries made so far, by endpoint template.
+  """
+  return dict(_scheduler.retry_counts)
@@ -0,0 +1,198 @@
+"""
+Refresh of the response cache from TMDB's change feeds.
+
+The cached responses of a movie, TV show or person (e.g. "movie/603",
+"movie/603/credits", "person/6384/movie_credits") only go stale when it is
+edited on TMDB. A sync reads the ids changed since the previous sync from the
+changes endpoints (see tmdb_client.changes), drops the cached responses of
+those ids, and extends the expiry of the others, which are still current.
+Keeping the cache fresh then costs a few requests per day instead of a
+refetch of every response.
+
+The credits of a person are the exception: a new cast credit is recorded as
+a change of the movie or show, not of the person. They are dropped when the
+person changes, but otherwise left to expire (and be revalidated) on their
+TTL, and never extended.
+
+  refresher = ChangeRefresher(state_path="~/.cache/tmdb_query/changes.json")
+  refresher.start(interval=6 * 60 * 60)  # Sync in a background thread.
+  ...
+  refresher.stop()
+
+Responses not covered by the change feeds (search, discover...) are left to
+expire, or to be revalidated with a conditional request.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence, Set
+from logging import getLogger
+log = getLogger(__name__)
+
+from . import cache
+
+KINDS = ("movie", "person", "tv")
+DAY = 24 * 60 * 60
+# Longest period covered by one request to the changes endpoints.
+MAX_WINDOW = 14 * DAY
+
+
+def _date(timestamp: float) -> str:
+  return time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+
+
+def _extendable(key: str, kind: str) -> bool:
+  """
+  Whether the change feed of kind covers every change of the cached response.
+  >>> _extendable("person/6384/movie_credits", "person")
+  False
+  >>> _extendable("person/6384?append_to_response=combined_credits", "person")
+  False
+  >>> _extendable("movie/603/credits", "movie")
+  True
+  """
+  if kind != "person":
+    return True
+  path, _, params = key.partition("?")
+  return not path.endswith("_credits") and "_credits" not in params
+
+
+def _key_id(key: str, kind: str) -> Optional[int]:
+  """
+  >>> _key_id("movie/603/credits?fields=cast", "movie")
+  603
+  >>> _key_id("person/popular?page=2", "person")
+  """
+  parts = key.split("?", 1)[0].split("/")
+  if len(parts) < 2 or parts[0] != kind or not parts[1].isdigit():
+    return None
+  return int(parts[1])
+
+
+class ChangeRefresher():
+  """
+  Invalidate the cached responses of the ids changed since the last sync.
+  """
+
+  def __init__(
+    self,
+    kinds: Sequence[str] = ("movie", "person"),
+    state_path: Optional[str] = None,
+    store: Optional[cache.ResponseCache] = None) -> None:
+    """
+    Args:
+      kinds: sequence of strings. Kinds of resources to sync, among KINDS.
+      state_path: str <optional>. JSON file keeping the time of the last
+        sync of each kind across runs.
+      store: ResponseCache <optional>. The cache to refresh, by default the
+        one in use when syncing.
+    """
+    for kind in kinds:
+      if kind not in KINDS:
+        raise ValueError(f"Invalid kind \"{kind}\". Expected one of {KINDS}.")
+    self.kinds = tuple(kinds)
+    self.state_path = os.path.expanduser(state_path) if state_path else None
+    self._store = store
+    self.last_sync: Dict[str, float] = {}
+    self.invalidated = 0
+    self.extended = 0
+    self._lock = threading.Lock()
+    self._stop = threading.Event()
+    self._thread: Optional[threading.Thread] = None
+    if self.state_path and os.path.exists(self.state_path):
+      with open(self.state_path, encoding="utf-8") as f:
+        self.last_sync = {k: float(v) for k, v in json.load(f).items()}
+
+  def changed_ids(self, kind: str, since: float, until: float) -> Set[int]:
+    """
+    Returns:
+      The ids of kind changed between the days of since and until.
+    """
+    from .changes import Changes
+    ids: Set[int] = set()
+    start = since
+    while True:
+      end = min(start + MAX_WINDOW, until)
+      ids.update(Changes().iter_ids(kind, start_date=_date(start), end_date=_date(end)))
+      if end >= until:
+        return ids
+      start = end
+
+  def sync(self, now: Optional[float] = None) -> Dict[str, int]:
+    """
+    Sync every kind once.
+    Returns:
+      The number of cached responses invalidated, by kind.
+    """
+    store = self._store or cache.get_cache()
+    if store is None:
+      return {}
+    now = now or time.time()
+    invalidated = {}
+    with self._lock:
+      for kind in self.kinds:
+        # Without a previous sync, expired responses are only trusted as far
+        # back as the change feeds go.
+        since = self.last_sync.get(kind, now - MAX_WINDOW)
+        changed = self.changed_ids(kind, since, now)
+        stale, current = [], {}
+        for key in store.keys(f"{kind}/"):
+          _id = _key_id(key, kind)
+          if _id is None:
+            continue
+          if _id in changed:
+            stale.append(key)
+          elif _extendable(key, kind):
+            current[key] = now + cache.get_ttl(key.split("?", 1)[0], store.ttls)
+        store.delete_many(stale)
+        store.extend_expiry(current)
+        self.last_sync[kind] = now
+        self.invalidated += len(stale)
+        self.extended += len(current)
+        invalidated[kind] = len(stale)
+        log.debug(f"Synced {kind} changes: {len(changed)} ids changed, {len(stale)} responses invalidated.")
+      self._save()
+    return invalidated
+
+  def _save(self) -> None:
+    if not self.state_path:
+      return
+    if os.path.dirname(self.state_path):
+      os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+    tmp = f"{self.state_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+      json.dump(self.last_sync, f)
+    os.replace(tmp, self.state_path)
+
+  def start(self, interval: float = DAY / 4) -> None:
+    """Sync now, then every interval seconds, in a background thread."""
+    if self._thread is not None:
+      return
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+    self._thread.start()
+
+  def _run(self, interval: float) -> None:
+    while True:
+      try:
+        self.sync()
+      except Exception as e:
+        # The API may be down: try again at the next interval.
+        log.warning(f"Change feed sync failed: {e}")
+      if self._stop.wait(interval):
+        return
+
+  def stop(self) -> None:
+    if self._thread is None:
+      return
+    self._stop.set()
+    self._thread.join()
+    self._thread = None
+
+  def stats(self) -> Dict:
+    return {
+      "last_sync": dict(self.last_sync),
+      "invalidated": self.invalidated,
+      "extended": self.extended,
+    }
@@ -1,5 +1,7 @@
-from typing import Dict
+from functools import partial
+from typing import Iterator
 from .tmdb import TMDB
+from .models import MediaSummary, MovieSummary, Page, PersonSummary
 
 
 class Search(TMDB):
@@ -13,7 +15,7 @@ class Search(TMDB):
     "person": ("/person", "GET")
   }
 
-  def movie(self, **kwargs) -> Dict:
+  def movie(self, **kwargs) -> Page[MovieSummary]:
     """
     Search for movies.
     The "query" argument will be URI-encoded.
@@ -27,14 +29,15 @@ class Search(TMDB):
       region: str (optional).
       year: int (optional).
       primary_release_year: int (optional).
+      all_pages: bool (optional). Fetch and merge the results of every page.
     Returns:
-      A JSON response as a dict.
+      A Page of MovieSummary.
     """
     if "query" not in kwargs.keys():
       raise Exception(f"Missing \"query\" parameter.")
-    return self._get("movie", **kwargs)
+    return Page.from_json(self._get("movie", **kwargs), MovieSummary.from_json)
 
-  def person(self, **kwargs) -> Dict:
+  def person(self, **kwargs) -> Page[PersonSummary]:
     """
     Search for people.
     The "query" argument will be URI-encoded.
@@ -46,12 +49,45 @@ class Search(TMDB):
       page: int (optional).
       include_adult: bool (optional).
       region: str (optional).
+      all_pages: bool (optional). Fetch and merge the results of every page.
     Returns:
-      A JSON response as a dict.
+      A Page of PersonSummary.
     """
     if "query" not in kwargs.keys():
       raise Exception(f"Missing \"query\" parameter.")
-    return self._get("person", **kwargs)
+    return Page.from_json(self._get("person", **kwargs), PersonSummary.from_json)
+
+  def iter_movie(self, prefetch: int = 1, **kwargs) -> Iterator[MovieSummary]:
+    """
+    Search for movies, lazily page by page.
+    Args:
+      prefetch: int. Number of pages fetched ahead while results are consumed.
+    Kwargs:
+      See movie().
+    Returns:
+      An iterator of MovieSummary.
+    """
+    if "query" not in kwargs.keys():
+      raise Exception(f"Missing \"query\" parameter.")
+    return self._iter_results("movie", MovieSummary.from_json, prefetch=prefetch, **kwargs)
+
+  def iter_person(self, prefetch: int = 1, **kwargs) -> Iterator[PersonSummary]:
+    """
+    Search for people, lazily page by page.
+    Args:
+      prefetch: int. Number of pages fetched ahead while results are consumed.
+    Kwargs:
+      See person().
+    Returns:
+      An iterator of PersonSummary.
+    """
+    if "query" not in kwargs.keys():
+      raise Exception(f"Missing \"query\" parameter.")
+    return self._iter_results("person", PersonSummary.from_json, prefetch=prefetch, **kwargs)
+
+
+# Discover TV results have no media type.
+TV_SUMMARY = partial(MediaSummary.from_json, media_type="tv")
 
 
 class Discover(TMDB):
@@ -66,24 +102,51 @@ class Discover(TMDB):
     "tv": ("/tv", "GET")
   }
 
-  def movie(self, **kwargs) -> Dict:
+  def movie(self, **kwargs) -> Page[MovieSummary]:
     """
     Discover movies by different types of data like average rating, number of
     votes, genres and certifications.
     Docs @ https://developers.themoviedb.org/3/discover/movie-discover
     Kwargs:
       See documentation above.
+      all_pages: bool (optional). Fetch and merge the results of every page.
     Returns:
-      A JSON response as a dict.
+      A Page of MovieSummary.
     """
-    return self._get("movie", **kwargs)
+    return Page.from_json(self._get("movie", **kwargs), MovieSummary.from_json)
 
-  def tv(self, **kwargs) -> Dict:
+  def tv(self, **kwargs) -> Page[MediaSummary]:
     """
     Docs @ https://developers.themoviedb.org/3/discover/tv-discover
     Kwargs:
       See documentation above.
+      all_pages: bool (optional). Fetch and merge the results of every page.
     Returns
-      A JSON response as a dict.
+      A Page of MediaSummary, of media type "tv".
+    """
+    return Page.from_json(self._get("tv", **kwargs), TV_SUMMARY)
+
+  def iter_movie(self, prefetch: int = 1, **kwargs) -> Iterator[MovieSummary]:
+    """
+    Discover movies, lazily page by page, so that consumers can stop early
+    without fetching the remaining pages.
+    Args:
+      prefetch: int. Number of pages fetched ahead while results are consumed.
+    Kwargs:
+      See movie().
+    Returns:
+      An iterator of MovieSummary.
+    """
+    return self._iter_results("movie", MovieSummary.from_json, prefetch=prefetch, **kwargs)
+
+  def iter_tv(self, prefetch: int = 1, **kwargs) -> Iterator[MediaSummary]:
+    """
+    Discover TV shows, lazily page by page.
+    Args:
+      prefetch: int. Number of pages fetched ahead while results are consumed.
+    Kwargs:
+      See tv().
+    Returns:
+      An iterator of MediaSummary, of media type "tv".
     """
-    return self._get("tv", **kwargs)
+    return self._iter_results("tv", TV_SUMMARY, prefetch=prefetch, **kwargs)
@@ -0,0 +1,357 @@
+"""
+Shared HTTP connection pool for all TMDB resources.
+
+Instead of opening a new TCP+TLS connection for each API call, every
+resource instance (Movie, TV, Person, Search, Discover...) goes through
+request() which sends it with the configured transport:
+
+  requests: the default. Reuses a requests.Session kept alive for the whole
+    process, or one per thread depending on the configured scope. Concurrent
+    requests each hold an HTTP/1.1 connection of the pool.
+
+    The worker threads fetching pages or batches only live for one call, so
+    with the "thread" scope each call opens new connections, closed once the
+    thread is gone. The "process" scope, the default, keeps them alive.
+  http2: multiplexes every request in flight over a single HTTP/2
+    connection per host, shared by all threads. Needs httpx[http2].
+
+Both return a requests.Response, and raise the exceptions of requests, so
+that the retries, cache and error handling above them do not depend on the
+transport.
+
+requests is only imported by the first session created, to keep the startup
+of short command line invocations fast.
+"""
+import concurrent.futures
+import threading
+import weakref
+from typing import Dict, Optional, Tuple, Type
+from logging import getLogger
+log = getLogger(__name__)
+
+from . import (
+  POOL_CONNECTIONS, POOL_MAXSIZE, SESSION_SCOPE, CONNECT_TIMEOUT, READ_TIMEOUT, TRANSPORT
+)
+
+SCOPES = ("thread", "process")
+
+_config: Dict = {
+  "pool_connections": POOL_CONNECTIONS,
+  "pool_maxsize": POOL_MAXSIZE,
+  "scope": SESSION_SCOPE,
+  "timeout": (CONNECT_TIMEOUT, READ_TIMEOUT),
+  "pooling": True,
+  "transport": TRANSPORT,
+}
+_lock = threading.Lock()
+_local = threading.local()
+_shared: Optional["requests.Session"] = None
+# Bumped on every configure() so that thread-local sessions get renewed.
+_generation = 0
+# Keep track of the sessions alive so that they can all be closed. Sessions
+# of the threads which are gone are closed and dropped from it.
+_sessions: "weakref.WeakSet[requests.Session]" = weakref.WeakSet()
+# Instance of the configured transport, created on the first request.
+_transport: Optional["Transport"] = None
+
+
+def configure(
+  pool_connections: Optional[int] = None,
+  pool_maxsize: Optional[int] = None,
+  scope: Optional[str] = None,
+  timeout: Optional[Tuple[float, float]] = None,
+  pooling: Optional[bool] = None,
+  transport: Optional[str] = None) -> None:
+  """
+  Change the connection pool settings. Existing sessions are closed so that
+  the new settings apply to the next request.
+  Args:
+    pool_connections: int. Number of host pools to cache.
+    pool_maxsize: int. Maximum number of connections kept alive per host.
+    scope: str. "thread" for one session per thread, "process" for a single
+      session shared by all threads.
+    timeout: tuple. (connect, read) timeouts in seconds.
+    pooling: bool. If False, every request uses a fresh connection.
+    transport: str. A key of TRANSPORTS, "requests" or "http2".
+  Returns:
+    None.
+  """
+  if scope is not None and scope not in SCOPES:
+    raise ValueError(f"Invalid session scope \"{scope}\". Expected one of {SCOPES}.")
+  if transport is not None and transport not in TRANSPORTS:
+    raise ValueError(
+      f"Invalid transport \"{transport}\". Expected one of {tuple(TRANSPORTS)}.")
+  updates = {
+    "pool_connections": pool_connections,
+    "pool_maxsize": pool_maxsize,
+    "scope": scope,
+    "timeout": timeout,
+    "pooling": pooling,
+    "transport": transport,
+  }
+  with _lock:
+    _config.update({k: v for k, v in updates.items() if v is not None})
+  close_sessions()
+
+
+def get_timeout() -> Tuple[float, float]:
+  return _config["timeout"]
+
+
+def new_session() -> "requests.Session":
+  """
+  Build a session with a keep-alive connection pool mounted for http and https.
+  """
+  import requests
+  from requests.adapters import HTTPAdapter
+  session = requests.Session()
+  adapter = HTTPAdapter(
+    pool_connections=_config["pool_connections"],
+    pool_maxsize=_config["pool_maxsize"],
+  )
+  session.mount("https://", adapter)
+  session.mount("http://", adapter)
+  session.headers.update({"Connection": "keep-alive"})
+  return session
+
+
+def get_session() -> "requests.Session":
+  """
+  Returns:
+    The session to use for the current thread, creating it if needed.
+  """
+  global _shared
+  if _config["scope"] == "process":
+    if _shared is None:
+      with _lock:
+        if _shared is None:
+          _shared = new_session()
+          _sessions.add(_shared)
+    return _shared
+
+  session = getattr(_local, "session", None)
+  if session is None or getattr(_local, "generation", -1) != _generation:
+    if session is not None:
+      # Already closed by configure().
+      _local.finalizer.detach()
+    session = new_session()
+    _local.session = session
+    _local.generation = _generation
+    # Close the connections of the session once the thread is gone.
+    _local.finalizer = weakref.finalize(threading.current_thread(), session.close)
+    with _lock:
+      _sessions.add(session)
+  return session
+
+
+def close_sessions() -> None:
+  """Close every pooled connection. New sessions are created on demand."""
+  global _shared, _generation, _transport
+  with _lock:
+    for session in list(_sessions):
+      session.close()
+    _sessions.clear()
+    _shared = None
+    _generation += 1
+    transport, _transport = _transport, None
+  if transport is not None:
+    transport.close()
+
+
+class Transport():
+  """
+  Sends the requests of the process. Subclasses must be safe to share
+  between threads.
+  """
+
+  def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+    """
+    Args:
+      method: str. HTTP method (GET, POST...).
+      url: str. The full URL.
+      kwargs: dict. params, data, headers and timeout, as for requests.
+    Returns:
+      A requests.Response.
+    """
+    raise NotImplementedError
+
+  def close(self) -> None:
+    pass
+
+
+class RequestsTransport(Transport):
+  """HTTP/1.1 keep-alive pools of requests, see get_session()."""
+
+  def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+    if not _config["pooling"]:
+      # Same as the module-level requests.get(): one connection per request.
+      import requests
+      with requests.Session() as session:
+        return session.request(method, url, **kwargs)
+    return get_session().request(method, url, **kwargs)
+
+
+class HTTP2Transport(Transport):
+  """
+  A single httpx client shared by all threads. Concurrent requests to a
+  host become streams of one HTTP/2 connection, a new connection being
+  opened only when the server limit of concurrent streams is reached.
+
+  The client runs on an event loop of its own thread, which the calling
+  threads hand their requests to: the HTTP/2 connections of the synchronous
+  httpx client are not safe to share between threads.
+
+  Over https, HTTP/2 is negotiated with the server (TMDB supports it). Over
+  plain http, as with a local stub server, the client speaks HTTP/2 right
+  away, without an upgrade from HTTP/1.1.
+  """
+
+  def __init__(self, max_connections: Optional[int] = None) -> None:
+    """
+    Args:
+      max_connections: int <optional>. Connections kept per host, only used
+        past the stream limit of the first one. Defaults to pool_maxsize.
+    """
+    try:
+      import httpx
+      import h2  # noqa: F401
+    except ImportError:
+      raise ImportError(
+        "The \"http2\" transport needs httpx with HTTP/2 support: "
+        "pip install 'httpx[http2]'.") from None
+    import asyncio
+    import requests
+    self._asyncio = asyncio
+    self._httpx = httpx
+    self._requests = requests
+    self._loop = asyncio.new_event_loop()
+    self._thread = threading.Thread(
+      target=self._loop.run_forever, name="tmdb-http2", daemon=True)
+    self._thread.start()
+
+    async def new_client() -> "httpx.AsyncClient":
+      return httpx.AsyncClient(
+        http1=False,
+        http2=True,
+        limits=httpx.Limits(max_connections=max_connections or _config["pool_maxsize"]),
+      )
+    self._client = self._run(new_client(), sum(get_timeout()))
+
+  def _run(self, coroutine, timeout: float):
+    """
+    Run a coroutine on the loop of the transport and wait for its result.
+    Args:
+      timeout: float. Seconds to wait for it, after which it is cancelled and
+        concurrent.futures.TimeoutError is raised.
+    """
+    future = self._asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+    try:
+      return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+      future.cancel()
+      raise
+
+  def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+    httpx = self._httpx
+    requests = self._requests
+    timeout = kwargs.get("timeout") or get_timeout()
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    # Waiting for a connection of the pool, connecting, then reading, plus
+    # some slack: only reached if the loop itself is stuck.
+    deadline = connect + 2 * read + 1
+    try:
+      response = self._run(self._client.request(
+        method,
+        url,
+        params=_query_params(kwargs.get("params")),
+        content=kwargs.get("data"),
+        headers=kwargs.get("headers"),
+        timeout=httpx.Timeout(read, connect=connect),
+      ), deadline)
+    except concurrent.futures.TimeoutError as e:
+      raise requests.ReadTimeout(f"No response from the HTTP/2 transport after {deadline}s.") from e
+    # Raised as their requests counterparts, which callers handle and retry.
+    except httpx.ConnectTimeout as e:
+      raise requests.ConnectTimeout(str(e)) from e
+    except httpx.TimeoutException as e:
+      raise requests.ReadTimeout(str(e)) from e
+    except httpx.TransportError as e:
+      raise requests.ConnectionError(str(e)) from e
+    return self._to_requests(response)
+
+  def _to_requests(self, response: "httpx.Response") -> "requests.Response":
+    from requests.structures import CaseInsensitiveDict
+    converted = self._requests.Response()
+    converted.status_code = response.status_code
+    converted.reason = response.reason_phrase
+    converted.url = str(response.url)
+    converted.headers = CaseInsensitiveDict(response.headers)
+    converted.encoding = response.encoding
+    converted.elapsed = response.elapsed
+    converted._content = response.content
+    return converted
+
+  def close(self) -> None:
+    try:
+      self._run(self._client.aclose(), sum(get_timeout()))
+    finally:
+      self._loop.call_soon_threadsafe(self._loop.stop)
+      self._thread.join(sum(get_timeout()))
+    if not self._thread.is_alive():
+      self._loop.close()
+
+
+# Available transports, by name.
+TRANSPORTS: Dict[str, Type[Transport]] = {
+  "requests": RequestsTransport,
+  "http2": HTTP2Transport,
+}
+
+
+def _query_params(params: Optional[Dict]) -> Optional[Dict]:
+  """
+  Format query parameters as requests does: str() of each value, None
+  values left out. httpx would send booleans as "true" and "false".
+  """
+  if params is None:
+    return None
+  return {
+    k: [str(x) for x in v] if isinstance(v, (list, tuple)) else str(v)
+    for k, v in params.items() if v is not None
+  }
+
+
+def get_transport() -> Transport:
+  """
+  Returns:
+    The transport configured for the process, creating it if needed.
+  """
+  global _transport
+  transport = _transport
+  if transport is None:
+    with _lock:
+      if _transport is None:
+        name = _config["transport"]
+        if name not in TRANSPORTS:
+          raise ValueError(
+            f"Invalid transport \"{name}\". Expected one of {tuple(TRANSPORTS)}.")
+        _transport = TRANSPORTS[name]()
+      transport = _transport
+  return transport
+
+
+def request(method: str, url: str, **kwargs) -> "requests.Response":
+  """
+  Send a request with the configured transport, through the pooled
+  connections of the current thread or the shared HTTP/2 connection.
+  Args:
+    method: str. HTTP method (GET, POST...).
+    url: str. The full URL.
+    kwargs: dict. Any keyword argument accepted by requests.Session.request.
+      Only params, data, headers and timeout are supported by the "http2"
+      transport.
+  Returns:
+    A requests.Response.
+  """
+  kwargs.setdefault("timeout", get_timeout())
+  return get_transport().request(method, url, **kwargs)
@@ -0,0 +1,115 @@
+"""
+Deduplication of identical requests in flight.
+
+When several threads (or coroutines) ask for the same GET request at the
+same time, only the first one sends it and the others wait for its result.
+This sits below the response cache, so it also covers cold-start bursts,
+e.g. actors sharing movies whose credits are all fetched at once.
+"""
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight():
+  """
+  Thread-safe single-flight group.
+  """
+
+  def __init__(self) -> None:
+    self._calls: Dict[Hashable, Future] = {}
+    self._lock = threading.Lock()
+    # Number of calls actually made, and of callers who shared another's call.
+    self.executed = 0
+    self.coalesced = 0
+
+  def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+    """
+    Call fn, unless a call with the same key is already in flight, in which
+    case wait for that call instead.
+    Args:
+      key: hashable. Identifies identical calls.
+      fn: callable. The call to make.
+    Returns:
+      The result of fn, or of the call in flight. Exceptions are shared too.
+    """
+    with self._lock:
+      future = self._calls.get(key)
+      leader = future is None
+      if leader:
+        future = self._calls[key] = Future()
+        self.executed += 1
+      else:
+        self.coalesced += 1
+    if not leader:
+      return future.result()
+
+    try:
+      result = fn()
+    except BaseException as e:
+      future.set_exception(e)
+      raise
+    else:
+      future.set_result(result)
+      return result
+    finally:
+      with self._lock:
+        del self._calls[key]
+
+  def stats(self) -> Dict[str, int]:
+    return {"executed": self.executed, "coalesced": self.coalesced}
+
+
+class AsyncSingleFlight():
+  """
+  Single-flight group for coroutines of one event loop.
+  """
+
+  def __init__(self) -> None:
+    self._calls: Dict[Hashable, "asyncio.Future"] = {}
+    self.executed = 0
+    self.coalesced = 0
+
+  async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+    """
+    Await fn(), unless a call with the same key is already in flight, in
+    which case await that call instead.
+    """
+    # Only the async client needs asyncio, which is slow to import.
+    import asyncio
+    future = self._calls.get(key)
+    if future is not None:
+      self.coalesced += 1
+      # Shield it: cancelling a follower must not cancel the shared call.
+      return await asyncio.shield(future)
+
+    self.executed += 1
+    future = self._calls[key] = asyncio.ensure_future(fn())
+    try:
+      return await asyncio.shield(future)
+    finally:
+      if future.done():
+        del self._calls[key]
+      else:
+        future.add_done_callback(lambda _: self._calls.pop(key, None))
+
+  def stats(self) -> Dict[str, int]:
+    return {"executed": self.executed, "coalesced": self.coalesced}
+
+
+_flights = SingleFlight()
+
+
+def get_flights() -> SingleFlight:
+  return _flights
+
+
+def stats() -> Dict[str, int]:
+  """
+  Returns:
+    The number of requests sent, and of requests which shared an identical
+    request in flight instead, for the blocking client.
+  """
+  return _flights.stats()
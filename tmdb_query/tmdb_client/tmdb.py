@@ -1,10 +1,28 @@
-from typing import Optional, Dict, Tuple
-import requests
+from typing import Callable, Iterable, Iterator, Optional, Dict, List, Tuple, TypeVar
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from string import Formatter
 from json import dumps
+import time
 from logging import getLogger
 log = getLogger(__name__)
 
-from . import API_KEY, API_BASE_URL, API_VERSION
+from . import API_KEY, API_BASE_URL, API_VERSION, PAGE_WORKERS, BATCH_WORKERS, check_api_key
+from . import session, cache, cassette, codec, instrument, ratelimit, singleflight
+from .models import parse_all
+
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=None)
+def _path_fields(path: str) -> Tuple[str, ...]:
+  """
+  >>> _path_fields("person/{id}/movie_credits")
+  ('id',)
+  """
+  return tuple(field for _, field, _, _ in Formatter().parse(path) if field)
 
 
 class TMDB():
@@ -13,23 +31,59 @@ class TMDB():
   # (GET, POST, DELETE, etc.) to be used to retrieve the info via 
   # the API: (info_type, method_type)
   SUB_PATH: Dict[str, Tuple[str, str]] = {}
+  # The API never returns more pages than this.
+  MAX_PAGES = 500
+  # Keys of SUB_PATH which can be merged into a "details" request with the
+  # append_to_response parameter.
+  APPENDABLE: Tuple[str, ...] = ()
 
   def __init__(self) -> None:
       self.base_url = API_BASE_URL
       self.base_url = f"{self.base_url}/{API_VERSION}"
+      # Sub-resources to fetch along with the next "details" request.
+      self._pending = set()
+      # Sub-resources received with a "details" response, by cache key, each
+      # handed out once to the matching method of this object.
+      self._appended: Dict[str, Dict] = {}
 
   def _get_sub_path(self, key) -> str:
     return self.BASE_PATH + self.SUB_PATH[key][0]
   
   def _set_val_as_attrs(self, response) -> None:
-    """Assign response values as object attributes."""
+    """
+    Assign the fields of a details response as object attributes, e.g.
+    person.name. Only kept for compatibility: other responses are returned
+    without being copied onto the object.
+    """
     if isinstance(response, dict):
       for key in response.keys():
         # Avoid overwriting methods, but allow overwriting any other attr
-        if hasattr(self, key) and callable(getattr(self, key)):
+        if callable(getattr(type(self), key, None)):
           continue
         setattr(self, key, response[key])
 
+  def _get_route(self, info_type, **fields) -> Tuple[str, str]:
+    """
+    Args:
+      info_type: str. A key of SUB_PATH.
+      fields: dict. Values of placeholders which are not attributes of this
+        object, e.g. season_number.
+    Returns:
+      A tuple of the endpoint path, with its placeholders filled in, and the
+      HTTP method to use.
+    """
+    if info_type not in self.SUB_PATH.keys():
+      raise Exception("Not a valid info type.")
+
+    path = self._get_sub_path(info_type)
+    # Replace placeholders with the attribute of the same name. Only the
+    # placeholders are looked up, whatever the responses stored on self.
+    path = path.format_map({
+      key: fields[key] if key in fields else getattr(self, key) for key in _path_fields(path)
+    })
+
+    return path, self.SUB_PATH[info_type][1]
+
   def _get(self, info_type, **kwargs) -> Dict:
     """
     Generic method to fetch a type of info, with optional payload depending
@@ -38,55 +92,400 @@ class TMDB():
     Args:
       info_type: str.
       payload: dict. Optional data for POST, DELETE http methods.
+      fields: iterable of strings. Only decode and keep these fields of the
+        response, e.g. ("cast[].id",). See tmdb_client.codec.
+      all_pages: bool. For paginated results, fetch every page and merge
+        their "results" in order.
       kwargs: dict. Any valid keyword argument for a given query.
     Returns:
       A response as a JSON dict.
     """
-    if info_type not in self.SUB_PATH.keys():
-      raise Exception("Not a valid info type.")
+    if self._pending and (info_type == "details" or info_type in self._pending):
+      return self._get_coalesced(info_type, **kwargs)
 
-    path = self._get_sub_path(info_type)
-    # Replace placeholders with attribute value of the same key name.
-    attr_map = {}
-    for key in self.__dict__.keys():
-      if not callable(getattr(self, key)):
-        attr_map[key] = getattr(self, key)
-    path = path.format_map(attr_map)
-
-    method = self.SUB_PATH[info_type][1]
-    
+    path, method = self._get_route(info_type)
     # Some methods may require a request body:
     payload = kwargs.pop("payload", None)
-    res = self._call_api(path, method, params=kwargs, data=payload)
-    self._set_val_as_attrs(res)
+    fields = kwargs.pop("fields", None)
+    appended = self._appended.pop(cache.cache_key(path, kwargs), None)
+    if appended is not None:
+      res = codec.project(appended, fields) if fields else appended
+    elif kwargs.pop("all_pages", False):
+      res = self._merge_pages(self._get_pages(path, method, params=kwargs))
+      res = codec.project(res, fields) if fields else res
+    else:
+      res = self._call_api(path, method, params=kwargs, data=payload, fields=fields)
+    if info_type == "details":
+      self._spread_appended(res, kwargs)
+      self._set_val_as_attrs(res)
     return res
 
+  def coalesce(self, *info_types: str) -> "TMDB":
+    """
+    Fetch the given sub-resources along with the details, in a single
+    details?append_to_response=... request sent on the first call to any of
+    them. The other methods then return their part of the response without
+    another request.
+
+    >>> person = Person(6384).coalesce("movie_credits", "combined_credits")
+    >>> person.details()  # One request.
+    >>> person.movie_credits()  # No request.
+    Args:
+      info_types: str. Keys of APPENDABLE.
+    Returns:
+      This object.
+    """
+    for info_type in info_types:
+      if info_type not in self.APPENDABLE:
+        raise Exception(f"\"{info_type}\" cannot be appended to the details.")
+    self._pending.update(info_types)
+    return self
+
+  def _get_coalesced(self, info_type, **kwargs) -> Dict:
+    parts = self._pending | ({info_type} - {"details"})
+    self._pending = set()
+    if extra := kwargs.pop("append_to_response", ""):
+      parts.update(p for p in extra.split(",") if p)
+    details = self._get("details", append_to_response=",".join(sorted(parts)), **kwargs)
+    if info_type == "details":
+      return details
+    return self._get(info_type, **kwargs)
+
+  def _spread_appended(self, res: Dict, params: Dict) -> None:
+    """
+    Split the sub-resources appended to a details response so that the
+    matching methods of this object can use them without a request.
+    Other objects with the same id get them from the response cache, if
+    enabled, where they expire no later than the details response: they
+    are only as fresh as it is, and revalidating or invalidating it (see
+    tmdb_client.refresh) must not leave them behind.
+    """
+    store = cache.get_cache()
+    parent = None
+    if store is not None and self.APPENDABLE:
+      parent = store.get_with_expiry(cache.cache_key(self._get_route("details")[0], params))
+    params = {k: v for k, v in params.items() if k != "append_to_response"}
+    for part in self.APPENDABLE:
+      if isinstance(res.get(part), dict):
+        path = self._get_route(part)[0]
+        key = cache.cache_key(path, params)
+        self._appended[key] = res[part]
+        if parent is not None:
+          expires = min(parent[1], time.time() + cache.get_ttl(path, store.ttls))
+          store.set_with_expiry(key, res[part], expires)
+
+  @classmethod
+  def batch_details(
+    cls,
+    ids: Iterable[int],
+    append_to_response: Iterable[str] = (),
+    **kwargs) -> Dict[int, "TMDB"]:
+    """
+    Fetch the details of many resources of this class concurrently, each with
+    the given sub-resources appended.
+    Args:
+      ids: iterable. TMDB ids.
+      append_to_response: iterable. Keys of APPENDABLE to fetch in the same request.
+      kwargs: dict. Any valid keyword argument for the details query.
+    Returns:
+      A dictionary of {id: resource object}.
+    """
+    ids = list(dict.fromkeys(ids))
+    append_to_response = tuple(append_to_response)
+
+    def fetch(_id: int) -> "TMDB":
+      resource = cls(_id)
+      resource.coalesce(*append_to_response)
+      resource.details(**kwargs)
+      return resource
+
+    if not ids:
+      return {}
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(ids))) as pool:
+      return dict(zip(ids, pool.map(instrument.bind(fetch), ids)))
+
+  def _get_pages(self, endpoint, method: str, params: Dict) -> List[Dict]:
+    """
+    Fetch the first page to learn "total_pages", then fetch the remaining
+    pages concurrently over a bounded pool of PAGE_WORKERS threads.
+    Args:
+      endpoint: str. Path of a paginated endpoint.
+      method: str. HTTP method.
+      params: dict. Query parameters. "page" is the first page to fetch.
+    Returns:
+      A list of page responses, in page order.
+    """
+    start = int(params.get("page", 1))
+    first = self._call_api(endpoint, method, params=dict(params, page=start))
+    last = min(int(first.get("total_pages", 1)), self.MAX_PAGES)
+    remaining = range(start + 1, last + 1)
+    if not remaining:
+      return [first]
+
+    def fetch(page: int) -> Dict:
+      return self._call_api(endpoint, method, params=dict(params, page=page))
+
+    with ThreadPoolExecutor(max_workers=min(PAGE_WORKERS, len(remaining))) as pool:
+      # map() keeps the page order, hence the sort order of the results.
+      return [first] + list(pool.map(instrument.bind(fetch), remaining))
+
+  @staticmethod
+  def _merge_pages(pages: List[Dict]) -> Dict:
+    """
+    Returns:
+      The last page response, with the results of every page in order.
+    """
+    merged = dict(pages[-1])
+    merged["results"] = [r for page in pages for r in page.get("results", [])]
+    return merged
+
+  def _iter_pages(self, info_type, prefetch: int = 1, **kwargs) -> Iterator[Dict]:
+    """
+    Lazily fetch the pages of a paginated result, in order. Unlike _get(),
+    nothing is kept on this object, and pages which are not consumed are not
+    fetched (except for those being prefetched).
+    Args:
+      info_type: str. A key of SUB_PATH.
+      prefetch: int. Number of pages fetched ahead in the background while
+        the current one is consumed. 0 fetches each page on demand.
+      kwargs: dict. Query parameters. "page" is the first page to fetch.
+    Returns:
+      An iterator of page responses.
+    """
+    path, method = self._get_route(info_type)
+
+    def fetch(page: int) -> Dict:
+      return self._call_api(path, method, params=dict(kwargs, page=page))
+
+    start = int(kwargs.get("page", 1))
+    first = fetch(start)
+    last = min(int(first.get("total_pages", 1)), self.MAX_PAGES)
+    pages = iter(range(start + 1, last + 1))
+    if prefetch <= 0 or last <= start:
+      yield first
+      for page in pages:
+        yield fetch(page)
+      return
+
+    pool = ThreadPoolExecutor(max_workers=prefetch)
+    fetch = instrument.bind(fetch)
+    ahead = deque()
+    try:
+      ahead.extend(pool.submit(fetch, page) for page in islice(pages, prefetch))
+      yield first
+      while ahead:
+        response = ahead.popleft().result()
+        ahead.extend(pool.submit(fetch, page) for page in islice(pages, 1))
+        yield response
+    finally:
+      # The consumer may stop early: drop the pages not started yet. Not
+      # with shutdown(cancel_futures=True), which requires Python 3.9.
+      for future in ahead:
+        future.cancel()
+      pool.shutdown(wait=False)
+
+  def _iter_results(
+    self,
+    info_type,
+    parse: Optional[Callable[[Dict], T]] = None,
+    prefetch: int = 1,
+    **kwargs) -> Iterator:
+    """
+    Args:
+      parse: callable <optional>. Parses each entry, e.g.
+        MovieSummary.from_json. Entries without an id are then skipped.
+    Returns:
+      An iterator of the "results" entries of every page, see _iter_pages().
+    """
+    for page in self._iter_pages(info_type, prefetch=prefetch, **kwargs):
+      results = page.get("results", [])
+      yield from results if parse is None else parse_all(results, parse)
+
   def _call_api(
     self,
     endpoint, 
     method: str, 
     params={}, 
-    data: Optional[Dict] = None) -> Dict:
+    data: Optional[Dict] = None,
+    fields: Optional[Iterable[str]] = None) -> Dict:
     """
     Args:
       method: str. Get, Post, Delete...
       params: dict. Key-value parameters for the URL
       data: dict <optional>. Payload to send with POST or DELETE HTTP methods.
+      fields: iterable of strings <optional>. Fields of the response to keep.
     Returns:
       A response as a JSON dict.
     """
+    call = instrument.start_call(endpoint, method)
+    if call is None:
+      return self._get_response(endpoint, method, params, data, fields)
+    start = time.perf_counter()
+    try:
+      return self._get_response(endpoint, method, params, data, fields, call)
+    except Exception as e:
+      call.error = f"{type(e).__name__}: {e}"
+      raise
+    finally:
+      call.latency = time.perf_counter() - start
+      instrument.emit(call)
+
+  def _get_response(
+    self,
+    endpoint,
+    method: str,
+    params: Dict,
+    data: Optional[Dict] = None,
+    fields: Optional[Iterable[str]] = None,
+    call: Optional[instrument.Call] = None) -> Dict:
+    """
+    Answer from the response cache, or from an identical request in flight,
+    or else fetch, revalidating the stale cached response if any. See
+    _call_api() for the arguments.
+    """
+    key, cached = self._get_cached(endpoint, method, params)
+    if cached is not None:
+      if call is not None:
+        call.cache = instrument.HIT
+      return codec.project(cached, fields) if fields else cached
+    if fields:
+      # Projections are cached apart from the full responses.
+      fields = codec.normalize_fields(fields)
+      params_key = dict(params, fields=",".join(fields))
+      key, cached = self._get_cached(endpoint, method, params_key)
+      if cached is not None:
+        if call is not None:
+          call.cache = instrument.HIT
+        return cached
+    else:
+      params_key = params
+    if call is not None and key is not None:
+      call.cache = instrument.MISS
+
+    if method.upper() != "GET":
+      return self._fetch(endpoint, method, params, data, fields, call)[0]
+
+    # Identical requests in flight share a single fetch.
+    leader = []
+    def fetch() -> Dict:
+      leader.append(True)
+      store = cache.get_cache()
+      stale = store.get_stale(key) if key is not None and store is not None else None
+      res, validators = self._fetch(endpoint, method, params, data, fields, call, stale)
+      self._set_cached(key, endpoint, res, validators)
+      return res
+    res = singleflight.get_flights().do(key or cache.cache_key(endpoint, params_key), fetch)
+    if call is not None and not leader:
+      call.cache = instrument.COALESCED
+    return res
+
+  def _fetch(
+    self,
+    endpoint,
+    method: str,
+    params: Dict,
+    data: Optional[Dict] = None,
+    fields: Optional[Iterable[str]] = None,
+    call: Optional[instrument.Call] = None,
+    stale: Optional[Tuple[Dict, Dict]] = None) -> Tuple[Dict, Optional[Dict]]:
+    """
+    Send the request to the API, bypassing the cache, or replay it from the
+    cassette in use (see tmdb_client.cassette).
+    Args:
+      stale: tuple <optional>. An expired cached response and its validators,
+        sent back in a conditional request. It is returned if the API
+        answers that it is still current (304).
+    Returns:
+      A tuple of the response as a JSON dict, and its validators (None if
+      the API gave none).
+    """
+    stats = {} if call is not None else None
+    headers = cache.conditional_headers(stale[1]) if stale is not None else None
+    send = lambda: self._send(endpoint, method, params, data, stats, headers)
+    recorder = cassette.get_cassette()
+    if recorder is not None:
+      response = recorder.play(method, endpoint, params, send, self.base_url)
+    else:
+      response = send()
+    validators = cache.get_validators(response.headers)
+    if call is not None:
+      call.status = response.status_code
+      call.bytes = len(response.content)
+      call.retries = stats.get("retries", 0)
+      call.queue_wait = stats.get("queue_wait", 0.0)
+    if response.status_code == 304 and stale is not None:
+      log.debug(f"Not modified: {endpoint}")
+      if call is not None:
+        call.cache = instrument.HIT
+      return stale[0], dict(stale[1], **(validators or {}))
+    response.raise_for_status()
+    if call is None:
+      return codec.loads(response.content, fields), validators
+    start = time.perf_counter()
+    res = codec.loads(response.content, fields)
+    call.decode = time.perf_counter() - start
+    return res, validators
+
+  def _send(
+    self,
+    endpoint,
+    method: str,
+    params: Dict,
+    data: Optional[Dict] = None,
+    stats: Optional[Dict] = None,
+    headers: Optional[Dict] = None) -> "requests.Response":
+    check_api_key()
     full_url = f"{self.base_url}/{endpoint}"
     # For v4:
     # headers = {"Authorization": f"Bearer {API_TOKEN}", "Content-Type": "application/json;charset=utf-8"}
-    params.update({ "api_key": API_KEY })
+    params = dict(params, api_key=API_KEY)
 
-    response = getattr(requests, method.lower())(
-      full_url, 
-      params=params, 
-      data=dumps(data) if data else data
+    # Reuse the pooled keep-alive connections shared by all resources, within
+    # the rate limit of the process, retrying on 429, 5xx and connection errors.
+    response = ratelimit.get_scheduler().send(
+      lambda: session.request(
+        method.upper(),
+        full_url, 
+        params=params, 
+        data=dumps(data) if data else data,
+        headers=headers
+      ),
+      endpoint,
+      stats
     )
 
     log.debug(f"Fetched URL: {response.url}")
+    return response
 
-    response.raise_for_status()
-    return response.json()
+  def _get_cached(
+    self,
+    endpoint: str,
+    method: str,
+    params: Dict) -> Tuple[Optional[str], Optional[Dict]]:
+    """
+    Look up the response cache, if enabled, for a GET request.
+    Returns:
+      A tuple of the cache key (None if the request is not cacheable) and
+      the cached response (None on a miss).
+    """
+    store = cache.get_cache()
+    if store is None or method.upper() != "GET":
+      return None, None
+    key = cache.cache_key(endpoint, params)
+    cached = store.get(key)
+    if cached is not None:
+      log.debug(f"Cache hit: {key}")
+    return key, cached
+
+  def _set_cached(
+    self,
+    key: Optional[str],
+    endpoint: str,
+    res: Dict,
+    validators: Optional[Dict] = None) -> None:
+    store = cache.get_cache()
+    if key is None or store is None:
+      return
+    ttl = cache.get_ttl(endpoint, store.ttls)
+    if ttl > 0:
+      store.set(key, res, ttl, validators)
@@ -1,32 +1,44 @@
-from typing import Iterable, List, Dict, Any, AbstractSet
+from typing import Iterable, List, Dict, Any, AbstractSet, FrozenSet, Tuple
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tmdb_client import BATCH_WORKERS, cache, instrument
 from tmdb_client.person import Person
-from tmdb_client.movie import Movie
+from tmdb_client.movie import Movie, TV
+from tmdb_client.models import CastCredit, MediaSummary, MovieSummary, Page, PersonSummary, parse_all
 
 log = logging.getLogger(__name__)
 
+# Fields of credits responses read by the helpers below. Only these are
+# decoded and kept, see tmdb_client.codec.
+CAST_FIELDS = ("id", "cast[].id", "cast[].name", "cast[].known_for_department")
+FILMOGRAPHY_FIELDS = ("cast[].id", "cast[].title", "cast[].release_date")
+COMBINED_FIELDS = FILMOGRAPHY_FIELDS + ("cast[].media_type", "cast[].name", "cast[].first_air_date")
+SEASONS_FIELDS = ("seasons[].season_number",)
+# Number of season casts memoized while the response cache is disabled.
+SEASON_CAST_ENTRIES = 1024
 
-def add_all_to(str_list: List, obj: object) -> None:
+_season_casts = cache.MemoryCache(SEASON_CAST_ENTRIES)
+
+
+def add_all_to(str_list: List, page: Page[MovieSummary]) -> None:
   """
-  Add each element in the .results attribute from obj to the list pointed
-  at by str_list.
+  Add the title of each movie of a page of results to the list pointed at by
+  str_list.
   Args:
     str_list: list. The mutable list to append to.
-    obj: object. The object from which to read the "results" attribute.
+    page: Page. Movie results, e.g. from Discover.movie().
   Returns:
     None.
-  
-  >>> class Object(object):
-  >>>   pass
-  >>> obj = object()
-  >>> setattr(obj, "results", [{"title": "a_title"}, {"title", "another_title"}])
+
+  >>> page = Page(1, 1, 2, [MovieSummary(1, "a_title"), MovieSummary(2, "another_title")])
   >>> _list = []
-  >>> add_all_to(_list, obj)
+  >>> add_all_to(_list, page)
   >>> assert "a_title" in _list
-  >>> assert "another_title" in _list 
+  >>> assert "another_title" in _list
   """
-  for el in getattr(obj, "results", []):
-    str_list.append(el.get("title"))
+  for el in page.results:
+    str_list.append(el.title)
 
 
 MEDIA_TITLE_KEYS = ["original_name", "name", "original_title"]
@@ -50,24 +62,22 @@ def get_first_known_key(mapping: Dict, known_keys: Iterable = MEDIA_TITLE_KEYS)
   return None
 
 
-def is_actor(result: Dict) -> bool:
+def is_actor(result: PersonSummary, coalesce: Iterable[str] = ()) -> bool:
   """
   Args:
-    results: dict. A result dictionary as output by the Search class.
+    result: PersonSummary. A search result as output by the Search class.
+    coalesce: iterable of strings. Sub-resources of the person (e.g.
+      "movie_credits") to fetch along with the details, if they are needed.
+      See TMDB.coalesce().
   Returns:
-    True if the "known_for_department" key equals "Acting", otherwise False.
+    True if the person is known for acting, otherwise False.
   """
-  if known_for := result.get("known_for_department"):
-    if known_for == "Acting":
-      return True
-    return False
-  elif _id := result.get("id"):
+  if result.known_for_department:
+    return result.is_actor
+  elif result.id:
     # Fallback to getting details if we have the id at least:
-    person = Person(_id)
-    person.details()
-    if getattr(person, "known_for_department", "") == "Acting":
-      return True
-    return False
+    details = Person(result.id).coalesce(*coalesce).details()
+    return details.get("known_for_department") == "Acting"
   raise Exception("Missing known_for_department or id key.")
 
 
@@ -79,15 +89,22 @@ def get_movie_cast(movie_id: int) -> AbstractSet[int]:
   Returns:
     A set of unique TMDB actor IDs.
   """
-  actor_ids = set()
   movie = Movie(movie_id)
-  creds = movie.credits()
-  cast = creds.get("cast", [])
-  for cast_entry in cast:
-    if cast_entry.get("known_for_department", "") == "Acting":
-      if actor_id := cast_entry.get("id"):
-        log.debug(f"Detected id {actor_id} of {cast_entry.get('name', '')} to actor_ids for movie {movie_id}.")
-        actor_ids.add(actor_id)
+  return get_actor_ids_from_credits(movie.credits(fields=CAST_FIELDS))
+
+
+def get_actor_ids_from_credits(creds: Dict) -> AbstractSet[int]:
+  """
+  Args:
+    creds: dict. A credits response as returned by Movie.credits().
+  Returns:
+    A set of unique TMDB actor IDs found in the cast.
+  """
+  actor_ids = set()
+  for credit in parse_all(creds.get("cast", []), CastCredit.from_json):
+    if credit.is_actor:
+      log.debug(f"Detected id {credit.id} of {credit.name or ''} to actor_ids for movie {creds.get('id')}.")
+      actor_ids.add(credit.id)
   return actor_ids
 
 
@@ -99,10 +116,117 @@ def get_movies_id_for_actor_id(actor_id: int) -> Dict[int, str]:
   Returns:
     A dictionary of {movie_id: movie_title}
   """
-  movies_map = {}
   actor = Person(actor_id)
-  creds = actor.movie_credits()
+  return get_movies_from_credits(actor.movie_credits(fields=FILMOGRAPHY_FIELDS))
+
+
+def get_movies_from_credits(creds: Dict) -> Dict[int, str]:
+  """
+  Args:
+    creds: dict. A credits response as returned by Person.movie_credits().
+  Returns:
+    A dictionary of {movie_id: movie_title}
+  """
+  movies_map = {}
   cast = creds.get("cast", [])
   for movie in cast:
     movies_map[int(movie.get("id"))] = movie.get("title")
   return movies_map
+
+
+def get_filmography(actor_id: int) -> Dict[int, MovieSummary]:
+  """
+  Args:
+    actor_id: int. ID of the actor to look up.
+  Returns:
+    A dictionary of {movie_id: movie summary} for every movie the actor was
+    part of as cast, from a single movie_credits request.
+  """
+  creds = Person(actor_id).movie_credits(fields=FILMOGRAPHY_FIELDS)
+  return {m.id: m for m in parse_all(creds.get("cast", []), MovieSummary.from_json)}
+
+
+def get_combined_filmography(actor_id: int) -> Dict[Tuple[str, int], MediaSummary]:
+  """
+  Args:
+    actor_id: int. ID of the actor to look up.
+  Returns:
+    A dictionary of {(media_type, id): summary} for every movie and TV show
+    the actor was part of as cast, from a single combined_credits request.
+  """
+  creds = Person(actor_id).combined_credits(fields=COMBINED_FIELDS)
+  return {m.key: m for m in parse_all(creds.get("cast", []), MediaSummary.from_json)}
+
+
+def get_show_seasons(show_id: int) -> List[int]:
+  """
+  Returns:
+    The season numbers of a TV show, in order, specials (season 0) last.
+  """
+  details = TV(show_id).details(fields=SEASONS_FIELDS)
+  numbers = [int(s["season_number"]) for s in details.get("seasons", []) if "season_number" in s]
+  return sorted(numbers, key=lambda n: (n == 0, n))
+
+
+def get_season_cast(show_id: int, season_number: int) -> FrozenSet[int]:
+  """
+  For a given season of a TV show, return only the cast members that were
+  actors. The season credits are kept, by show and season, in the response
+  cache when it is enabled. Otherwise the casts are memoized in memory, up
+  to SEASON_CAST_ENTRIES of them, for the TTL of the season credits.
+  Returns:
+    A frozen set of unique TMDB actor IDs.
+  """
+  key = f"tv/{show_id}/season/{season_number}/credits"
+  memo = _season_casts if cache.get_cache() is None else None
+  if memo is not None and (entry := memo.get_with_expiry(key)) is not None:
+    return entry[0]
+  creds = TV(show_id).season_credits(season_number, fields=CAST_FIELDS)
+  cast = frozenset(get_actor_ids_from_credits(creds))
+  if memo is not None:
+    memo.set_with_expiry(key, cast, time.time() + cache.get_ttl(key))
+  return cast
+
+
+def get_show_cast(show_id: int) -> AbstractSet[int]:
+  """
+  Returns:
+    The ids of the actors of every season of a TV show, from a single
+    aggregate_credits request.
+  """
+  return get_actor_ids_from_credits(TV(show_id).aggregate_credits(fields=CAST_FIELDS))
+
+
+def find_actors_in_show(
+  show_id: int,
+  actor_ids: Iterable[int],
+  workers: int = BATCH_WORKERS) -> AbstractSet[int]:
+  """
+  Look for actors in the casts of the seasons of a TV show. Unlike
+  TV.credits(), which only covers the latest season, every season is checked.
+  Season casts are fetched concurrently, and the fetch stops as soon as every
+  actor has been seen: seasons not fetched yet are skipped.
+  Args:
+    show_id: int. Unique TMDB TV show ID.
+    actor_ids: iterable. TMDB actor IDs to look for.
+    workers: int. Number of seasons fetched at once.
+  Returns:
+    The set of actor_ids found in at least one season.
+  """
+  wanted = set(actor_ids)
+  found: set = set()
+  seasons = get_show_seasons(show_id)
+  if not wanted or not seasons:
+    return found
+  with ThreadPoolExecutor(max_workers=min(workers, len(seasons))) as pool:
+    fetch = instrument.bind(get_season_cast)
+    futures = [pool.submit(fetch, show_id, n) for n in seasons]
+    for future in as_completed(futures):
+      found |= wanted & future.result()
+      if found == wanted:
+        log.debug(f"Found all actors in show {show_id}, skipping the remaining seasons.")
+        for pending in futures:
+          pending.cancel()
+        break
+  return found
+